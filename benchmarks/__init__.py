@@ -0,0 +1,6 @@
+'''
+End-to-end benchmarks for pyheaders.
+
+Synthetic C++ code is generated along several scaling axes (see ``benchmarks.generators``) and every phase of
+loading it is timed (see ``benchmarks.phases``). Run ``python -m benchmarks --help`` for usage.
+'''
@@ -0,0 +1,151 @@
+'''
+Run the pyheaders benchmarks and compare results.
+
+Usage:
+
+    python -m benchmarks run [--axis AXIS ...] [--parse-only] [-o results.json]
+    python -m benchmarks compare baseline.json results.json [--threshold 0.1]
+    python -m benchmarks memory [--axis AXIS ...] [--size SIZE ...]
+'''
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from .generators import AXES, DEFAULT_SIZES
+from .memory import REPRESENTATIONS, measure_memory
+from .phases import PHASES, run_workload
+
+RESULTS_VERSION = 2
+
+
+def _clang_version(clang_path):
+    try:
+        return subprocess.run([clang_path, '--version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True, check=False).stdout.split('\n')[0]
+    except OSError:
+        return None
+
+
+def handle_run(args):
+    '''
+    Handle the `run` subparser.
+    '''
+    results = []
+    for axis in args.axes or AXES:
+        for size in args.sizes or DEFAULT_SIZES[axis]:
+            times = run_workload(AXES[axis](size), repeat=args.repeat, parse_only=args.parse_only,
+                                 clang_path=args.clang_path)
+            results.append({'axis': axis, 'size': size, 'times': times})
+            print(f'{axis:<16} {size:>8}  ' + '  '.join(f'{phase}={times[phase]:.4f}s' for phase in (*PHASES, 'total')
+                                                        if phase in times), file=sys.stderr)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'time': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'clang': None if args.parse_only else _clang_version(args.clang_path),
+            'parse_only': args.parse_only,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    return True
+
+
+def _index(report):
+    return {(result['axis'], result['size']): result['times'] for result in report['results']}
+
+
+def handle_compare(args):
+    '''
+    Handle the `compare` subparser. Fails if any phase got slower than the threshold.
+    '''
+    with open(args.baseline) as baseline_file, open(args.results) as results_file:
+        baseline, results = _index(json.load(baseline_file)), _index(json.load(results_file))
+
+    regressed = False
+    for key in sorted(baseline.keys() & results.keys()):
+        for phase in sorted(baseline[key].keys() & results[key].keys()):
+            old, new = baseline[key][phase], results[key][phase]
+            # Ignore phases that are too short to measure reliably
+            if max(old, new) < args.min_time:
+                continue
+            change = (new - old) / old if old else float('inf')
+            marker = ''
+            if change > args.threshold:
+                marker = '  <-- regression'
+                regressed = True
+            elif change < -args.threshold:
+                marker = '  <-- improvement'
+            print(f'{key[0]:<16} {key[1]:>8} {phase:<9} {old:9.4f}s -> {new:9.4f}s ({change:+7.1%}){marker}')
+
+    return not regressed
+
+
+def handle_memory(args):
+    '''
+    Handle the `memory` subparser.
+    '''
+    print(f'{"axis":<16} {"size":>8}' + ''.join(f'{name:>14}' for name in REPRESENTATIONS))
+    for axis in args.axes or ['symbols']:
+        for size in args.sizes or DEFAULT_SIZES[axis]:
+            usage = measure_memory(AXES[axis](size))
+            print(f'{axis:<16} {size:>8}' + ''.join(f'{usage[name] / 2 ** 20:>12.2f}MB' for name in REPRESENTATIONS))
+
+    return True
+
+
+def main():
+    '''
+    The benchmarks' main entrypoint.
+    '''
+    parser = argparse.ArgumentParser(description="Benchmark pyheaders using synthetic C++ code")
+    subparsers = parser.add_subparsers(dest="run/compare/memory", required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks")
+    run_parser.add_argument('--axis', dest='axes', action='append', choices=sorted(AXES),
+                            help="The scaling axes to benchmark (default: all)")
+    run_parser.add_argument('--size', dest='sizes', action='append', type=int,
+                            help="The sizes to benchmark (default: per-axis defaults)")
+    run_parser.add_argument('--repeat', type=int, default=3, help="The number of repetitions (the fastest is kept)")
+    run_parser.add_argument('--parse-only', action='store_true',
+                            help="Only benchmark the Python phases, clang is not required")
+    run_parser.add_argument('--clang-path', default='clang++-11', help="The full path to the clang executable")
+    run_parser.add_argument('-o', '--output', help="The file to save the results to (default: stdout)")
+    run_parser.set_defaults(cmd=handle_run)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two results files")
+    compare_parser.add_argument('baseline', help="The baseline results")
+    compare_parser.add_argument('results', help="The new results")
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="The relative slowdown that counts as a regression (default: 0.1)")
+    compare_parser.add_argument('--min-time', type=float, default=0.001,
+                                help="Ignore phases faster than this many seconds (default: 0.001)")
+    compare_parser.set_defaults(cmd=handle_compare)
+
+    memory_parser = subparsers.add_parser('memory', help="Compare the memory usage of the scope representations")
+    memory_parser.add_argument('--axis', dest='axes', action='append', choices=sorted(AXES),
+                               help="The scaling axes to measure (default: symbols)")
+    memory_parser.add_argument('--size', dest='sizes', action='append', type=int,
+                               help="The sizes to measure (default: per-axis defaults)")
+    memory_parser.set_defaults(cmd=handle_memory)
+
+    args = parser.parse_args()
+    sys.exit(0 if args.cmd(args) else 1)
+
+
+if __name__ == '__main__':
+    main()
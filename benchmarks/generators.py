@@ -0,0 +1,162 @@
+'''
+Synthetic C++ code generators.
+
+Every generator accepts a size and returns a ``Workload`` with the generated C++ code and the output the
+ConstantsDumper plugin is expected to print for it. The expected output allows benchmarking the Python parsing
+phases without running clang.
+'''
+import base64
+import struct
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Text
+
+NAMESPACE = 'bench'
+
+
+@dataclass
+class Workload:
+    '''
+    A generated benchmark input.
+
+    Members:
+        - headers -- Maps header file names to their content.
+        - sources -- Maps source (TU) file names to their content.
+        - plugin_output -- The expected plugin output for a single TU.
+    '''
+    headers: Dict[Text, Text] = field(default_factory=dict)
+    sources: Dict[Text, Text] = field(default_factory=dict)
+    plugin_output: Text = ''
+
+
+def _single_tu(code: Text, plugin_output: List[Text]) -> Workload:
+    return Workload(headers={'bench.hpp': f'#pragma once\n{code}'},
+                    sources={'bench.cpp': '#include "bench.hpp"\n'},
+                    plugin_output='\n'.join(plugin_output) + '\n')
+
+
+def _in_namespace(lines: List[Text]) -> Text:
+    return f'namespace {NAMESPACE}\n{{\n' + '\n'.join(f'    {line}' for line in lines) + '\n}\n'
+
+
+def constants(count: int) -> Workload:
+    '''
+    ``count`` integer constants in a single namespace.
+    '''
+    return _single_tu(_in_namespace([f'constexpr int c{i} = {i};' for i in range(count)]),
+                      [f'{NAMESPACE}::c{i}:={i}' for i in range(count)])
+
+
+def namespace_depth(depth: int) -> Workload:
+    '''
+    ``depth`` nested namespaces, each with a single constant.
+    '''
+    code = ''
+    output = []
+    for i in range(depth):
+        code += f'namespace n{i} {{ constexpr int v = {i};\n'
+        output.append('::'.join(f'n{j}' for j in range(i + 1)) + f'::v:={i}')
+    code += '}' * depth + '\n'
+    return _single_tu(code, output)
+
+
+def enum_size(count: int) -> Workload:
+    '''
+    A single enum class with ``count`` enumerators.
+    '''
+    enumerators = ', '.join(f'e{i} = {i}' for i in range(count))
+    return _single_tu(_in_namespace([f'enum class E {{ {enumerators} }};']),
+                      [f'enum {NAMESPACE}::E {{'] + [f'{NAMESPACE}::E::e{i}:={i},' for i in range(count)] + ['}'])
+
+
+def array_length(length: int) -> Workload:
+    '''
+    A single ``constexpr int[]`` with ``length`` elements.
+    '''
+    values = [i % 65536 for i in range(length)]
+    elements = ', '.join(map(str, values))
+    dense = base64.b64encode(struct.pack(f'<{length}i', *values)).decode()
+    return _single_tu(_in_namespace([f'constexpr int table[] = {{{elements}}};']),
+                      [f'{NAMESPACE}::table:=@i32:{dense}'])
+
+
+def records(count: int) -> Workload:
+    '''
+    ``count`` constants of a literal record type.
+    '''
+    lines = ['struct Point { int x; int y; };'] + [f'constexpr Point p{i}{{{i}, {-i}}};' for i in range(count)]
+    return _single_tu(_in_namespace(lines),
+                      [f'{NAMESPACE}::Point{{x,y}}'] +
+                      [f'{NAMESPACE}::p{i}:={NAMESPACE}::Point({i},{-i})' for i in range(count)])
+
+
+def string_volume(count: int, length: int = 256) -> Workload:
+    '''
+    ``count`` string constants of ``length`` characters each.
+    '''
+    def text(i):
+        return (f'string {i} ' * length)[:length]
+
+    def dense(i):
+        return base64.b64encode(f'{text(i)}\0'.encode()).decode()
+
+    return _single_tu(_in_namespace([f'constexpr const char s{i}[] = "{text(i)}";' for i in range(count)]),
+                      [f'{NAMESPACE}::s{i}:=@char:{dense(i)}' for i in range(count)])
+
+
+def macro_count(count: int) -> Workload:
+    '''
+    ``count`` object-like macros, half of them referring to other macros.
+    '''
+    code = '\n'.join(f'#define BENCH_M{i} {i if i % 2 == 0 else f"(BENCH_M{i - 1} + 1)"}' for i in range(count))
+    return _single_tu(code + '\n', [])
+
+
+def shared_headers(tu_count: int, constants_per_header: int = 100) -> Workload:
+    '''
+    ``tu_count`` translation units that include the same header.
+    '''
+    workload = constants(constants_per_header)
+    workload.sources = {f'tu{i}.cpp': f'#include "bench.hpp"\nnamespace {NAMESPACE}::tu{i} {{ constexpr int id = {i}; }}\n'
+                        for i in range(tu_count)}
+    return workload
+
+
+def symbols(count: int, per_namespace: int = 100) -> Workload:
+    '''
+    ``count`` symbols spread over nested namespaces, with record types that have no static members.
+    '''
+    output = []
+    for i in range(count):
+        namespace = f'{NAMESPACE}::n{i // (per_namespace * 10)}::m{i // per_namespace}'
+        if i % per_namespace == 0:
+            output.append(f'{namespace}::detail::Impl{{a,b}}')
+        output.append(f'{namespace}::c{i}:={i}')
+    code = ''.join(f'namespace {NAMESPACE}::n{i // (per_namespace * 10)}::m{i // per_namespace} '
+                   f'{{ constexpr int c{i} = {i}; }}\n' for i in range(count))
+    return _single_tu(code, output)
+
+
+AXES: Dict[Text, Callable[[int], Workload]] = {
+    'constants': constants,
+    'namespace_depth': namespace_depth,
+    'enum_size': enum_size,
+    'array_length': array_length,
+    'records': records,
+    'string_volume': string_volume,
+    'macro_count': macro_count,
+    'shared_headers': shared_headers,
+    'symbols': symbols,
+}
+
+DEFAULT_SIZES: Dict[Text, List[int]] = {
+    'constants': [100, 1000, 10000],
+    'namespace_depth': [10, 50, 200],
+    'enum_size': [100, 1000, 10000],
+    'array_length': [1000, 10000, 100000],
+    'records': [100, 1000, 10000],
+    'string_volume': [100, 1000, 5000],
+    'macro_count': [100, 1000, 10000],
+    'shared_headers': [2, 8, 32],
+    'symbols': [1000, 10000, 100000],
+}
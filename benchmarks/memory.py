@@ -0,0 +1,38 @@
+'''
+Memory usage of the scope representations.
+'''
+import gc
+import tracemalloc
+
+from typing import Callable, Dict, Text
+
+from pyheaders import cpp
+
+from .generators import Workload
+from .phases import new_parser
+
+# Maps representation names to functions that build a scope from the plugin output.
+REPRESENTATIONS: Dict[Text, Callable[[Text], cpp.Scope]] = {
+    'scope': lambda output: new_parser().parse(output, initial_scope=cpp.Scope()),
+    'compact': lambda output: cpp.compact(new_parser().parse(output, initial_scope=cpp.CompactScope())),
+    'lazy': lambda output: new_parser(lazy=True).parse(output, initial_scope=cpp.Scope()),
+}
+
+
+def measure_memory(workload: Workload) -> Dict[Text, int]:
+    '''
+    Measure the memory (in bytes) retained by the scope built from ``workload`` in every representation.
+    '''
+    output = workload.plugin_output * len(workload.sources)
+    results = {}
+    for name, build in REPRESENTATIONS.items():
+        gc.collect()
+        tracemalloc.start()
+        try:
+            scope = build(output)
+            gc.collect()
+            results[name] = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del scope
+    return results
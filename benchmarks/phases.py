@@ -0,0 +1,92 @@
+'''
+Per-phase timing of the pyheaders loading pipeline.
+'''
+import os
+import tempfile
+import time
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Text
+
+import pyheaders
+
+from pyheaders import parser, parsers
+from pyheaders.stats import PHASES, FileStats
+
+from .generators import Workload
+
+
+@contextmanager
+def materialize(workload: Workload):
+    '''
+    Write the workload's files into a temporary directory.
+
+    @returns The directory's path.
+    '''
+    with tempfile.TemporaryDirectory(prefix='pyheaders-bench-') as root:
+        for name, content in {**workload.headers, **workload.sources}.items():
+            with open(os.path.join(root, name), 'w') as output:
+                output.write(content)
+        yield root
+
+
+def new_parser(lazy: bool = False) -> parser.Parser:
+    '''
+    Create the parser that pyheaders uses for the plugin output.
+    '''
+    return parser.Parser(
+        parsers.RecordsParser(),
+        parsers.EnumsParser(),
+        parsers.ConstantsParser(lazy=lazy),
+        parsers.LiteralsParser(lazy=lazy),
+    )
+
+
+def time_parsing(plugin_output: Text, file_stats: FileStats):
+    '''
+    Time the Python side of loading: parsing the plugin output into a scope, like pyheaders does.
+    '''
+    pyheaders._parse(plugin_output, file_stats=file_stats)  # pylint: disable=protected-access
+
+
+def time_file(filename: Text, file_stats: FileStats, extra_args: List[Text] = None, clang_path: Text = None,
+              **run_kwargs):
+    '''
+    Time every phase of loading a single file, as pyheaders loads it (see ``pyheaders.stats.PHASES``).
+    '''
+    # pylint: disable=protected-access
+    loaded = pyheaders._load_file(filename, extra_args, exec_path=clang_path, collect_stats=True, **run_kwargs)
+    for phase, elapsed in loaded.stats.phase_totals().items():
+        file_stats.phases[phase] = file_stats.phases.get(phase, 0.0) + elapsed
+
+
+def run_workload(workload: Workload, *, repeat: int = 3, parse_only: bool = False,
+                 extra_args: Optional[List[Text]] = None, clang_path: Text = None) -> Dict[Text, float]:
+    '''
+    Time all phases of loading ``workload``.
+
+    @param workload     The workload to time.
+    @param repeat       The number of repetitions, the fastest time of every phase is kept.
+    @param parse_only   If ``True``, only time the Python phases using the workload's expected plugin output.
+    @param extra_args   Additional compilation arguments.
+    @param clang_path   The full path of the clang executable.
+
+    @returns The fastest time (in seconds) of every phase, and the total under 'total'.
+    '''
+    best: Dict[Text, float] = {}
+    for _ in range(repeat):
+        file_stats = FileStats('<workload>')
+        start = time.perf_counter()
+        if parse_only:
+            time_parsing(workload.plugin_output * len(workload.sources), file_stats)
+        else:
+            with materialize(workload) as root:
+                for source in sorted(workload.sources):
+                    time_file(os.path.join(root, source), file_stats, extra_args=extra_args or ['-std=c++17'],
+                              clang_path=clang_path, ignore_cmds=True)
+        times = dict(file_stats.phases, total=time.perf_counter() - start)
+
+        for phase, elapsed in times.items():
+            best[phase] = min(best.get(phase, elapsed), elapsed)
+
+    return best
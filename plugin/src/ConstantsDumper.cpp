@@ -8,11 +8,14 @@
 
 #include <algorithm>
 #include <cctype>
+#include <cstdint>
 #include <cstdio>
+#include <fstream>
 #include <iomanip>
 #include <ios>
 #include <iostream>
 #include <iterator>
+#include <set>
 #include <sstream>
 #include <string>
 #include <tuple>
@@ -57,6 +60,7 @@ inline constexpr decltype(auto) OUTPUT_EQ = ":=";
 inline constexpr auto char_delim = '\'';
 inline constexpr auto string_delim = '"';
 inline constexpr auto escape_char = '\\';
+inline constexpr auto dense_marker = '@';
 
 static inline bool HasAnyFields(const CXXRecordDecl *decl);
 
@@ -79,6 +83,202 @@ static inline bool HasAnyFields(const CXXRecordDecl *decl)
     return any_of(decl->bases_begin(), decl->bases_end(), BaseHasAnyFields);
 }
 
+/**
+ * @brief Get the dense encoding name of an array element type.
+ *
+ * Arrays of fixed-width integers and floats are printed as `@<type>:<base64 of the little-endian elements>`.
+ *
+ * @return const char*  The encoding name (i8, u8, ..., i64, u64, f32, f64) or `nullptr` if elements of
+ *                      this type can't be encoded densely.
+ */
+static const char *DenseArrayType(const QualType &element_type, const ASTContext &ast_context)
+{
+    const auto canonical = element_type.getCanonicalType();
+
+    // Strings, wide characters, bools and enums keep their special formats.
+    // Typedefs to char (uint8_t, int8_t) are numbers and can be encoded densely.
+    if ((canonical->isAnyCharacterType() && (!canonical->isCharType() || canonical.getAsString() == element_type.getAsString())) ||
+        canonical->isBooleanType() || canonical->isEnumeralType())
+    {
+        return nullptr;
+    }
+
+    if (canonical->isIntegerType())
+    {
+        static const char *const signed_types[] = {"i8", "i16", "i32", "i64"};
+        static const char *const unsigned_types[] = {"u8", "u16", "u32", "u64"};
+        const auto *types = canonical->isSignedIntegerType() ? signed_types : unsigned_types;
+        switch (ast_context.getTypeSize(canonical))
+        {
+        case 8:
+            return types[0];
+        case 16:
+            return types[1];
+        case 32:
+            return types[2];
+        case 64:
+            return types[3];
+        default:
+            return nullptr;
+        }
+    }
+
+    if (canonical->isSpecificBuiltinType(BuiltinType::Float))
+    {
+        return "f32";
+    }
+    if (canonical->isSpecificBuiltinType(BuiltinType::Double))
+    {
+        return "f64";
+    }
+    return nullptr;
+}
+
+/**
+ * @brief Print binary data in base64.
+ */
+static void PrintBase64(ostream &os, const string &data)
+{
+    static constexpr char base64_chars[] = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+
+    size_t i = 0;
+    for (; i + 2 < data.size(); i += 3)
+    {
+        const uint32_t chunk = (static_cast<unsigned char>(data[i]) << 16) |
+                               (static_cast<unsigned char>(data[i + 1]) << 8) |
+                               static_cast<unsigned char>(data[i + 2]);
+        os << base64_chars[(chunk >> 18) & 0x3f] << base64_chars[(chunk >> 12) & 0x3f]
+           << base64_chars[(chunk >> 6) & 0x3f] << base64_chars[chunk & 0x3f];
+    }
+    if (i < data.size())
+    {
+        uint32_t chunk = static_cast<unsigned char>(data[i]) << 16;
+        if (i + 1 < data.size())
+        {
+            chunk |= static_cast<unsigned char>(data[i + 1]) << 8;
+        }
+        os << base64_chars[(chunk >> 18) & 0x3f] << base64_chars[(chunk >> 12) & 0x3f];
+        os << (i + 1 < data.size() ? base64_chars[(chunk >> 6) & 0x3f] : '=') << '=';
+    }
+}
+
+/**
+ * @brief Append a code unit to a little-endian string.
+ */
+static void AppendLittleEndian(string &data, uint64_t raw, unsigned size)
+{
+    for (unsigned byte = 0; byte < size; ++byte)
+    {
+        data.push_back(static_cast<char>((raw >> (byte * 8)) & 0xff));
+    }
+}
+
+/**
+ * @brief Get the size (in bytes) of a string's code units in the dense encoding.
+ *
+ * `wchar_t` is always widened to 4 bytes so its size doesn't depend on the target.
+ */
+static unsigned DenseCharSize(const QualType &char_type, const ASTContext &ast_context)
+{
+    if (char_type.getCanonicalType()->isWideCharType())
+    {
+        return 4;
+    }
+    return ast_context.getTypeSize(char_type.getCanonicalType()) / 8;
+}
+
+/**
+ * @brief Get the name of a character type in the dense string encoding.
+ *
+ * `char`, `signed char` and `unsigned char` are all printed as `char`.
+ */
+static string DenseCharName(const QualType &char_type)
+{
+    if (char_type.getCanonicalType()->isCharType())
+    {
+        return "char";
+    }
+    return char_type.getCanonicalType().getUnqualifiedType().getAsString();
+}
+
+/**
+ * @brief Print a string in the dense encoding: `@<char type><kind>:<base64 of the little-endian code units>`.
+ *
+ * `kind` is empty for `char` strings, `[]` for arrays and `*` for pointers of other character types.
+ */
+static void PrintDenseString(ostream &os, const QualType &char_type, const char *kind, const string &data)
+{
+    const auto name = DenseCharName(char_type);
+    os << dense_marker << name << (name == "char" ? "" : kind) << ':';
+    PrintBase64(os, data);
+}
+
+/**
+ * @brief Print a pointer to a string literal in the dense string encoding.
+ *
+ * @return bool Whether the value was printed.
+ */
+static bool PrintStringLiteralPointer(ostream &os, const APValue &value, const QualType &char_type,
+                                      const ASTContext &ast_context)
+{
+    if (!value.isLValue())
+    {
+        return false;
+    }
+
+    const auto *expr = value.getLValueBase().dyn_cast<const Expr *>();
+    const auto *literal = expr ? dyn_cast<StringLiteral>(expr->IgnoreParenImpCasts()) : nullptr;
+    if (literal == nullptr)
+    {
+        return false;
+    }
+
+    const auto unit_size = DenseCharSize(char_type, ast_context);
+    const auto offset = static_cast<unsigned>(value.getLValueOffset().getQuantity()) / literal->getCharByteWidth();
+
+    string data;
+    for (unsigned i = offset; i < literal->getLength(); ++i)
+    {
+        AppendLittleEndian(data, literal->getCodeUnit(i), unit_size);
+    }
+    PrintDenseString(os, char_type, "*", data);
+    return true;
+}
+
+/**
+ * @brief Print an array in its dense encoding (see `DenseArrayType`).
+ */
+static void PrintDenseArray(ostream &os, const char *dense_type, const APValue &value, const QualType &element_type,
+                            const ASTContext &ast_context)
+{
+    const auto array_size = value.getArrayInitializedElts();
+    const auto element_size = ast_context.getTypeSize(element_type.getCanonicalType()) / 8;
+
+    string data;
+    data.reserve(array_size * element_size);
+    for (unsigned i = 0; i < array_size; ++i)
+    {
+        const auto &element = value.getArrayInitializedElt(i);
+        uint64_t raw;
+        if (element.isInt())
+        {
+            raw = element.getInt().getZExtValue() & (element_size == 8 ? ~uint64_t{0} : (uint64_t{1} << (element_size * 8)) - 1);
+        }
+        else if (element.isFloat())
+        {
+            raw = element.getFloat().bitcastToAPInt().getZExtValue();
+        }
+        else
+        {
+            raw = 0;
+        }
+        AppendLittleEndian(data, raw, element_size);
+    }
+
+    os << dense_marker << dense_type << ':';
+    PrintBase64(os, data);
+}
+
 /**
  * @brief Get the first parent node of type `Parent` for `node` in the AST that matches
  *        the given predicate.
@@ -369,6 +569,11 @@ ostream &operator<<(ostream &os, const ValueInfo &value_info)
         if ((type->isPointerType() || (type->isArrayType() && !value.isArray())) &&
             type->getPointeeOrArrayElementType()->isAnyCharacterType())
         {
+            if (PrintStringLiteralPointer(os, value, QualType(type->getPointeeOrArrayElementType(), 0), ast_context))
+            {
+                return os;
+            }
+
             const auto str = value.getAsString(ast_context, type);
             // content includes the delimiters
             const auto content_begin = str.find(string_delim);
@@ -404,18 +609,35 @@ ostream &operator<<(ostream &os, const ValueInfo &value_info)
             {
                 if (element_type.getCanonicalType().getAsString() == element_type.getAsString())
                 {
-                    os << string_delim;
+                    string data;
+                    data.reserve(array_size);
                     for (unsigned i = 0; i < array_size; ++i)
                     {
-                        os << CharInfo(static_cast<char>(value.getArrayInitializedElt(i).getInt().getExtValue()), string_delim);
+                        data.push_back(static_cast<char>(value.getArrayInitializedElt(i).getInt().getExtValue()));
                     }
-                    return os << string_delim;
+                    PrintDenseString(os, element_type, "[]", data);
+                    return os;
                 }
             }
             // Handle wchar_t, char8_t, char16_t, char32_t (special encoding strings)
             else if (element_type->isAnyCharacterType())
             {
-                os << element_type.getCanonicalType().getUnqualifiedType().getAsString() << "[]";
+                const auto unit_size = DenseCharSize(element_type, ast_context);
+                string data;
+                data.reserve(array_size * unit_size);
+                for (unsigned i = 0; i < array_size; ++i)
+                {
+                    AppendLittleEndian(data, value.getArrayInitializedElt(i).getInt().getZExtValue(), unit_size);
+                }
+                PrintDenseString(os, element_type, "[]", data);
+                return os;
+            }
+
+            // Handle fixed-width integers and floats (lookup tables)
+            if (const auto *dense_type = DenseArrayType(element_type, ast_context))
+            {
+                PrintDenseArray(os, dense_type, value, element_type, ast_context);
+                return os;
             }
 
             os << "(";
@@ -475,6 +697,107 @@ ostream &operator<<(ostream &os, const RecordInfo &record_info)
     return os;
 }
 
+// Plugin args:
+//  tag-files               Print "#section <plugin>" before the output and "#file <path>" whenever the file
+//                          that the printed declarations come from changes.
+//  skip-files=<list>       Don't print declarations from the files listed (one real path per line) in <list>.
+struct FileFilterOptions
+{
+    bool tag_files = false;
+    set<string> skip_files;
+};
+
+inline constexpr char SKIP_FILES_ARG[] = "skip-files=";
+
+static bool ParseFileFilterArgs(const CompilerInstance &CI, const vector<string> &args, FileFilterOptions &options)
+{
+    for (auto &&arg : args)
+    {
+        if (arg == "tag-files")
+        {
+            options.tag_files = true;
+        }
+        else if (llvm::StringRef(arg).startswith(SKIP_FILES_ARG))
+        {
+            ifstream skip_list(arg.substr(sizeof(SKIP_FILES_ARG) - 1));
+            if (!skip_list)
+            {
+                DiagnosticsEngine &diagEngine = CI.getDiagnostics();
+                diagEngine.Report(diagEngine.getCustomDiagID(DiagnosticsEngine::Error, "can't read skip list '%0'"))
+                    << arg;
+                return false;
+            }
+            for (string line; getline(skip_list, line);)
+            {
+                options.skip_files.insert(line);
+            }
+        }
+        else
+        {
+            DiagnosticsEngine &diagEngine = CI.getDiagnostics();
+            diagEngine.Report(diagEngine.getCustomDiagID(DiagnosticsEngine::Error, "invalid argument '%0'")) << arg;
+            return false;
+        }
+    }
+    return true;
+}
+
+class FileFilter
+{
+public:
+    void SetOptions(FileFilterOptions new_options)
+    {
+        options = move(new_options);
+    }
+
+    void Start(const char *section, const SourceManager &new_source_manager)
+    {
+        source_manager = &new_source_manager;
+        last_file.clear();
+        if (options.tag_files)
+        {
+            cout << "#section " << section << endl;
+        }
+    }
+
+    // Check whether a declaration at `location` should be printed, and print a "#file" tag if needed.
+    bool Accept(SourceLocation location)
+    {
+        if (!options.tag_files && options.skip_files.empty())
+        {
+            return true;
+        }
+
+        auto file = FileName(location);
+        if (options.skip_files.count(file) != 0)
+        {
+            return false;
+        }
+        if (options.tag_files && file != last_file)
+        {
+            cout << "#file " << file << endl;
+            last_file = move(file);
+        }
+        return true;
+    }
+
+private:
+    string FileName(SourceLocation location) const
+    {
+        auto file_id = source_manager->getFileID(source_manager->getExpansionLoc(location));
+        if (auto *entry = source_manager->getFileEntryForID(file_id))
+        {
+            auto real_path = entry->tryGetRealPathName();
+            return (real_path.empty() ? entry->getName() : real_path).str();
+        }
+        return ""s;
+    }
+
+    FileFilterOptions options;
+    const SourceManager *source_manager = nullptr;
+    string last_file;
+};
+
 class ConstantsDumperVisitor : public RecursiveASTVisitor<ConstantsDumperVisitor>
 {
 public:
@@ -494,6 +817,11 @@ public:
             return true;
         }
 
+        if (!files.Accept(decl->getLocation()))
+        {
+            return true;
+        }
+
         cout << "enum " << decl->getQualifiedNameAsString() << " {" << endl;
         for (auto &&enum_constant_decl : decl->enumerators())
         {
@@ -628,6 +956,14 @@ public:
         }
 #endif // DEBUG_PLUGIN
 
+        if (!files.Accept(decl->getLocation()))
+        {
+            DBG_NOTE(Leave VisitVarDecl()[skipped file]);
+            DBG_NOTE(--------------------);
+
+            return true;
+        }
+
         cout << decl->getQualifiedNameAsString() << OUTPUT_EQ
              << ValueInfo(*decl->getEvaluatedValue(), decl->getType(), *context) << endl;
 
@@ -830,6 +1166,14 @@ public:
             return true;
         }
         DBG(result.Val.getAsString(*context, literal->getType()));
+        if (!files.Accept(literal->getBeginLoc()))
+        {
+            DBG_NOTE(Leave VisitStringLiteral()[skipped file]);
+            DBG_NOTE(--------------------------);
+
+            return true;
+        }
+
         cout << "#literal " << name.str() << OUTPUT_EQ << ValueInfo(result.Val, literal->getType(), *context) << endl;
 
         DBG_NOTE(Leave VisitStringLiteral());
@@ -938,6 +1282,14 @@ public:
         }
         DBG(result.Val.getAsString(*context, result_type));
 
+        if (!files.Accept(decl->getLocation()))
+        {
+            DBG_NOTE(Leave VisitFunctionDecl()[skipped file]);
+            DBG_NOTE(-------------------------);
+
+            return true;
+        }
+
         cout << decl->getQualifiedNameAsString() << OUTPUT_EQ << ValueInfo(result.Val, result_type, *context) << endl;
 
         DBG_NOTE(Leave VisitFunctionDecl());
@@ -948,14 +1300,21 @@ public:
     void SetASTContext(ASTContext &new_context)
     {
         context = &new_context;
+        files.Start("ConstantsDumper", new_context.getSourceManager());
     }
 
     ASTContext *context;
+    FileFilter files;
 };
 
 class ConstantsDumperConsumer : public ASTConsumer
 {
 public:
+    explicit ConstantsDumperConsumer(FileFilterOptions options)
+    {
+        visitor.files.SetOptions(move(options));
+    }
+
     void HandleTranslationUnit(ASTContext &context)
     {
         visitor.SetASTContext(context);
@@ -971,14 +1330,17 @@ class ConstantsDumperASTAction : public PluginASTAction
 public:
     virtual unique_ptr<ASTConsumer> CreateASTConsumer(CompilerInstance &Compiler, llvm::StringRef InFile)
     {
-        return make_unique<ConstantsDumperConsumer>();
+        return make_unique<ConstantsDumperConsumer>(options);
     }
 
     bool ParseArgs(const CompilerInstance &CI,
                    const vector<string> &args)
     {
-        return true;
+        return ParseFileFilterArgs(CI, args, options);
     }
+
+private:
+    FileFilterOptions options;
 };
 
 class LiteralTypesDumperVisitor : public RecursiveASTVisitor<LiteralTypesDumperVisitor>
@@ -1079,6 +1441,14 @@ public:
         }
 #endif // DEBUG_PLUGIN
 
+        if (!files.Accept(decl->getLocation()))
+        {
+            DBG_NOTE(Leave VisitCXXRecordDecl()[skipped file]);
+            DBG_NOTE(--------------------------);
+
+            return true;
+        }
+
         cout << decl->getQualifiedNameAsString() << "{" << RecordInfo(decl, true) << "}" << endl;
 
         DBG_NOTE(Leave VisitCXXRecordDecl());
@@ -1086,13 +1456,21 @@ public:
 
         return true;
     }
+
+    FileFilter files;
 };
 
 class LiteralTypesDumperConsumer : public ASTConsumer
 {
 public:
+    explicit LiteralTypesDumperConsumer(FileFilterOptions options)
+    {
+        visitor.files.SetOptions(move(options));
+    }
+
     void HandleTranslationUnit(ASTContext &context)
     {
+        visitor.files.Start("TypesDumper", context.getSourceManager());
         visitor.TraverseDecl(context.getTranslationUnitDecl());
     }
 
@@ -1105,14 +1483,17 @@ class LiteralTypesDumperASTAction : public PluginASTAction
 public:
     virtual unique_ptr<ASTConsumer> CreateASTConsumer(CompilerInstance &Compiler, llvm::StringRef InFile)
     {
-        return make_unique<LiteralTypesDumperConsumer>();
+        return make_unique<LiteralTypesDumperConsumer>(options);
     }
 
     bool ParseArgs(const CompilerInstance &CI,
                    const vector<string> &args)
     {
-        return true;
+        return ParseFileFilterArgs(CI, args, options);
     }
+
+private:
+    FileFilterOptions options;
 };
 } // namespace
 
@@ -4,15 +4,18 @@ C++ headers parsing library
 This module is a C++ header/source parsing library that allows getting constants that are known at compile-time
 into Python code.
 '''
+import asyncio
 import os
-import glob
-import fnmatch
+import time
 
 from typing import AnyStr as _Path, Dict as _Dict, IO as _IO, Iterable as _Iterable, \
-    Text as _Text, Tuple as _Tuple, List as _List
+    Optional as _Optional, Text as _Text, Tuple as _Tuple, List as _List, Union as _Union
 from dataclasses import dataclass as _dataclass, field as _field
 
-from . import compiler, cpp, parser, parsers, utils
+from . import cache, cc1, compiler, cpp, discovery, fragments, interning, memory, parser, parsers, report, schedule, \
+    snapshot, stats, utils
+from .report import FileFailure as _FileFailure, LoadReport as _LoadReport
+from .stats import FileStats as _FileStats, LoadStats as _LoadStats
 
 
 @_dataclass
@@ -22,50 +25,248 @@ class SrcData:
     '''
     scope: cpp.Scope = _field(default_factory=cpp.Scope)
     macros: _Dict[_Text, _Text] = _field(default_factory=dict)
+    stats: _Optional[_LoadStats] = _field(default=None, repr=False, compare=False)
+    report: _Optional[_LoadReport] = _field(default=None, repr=False, compare=False)
+    _interner: _Optional[interning.Interner] = _field(default=None, init=False, repr=False, compare=False)
+
+    def _get_interner(self) -> interning.Interner:
+        if self._interner is None:
+            self._interner = interning.Interner()
+            self._interner.intern_scope(self.scope)
+        return self._interner
+
+    def merge(self, other: 'SrcData') -> _List[cpp.Conflict]:
+        '''
+        Merges the data of another SrcData object into this one (see ``cpp.merge``).
+
+        Immutable values (and macros) from ``other`` that are equal to values that were already merged are
+        replaced with the existing objects, so memory scales with the unique content.
+        Macros from ``other`` override existing macros with the same name.
+
+        @returns A list of the names that had different values in both objects (``other``'s values are kept).
+        '''
+        conflicts = []
+        if other.scope is not self.scope:
+            self._get_interner().intern_scope(other.scope)
+            conflicts = cpp.merge(self.scope, other.scope)
+        if other.macros is not self.macros:
+            self.macros.update(self._get_interner().intern_mapping(other.macros))  # pylint: disable=no-member
+        if other.stats is not None and other.stats is not self.stats:
+            if self.stats is None:
+                self.stats = _LoadStats()
+            self.stats.update(other.stats)
+        if other.report is not None and other.report is not self.report:
+            if self.report is None:
+                self.report = _LoadReport()
+            self.report.update(other.report)
+        return conflicts
 
     def update(self, other):
         '''
-        Updates its data with the data of another SrcData object.
+        Updates its data with the data of another SrcData object. See ``merge``.
+        '''
+        self.merge(other)
+
+    def dump_snapshot(self, path: _Path):
+        '''
+        Save the scope and macros to a binary snapshot file.
+        '''
+        snapshot.dump(path, self.scope, self.macros)
+
+    @classmethod
+    def load_snapshot(cls, path: _Path) -> 'SrcData':
+        '''
+        Open a snapshot file created by dump_snapshot().
+
+        The file is memory-mapped and namespaces and values are only deserialized when they are first accessed.
+        '''
+        opened = snapshot.Snapshot(path)
+        return cls(opened.scope, opened.macros)
+
+    def digest(self) -> bytes:
+        '''
+        A digest of the scope and the macros.
+
+        The scope's digest is cached until it is changed (see ``cpp.Scope.digest``), the macros are hashed on
+        every call.
+        '''
+        hash_object = cpp.digests.hasher(b'data')
+        hash_object.update(self.scope.digest())
+        for name in sorted(self.macros):
+            cpp.digests.update(hash_object, name)
+            cpp.digests.update(hash_object, self.macros[name])
+        return hash_object.digest()
+
+    def memory_report(self, largest: int = 10) -> memory.MemoryReport:
+        '''
+        Account for the approximate memory that the scope and the macros retain, per top-level namespace and per
+        kind of value, in a single walk (see ``memory.measure``). Lazy values are not computed.
+
+        @param largest  The number of largest values to report.
         '''
-        self.scope.update(other.scope)
-        self.macros.update(other.macros)  # pylint: disable=no-member
+        return memory.measure(self.scope, self.macros, largest)
 
     # Implement the Iterable protocol to allow unpacking.
     def __iter__(self):
         return iter((self.scope, self.macros))
 
 
-def _load_file(filename: _Path, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
-               initial_scope: cpp.Scope = None, exec_path: _Path = None,
-               commands_parser: compiler.CommandsParser = None, **run_plugin_kwargs) -> SrcData:
-    assert os.path.isfile(filename) or filename == compiler.Clang.STDIN_FILENAME
+@_dataclass
+class SrcDiff:
+    '''
+    dataclass used to store the differences between two SrcData objects (see ``diff``).
+    '''
+    scope: _List[cpp.Change] = _field(default_factory=list)
+    macros: _List[cpp.Change] = _field(default_factory=list)
 
+    def __bool__(self):
+        return bool(self.scope or self.macros)
+
+
+def diff(old: SrcData, new: SrcData) -> SrcDiff:
+    '''
+    Find the constants and macros that were added, removed or changed between two SrcData objects.
+
+    Only the namespaces whose digests differ are compared (see ``cpp.diff``), so comparing two large scopes
+    takes time proportional to the namespaces that changed once their digests are computed.
+
+    @param old  The old data (f.e. loaded from a previous revision's snapshot).
+    @param new  The new data.
+
+    @returns SrcDiff, which is falsy if there are no differences.
+    '''
+    macros = [cpp.Change(cpp.Change.ADDED, name, None, value) if name not in old.macros else
+              cpp.Change(cpp.Change.CHANGED, name, old.macros[name], value)
+              for name, value in new.macros.items() if old.macros.get(name) != value]
+    macros.extend(cpp.Change(cpp.Change.REMOVED, name, value, None)
+                  for name, value in old.macros.items() if name not in new.macros)
+    return SrcDiff(cpp.diff(old.scope, new.scope), macros)
+
+
+def _make_clang(exec_path: _Path = None, commands_parser: compiler.CommandsParser = None, *,
+                verbose: bool = False, file_stats: _FileStats = None, cc1_resolver: cc1.Cc1Resolver = None,
+                predefined_macros: compiler.PredefinedMacros = None) -> compiler.Clang:
     if exec_path:
-        clang = compiler.Clang(exec_path, commands_parser=commands_parser, verbose=verbose)
+        clang = compiler.Clang(exec_path, commands_parser=commands_parser, verbose=verbose, stats=file_stats,
+                               cc1_resolver=cc1_resolver, predefined_macros=predefined_macros)
     else:
-        clang = compiler.Clang(commands_parser=commands_parser, verbose=verbose)
+        clang = compiler.Clang(commands_parser=commands_parser, verbose=verbose, stats=file_stats,
+                               cc1_resolver=cc1_resolver, predefined_macros=predefined_macros)
 
     plugins_lib = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins', 'ConstantsDumper.so')
     clang.register_plugin(plugins_lib, 'TypesDumper')
     clang.register_plugin(plugins_lib, 'ConstantsDumper')
 
-    consts_txt = clang.run_plugins(filename, extra_args, check=True, **run_plugin_kwargs).stdout
+    return clang
 
+
+def _parse(consts_txt: _Text, initial_scope: cpp.Scope = None, file_stats: _FileStats = None,
+           lazy: bool = False, types_scope: cpp.Scope = None) -> cpp.Scope:
     consts_parser = parser.Parser(
         parsers.RecordsParser(),
         parsers.EnumsParser(),
-        parsers.ConstantsParser(),
-        parsers.LiteralsParser(),
+        parsers.ConstantsParser(lazy=lazy),
+        parsers.LiteralsParser(lazy=lazy),
     )
 
-    return SrcData(consts_parser.parse(consts_txt, initial_scope=initial_scope, strict=True),
-                   clang.get_macros(filename, extra_args, **run_plugin_kwargs))
+    if file_stats is None:
+        return consts_parser.parse(consts_txt, initial_scope=initial_scope, strict=True, types_scope=types_scope)
+
+    with file_stats.measure('parse'):
+        file_stats.parsed_lines += consts_txt.count('\n')
+        return consts_parser.parse(consts_txt, initial_scope=initial_scope, strict=True, types_scope=types_scope)
+
+
+def _new_file_stats(filename: _Path, collect_stats: bool) -> _Optional[_FileStats]:
+    if not collect_stats:
+        return None
+    return _FileStats('<stdin>' if filename == compiler.Clang.STDIN_FILENAME else os.fsdecode(filename))
+
+
+def _load_file(filename: _Path, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
+               initial_scope: cpp.Scope = None, exec_path: _Path = None,
+               commands_parser: compiler.CommandsParser = None, collect_stats: bool = False, lazy: bool = False,
+               fragment_cache: fragments.FragmentCache = None, cc1_resolver: cc1.Cc1Resolver = None,
+               predefined_macros: compiler.PredefinedMacros = None, include_predefined: bool = True,
+               types_scope: cpp.Scope = None, **run_plugin_kwargs) -> SrcData:
+    assert os.path.isfile(filename) or filename == compiler.Clang.STDIN_FILENAME
+
+    file_stats = _new_file_stats(filename, collect_stats)
+    clang = _make_clang(exec_path, commands_parser, verbose=verbose, file_stats=file_stats, cc1_resolver=cc1_resolver,
+                        predefined_macros=predefined_macros)
+
+    if fragment_cache is None:
+        with clang._measure('plugins'):  # pylint: disable=protected-access
+            consts_txt = clang.run_plugins(filename, extra_args, check=True, **run_plugin_kwargs).stdout
+
+        return SrcData(_parse(consts_txt, initial_scope=initial_scope, file_stats=file_stats, lazy=lazy,
+                              types_scope=types_scope),
+                       clang.get_macros(filename, extra_args, include_predefined=include_predefined,
+                                        **run_plugin_kwargs),
+                       _LoadStats([file_stats]) if file_stats else None)
+
+    # The macros are part of the fragments' keys
+    macros = clang.get_macros(filename, extra_args, include_predefined=include_predefined, **run_plugin_kwargs)
+    with clang._measure('plugins'):  # pylint: disable=protected-access
+        consts_txt, fragment_keys = fragments.run_plugins(clang, filename, extra_args, macros, fragment_cache,
+                                                          **run_plugin_kwargs)
+
+    scope = _parse(consts_txt, initial_scope=initial_scope, file_stats=file_stats, lazy=lazy, types_scope=types_scope)
+    fragment_cache.mark_parsed(fragment_keys)
+    return SrcData(scope, macros, _LoadStats([file_stats]) if file_stats else None)
+
+
+_ClangOutput = _Tuple[_Text, _Dict[_Text, _Text], _List[_Text]]
+
+
+async def _run_clang_async(filename: _Path, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
+                           exec_path: _Path = None, commands_parser: compiler.CommandsParser = None,
+                           file_stats: _FileStats = None, fragment_cache: fragments.FragmentCache = None,
+                           cc1_resolver: cc1.Cc1Resolver = None, predefined_macros: compiler.PredefinedMacros = None,
+                           include_predefined: bool = True, **run_plugin_kwargs) -> _ClangOutput:
+    '''
+    Run clang on a file, returns the plugins' output, the macros and the keys of the fragments in the output.
+    '''
+    assert os.path.isfile(filename) or filename == compiler.Clang.STDIN_FILENAME
+
+    clang = _make_clang(exec_path, commands_parser, verbose=verbose, file_stats=file_stats, cc1_resolver=cc1_resolver,
+                        predefined_macros=predefined_macros)
+
+    if fragment_cache is None:
+        with clang._measure('plugins'):  # pylint: disable=protected-access
+            consts_txt = (await clang.run_plugins_async(filename, extra_args, check=True, **run_plugin_kwargs)).stdout
+
+        return consts_txt, await clang.get_macros_async(filename, extra_args, include_predefined=include_predefined,
+                                                        **run_plugin_kwargs), []
+
+    macros = await clang.get_macros_async(filename, extra_args, include_predefined=include_predefined,
+                                          **run_plugin_kwargs)
+    with clang._measure('plugins'):  # pylint: disable=protected-access
+        consts_txt, fragment_keys = await fragments.run_plugins_async(clang, filename, extra_args, macros,
+                                                                      fragment_cache, **run_plugin_kwargs)
+    return consts_txt, macros, fragment_keys
+
+
+async def _try_run_clang_async(filename: _Path, /,
+                               **kwargs) -> _Union[_ClangOutput, _FileFailure]:
+    '''
+    Like _run_clang_async, but a failure is returned instead of being raised.
+    '''
+    start_time = time.perf_counter()
+    try:
+        return await _run_clang_async(filename, **kwargs)
+    except report.LOAD_ERRORS as error:
+        return _FileFailure.from_error(filename, error, time.perf_counter() - start_time)
 
 
 def load_path(*paths: _Iterable[_Path], extra_args: _Iterable[_Text] = None,
               verbose: bool = False, initial_scope: cpp.Scope = None,
               clang_path: _Path = None, commands_parser: compiler.CommandsParser = None,
-              excludes: _List = None, **run_plugin_kwargs) -> SrcData:
+              excludes: _List = None, collect_stats: bool = False, compact: bool = False, lazy: bool = False,
+              skip_covered: bool = False, keep_going: bool = False, timeout: float = None,
+              retry_failed: _LoadReport = None, shard: _Tuple[int, int] = None, cache_fragments: bool = False,
+              direct_cc1: bool = False, cache_predefined: bool = False, include_predefined: bool = True,
+              **run_plugin_kwargs) -> SrcData:
     '''
     Load all constants from ``path`` (a ``str`` or ``bytes`` instance containing a
     path to a file or a directory containing C++ code) to a Python object.
@@ -79,39 +280,98 @@ def load_path(*paths: _Iterable[_Path], extra_args: _Iterable[_Text] = None,
     @param clang_path   The full path of the clang executable.
     @param commands_parser The CommandsParser object the compiler should use.
     @param run_plugin_kwargs Additional args for run_plugin().
-    @param excludes     List of glob paths to exclude when searching within a directory.
+    @param excludes     List of glob paths to exclude when searching within a directory. Directories that
+                        match a pattern that ends with '*' (f.e. 'build/*') are not searched at all.
+    @param collect_stats If ``True``, per-file and per-phase statistics are collected into the
+                        returned object's ``stats``.
+    @param compact      If ``True``, the returned scope uses the memory-compact representation
+                        (see ``cpp.compact``) and namespaces without values are removed.
+    @param lazy         If ``True``, values are only parsed (and strings decoded) when they are first
+                        accessed in the scope. Useful when only a few values are read.
+    @param skip_covered If ``True``, files whose includes are all included by other loaded files, and that
+                        don't define constants themselves, are not loaded (see ``schedule.schedule``).
+                        Assumes that headers produce the same constants in every file that includes them.
+    @param keep_going   If ``True``, files that fail to load (or to parse) are skipped and listed in the
+                        returned object's ``report`` instead of raising an error.
+    @param timeout      The maximal time (in seconds) for every clang process, hung processes are killed.
+                        A timeout fails the file (``subprocess.TimeoutExpired`` is raised unless ``keep_going``).
+    @param retry_failed A LoadReport of a previous call with the same paths, only the files that failed in
+                        that call are loaded.
+    @param shard        An ``(index, count)`` pair: only load the files of the 0-based ``index``-th shard out
+                        of ``count`` shards (see ``discovery.shard``). Merging the results of all shards in
+                        the order of their indices gives the same values as loading all files at once.
+    @param cache_fragments If ``True``, the plugins' output is cached per file (see ``fragments``), unchanged
+                        files are skipped by the plugins and are parsed once. Cached fragments are shared by
+                        all the files (and projects) that include the same headers.
+    @param direct_cc1   If ``True``, the clang frontend (``clang -cc1``) is run directly instead of the driver
+                        (see ``cc1``). The frontend command line is resolved once per distinct set of flags and
+                        cached, flags that can't be mapped fall back to the driver.
+    @param cache_predefined If ``True``, the compiler's predefined macros (f.e. ``__GNUC__``) are computed once per
+                        clang executable and set of language flags and cached (see ``compiler.PredefinedMacros``),
+                        and only the macros that the files define (or change) are expanded for every file.
+    @param include_predefined If ``False``, the predefined macros that the files don't change are omitted from the
+                        returned macros (implies ``cache_predefined``).
 
     @returns SrcData
     '''
-    returned_data = SrcData()
+    start_time = time.perf_counter()
+
+    returned_data = SrcData(cpp.CompactScope() if compact else cpp.Scope())
     if initial_scope is not None:
         returned_data.scope = initial_scope
+    if collect_stats:
+        returned_data.stats = _LoadStats()
 
-    source_files = set()
-    for path in paths:
-        if os.path.isfile(path):
-            source_files.add(path)
-        elif os.path.isdir(path):
-            source_files |= {os.path.join(dirpath, filename) for dirpath, _, files in os.walk(path) for filename in files
-                             if os.path.splitext(filename)[-1] in compiler.CPP_SOURCE_FILES_EXTENSIONS}
-        else:
-            source_files |= {path for path in glob.iglob(path, recursive=True) if os.path.isfile(path)}
+    if keep_going:
+        returned_data.report = _LoadReport()
+    if timeout is not None:
+        run_plugin_kwargs['timeout'] = timeout
 
-    excludes = excludes or []
-    for exclude_pattern in excludes:
-        source_files -= set(fnmatch.filter(source_files, f'**{exclude_pattern}'))
+    source_files = discovery.iter_source_files(paths, excludes)
+    if shard is not None:
+        source_files = discovery.shard(source_files, *shard)
+    if retry_failed is not None:
+        source_files = retry_failed.select(source_files)
+    cc1_resolver = cc1.Cc1Resolver() if direct_cc1 else None
+    predefined_macros = compiler.PredefinedMacros() if cache_predefined or not include_predefined else None
+    if skip_covered:
+        source_files = schedule.schedule(_make_clang(clang_path, commands_parser, verbose=verbose,
+                                                     cc1_resolver=cc1_resolver),
+                                         list(source_files), extra_args, **run_plugin_kwargs)
 
+    fragment_cache = fragments.FragmentCache() if cache_fragments else None
     for filename in source_files:
-        returned_data.update(_load_file(filename, extra_args=extra_args, verbose=verbose,
-                                        initial_scope=returned_data.scope, exec_path=clang_path,
-                                        commands_parser=commands_parser, **run_plugin_kwargs))
+        file_start_time = time.perf_counter()
+        try:
+            # Every file is parsed into a new scope, so a file that fails to parse doesn't leave values behind
+            returned_data.update(_load_file(filename, extra_args=extra_args, verbose=verbose,
+                                            types_scope=returned_data.scope, exec_path=clang_path,
+                                            commands_parser=commands_parser, collect_stats=collect_stats, lazy=lazy,
+                                            fragment_cache=fragment_cache, cc1_resolver=cc1_resolver,
+                                            predefined_macros=predefined_macros,
+                                            include_predefined=include_predefined, **run_plugin_kwargs))
+        except report.LOAD_ERRORS as error:
+            if not keep_going:
+                raise
+            returned_data.report.failures.append(
+                _FileFailure.from_error(filename, error, time.perf_counter() - file_start_time))
+
+    # The interning table keeps every unique value alive, it is only needed while merging the files
+    returned_data._interner = None  # pylint: disable=protected-access
+
+    if compact:
+        returned_data.scope = cpp.compact(returned_data.scope)
+
+    if collect_stats:
+        returned_data.stats.wall_time = time.perf_counter() - start_time
 
     return returned_data
 
 
 def loads(code: _Text, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
           initial_scope: cpp.Scope = None, clang_path: _Path = None,
-          commands_parser: compiler.CommandsParser = None, **run_plugin_kwargs) -> SrcData:
+          commands_parser: compiler.CommandsParser = None, collect_stats: bool = False, lazy: bool = False,
+          **run_plugin_kwargs) -> SrcData:
     '''
     Load all constants from ``code`` (a ``str`` instance containing C++ code) to a
     Python object.
@@ -122,18 +382,22 @@ def loads(code: _Text, /, extra_args: _Iterable[_Text] = None, *, verbose: bool
     @param initial_scope The initial scope to use, defaults to a new empty scope.
     @param clang_path   The full path of the clang executable.
     @param commands_parser The CommandsParser object the compiler should use.
+    @param collect_stats If ``True``, per-phase statistics are collected into the returned object's ``stats``.
+    @param lazy         If ``True``, values are only parsed when they are first accessed (see ``load_path``).
     @param run_plugin_kwargs Additional args for run_plugin().
 
     @returns Scope
     '''
     return _load_file(compiler.Clang.STDIN_FILENAME, extra_args=extra_args, verbose=verbose,
                       initial_scope=initial_scope, exec_path=clang_path,
-                      commands_parser=commands_parser, input=code, **run_plugin_kwargs)
+                      commands_parser=commands_parser, collect_stats=collect_stats, lazy=lazy, input=code,
+                      **run_plugin_kwargs)
 
 
 def load(source_file: _IO, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
          initial_scope: cpp.Scope = None, clang_path: _Path = None,
-         commands_parser: compiler.CommandsParser = None, **run_plugin_kwargs) -> cpp.Scope:
+         commands_parser: compiler.CommandsParser = None, collect_stats: bool = False, lazy: bool = False,
+         **run_plugin_kwargs) -> cpp.Scope:
     '''
     Load all constants from ``source_file`` (a ``.read()``-supporting file-like object
     containing C++ code) to a Python object.
@@ -144,9 +408,186 @@ def load(source_file: _IO, /, extra_args: _Iterable[_Text] = None, *, verbose: b
     @param initial_scope The initial scope to use, defaults to a new empty scope.
     @param clang_path   The full path of the clang executable.
     @param commands_parser The CommandsParser object the compiler should use.
+    @param collect_stats If ``True``, per-phase statistics are collected into the returned object's ``stats``.
+    @param lazy         If ``True``, values are only parsed when they are first accessed (see ``load_path``).
     @param run_plugin_kwargs Additional args for run_plugin().
 
     @returns Scope
     '''
     return loads(source_file.read(), extra_args=extra_args, verbose=verbose, initial_scope=initial_scope,
-                 clang_path=clang_path, commands_parser=commands_parser, **run_plugin_kwargs)
+                 clang_path=clang_path, commands_parser=commands_parser, collect_stats=collect_stats, lazy=lazy,
+                 **run_plugin_kwargs)
+
+
+async def load_path_async(*paths: _Iterable[_Path], extra_args: _Iterable[_Text] = None,
+                          verbose: bool = False, initial_scope: cpp.Scope = None,
+                          clang_path: _Path = None, commands_parser: compiler.CommandsParser = None,
+                          excludes: _List = None, max_concurrency: int = None,
+                          limiter: asyncio.Semaphore = None, collect_stats: bool = False, compact: bool = False,
+                          lazy: bool = False, skip_covered: bool = False, keep_going: bool = False,
+                          timeout: float = None, retry_failed: _LoadReport = None, shard: _Tuple[int, int] = None,
+                          cache_fragments: bool = False, direct_cc1: bool = False, cache_predefined: bool = False,
+                          include_predefined: bool = True, **run_plugin_kwargs) -> SrcData:
+    '''
+    Load all constants from ``paths`` without blocking the event loop.
+
+    Clang runs concurrently for all files (limited by ``limiter`` or ``max_concurrency``), the outputs are
+    parsed in the same order as ``load_path`` would. If the call is cancelled or a file fails to compile,
+    all running clang processes are killed.
+
+    @param paths        The paths of the files/directories to load. See ``load_path``.
+    @param extra_args   Additional compilation arguments on top of the compile commands.
+    @param verbose      If ``True`` is provided, don't suppress compiler errors.
+    @param initial_scope The initial scope to use, defaults to a new empty scope.
+    @param clang_path   The full path of the clang executable.
+    @param commands_parser The CommandsParser object the compiler should use.
+    @param excludes     List of glob paths to exclude when searching within a directory. See ``load_path``.
+    @param max_concurrency The maximal number of clang processes to run at once. Defaults to the CPU count.
+                        Ignored if ``limiter`` is provided.
+    @param limiter      A semaphore to limit the number of concurrent clang processes with. Share a single
+                        semaphore between calls to limit the total number of clang processes.
+    @param collect_stats If ``True``, per-file and per-phase statistics are collected into the
+                        returned object's ``stats``.
+    @param compact      If ``True``, the returned scope uses the memory-compact representation
+                        (see ``cpp.compact``) and namespaces without values are removed.
+    @param lazy         If ``True``, values are only parsed when they are first accessed (see ``load_path``).
+    @param skip_covered If ``True``, files that don't add anything are not loaded (see ``load_path``).
+    @param keep_going   If ``True``, failures are listed in the returned object's ``report`` instead of
+                        raising an error (see ``load_path``). The elapsed times of failures include the time
+                        spent waiting for ``limiter``.
+    @param timeout      The maximal time (in seconds) for every clang process (see ``load_path``).
+    @param retry_failed Only load the files that failed in the given LoadReport (see ``load_path``).
+    @param shard        Only load the files of the ``(index, count)`` shard (see ``load_path``).
+    @param cache_fragments If ``True``, the plugins' output is cached per file (see ``load_path``).
+    @param direct_cc1   If ``True``, the clang frontend is run directly (see ``load_path``).
+    @param cache_predefined If ``True``, the predefined macros are computed once and cached (see ``load_path``).
+    @param include_predefined If ``False``, unchanged predefined macros are omitted (see ``load_path``).
+    @param run_plugin_kwargs Additional args for run_plugin().
+
+    @returns SrcData
+    '''
+    start_time = time.perf_counter()
+
+    returned_data = SrcData(cpp.CompactScope() if compact else cpp.Scope())
+    if initial_scope is not None:
+        returned_data.scope = initial_scope
+    if collect_stats:
+        returned_data.stats = _LoadStats()
+
+    if keep_going:
+        returned_data.report = _LoadReport()
+    if timeout is not None:
+        run_plugin_kwargs['timeout'] = timeout
+
+    if limiter is None:
+        limiter = asyncio.Semaphore(max_concurrency or os.cpu_count() or 1)
+
+    loop = asyncio.get_running_loop()
+    source_files = await loop.run_in_executor(None, lambda: list(discovery.iter_source_files(paths, excludes)))
+    if shard is not None:
+        source_files = discovery.shard(source_files, *shard)
+    if retry_failed is not None:
+        source_files = retry_failed.select(source_files)
+    cc1_resolver = cc1.Cc1Resolver() if direct_cc1 else None
+    predefined_macros = compiler.PredefinedMacros() if cache_predefined or not include_predefined else None
+    if skip_covered:
+        source_files = await loop.run_in_executor(
+            None, lambda: schedule.schedule(_make_clang(clang_path, commands_parser, verbose=verbose,
+                                                        cc1_resolver=cc1_resolver),
+                                            source_files, extra_args, **run_plugin_kwargs))
+
+    fragment_cache = fragments.FragmentCache() if cache_fragments else None
+    files_stats = [_new_file_stats(filename, collect_stats) for filename in source_files]
+    run_clang = _try_run_clang_async if keep_going else _run_clang_async
+    # All tasks start at once, the elapsed times of failures are measured from here like in _try_run_clang_async
+    tasks_start_time = time.perf_counter()
+    tasks = [asyncio.ensure_future(run_clang(filename, extra_args=extra_args, verbose=verbose,
+                                             exec_path=clang_path, commands_parser=commands_parser,
+                                             file_stats=file_stats, limiter=limiter, fragment_cache=fragment_cache,
+                                             cc1_resolver=cc1_resolver, predefined_macros=predefined_macros,
+                                             include_predefined=include_predefined, **run_plugin_kwargs))
+             for filename, file_stats in zip(source_files, files_stats)]
+    try:
+        for filename, task, file_stats in zip(source_files, tasks, files_stats):
+            result = await task
+            if isinstance(result, _FileFailure):
+                returned_data.report.failures.append(result)
+                continue
+
+            consts_txt, macros, fragment_keys = result
+            try:
+                # A new scope, like in load_path
+                scope = await loop.run_in_executor(None, _parse, consts_txt, None, file_stats, lazy,
+                                                   returned_data.scope)
+            except parser.ParsingError as error:
+                if not keep_going:
+                    raise
+                returned_data.report.failures.append(
+                    _FileFailure.from_error(filename, error, time.perf_counter() - tasks_start_time))
+                continue
+            if fragment_cache is not None:
+                fragment_cache.mark_parsed(fragment_keys)
+            returned_data.update(SrcData(scope, macros, _LoadStats([file_stats]) if file_stats else None))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # The interning table keeps every unique value alive, it is only needed while merging the files
+    returned_data._interner = None  # pylint: disable=protected-access
+
+    if compact:
+        returned_data.scope = cpp.compact(returned_data.scope)
+
+    if collect_stats:
+        returned_data.stats.wall_time = time.perf_counter() - start_time
+
+    return returned_data
+
+
+async def loads_async(code: _Text, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
+                      initial_scope: cpp.Scope = None, clang_path: _Path = None,
+                      commands_parser: compiler.CommandsParser = None, limiter: asyncio.Semaphore = None,
+                      collect_stats: bool = False, lazy: bool = False, **run_plugin_kwargs) -> SrcData:
+    '''
+    Load all constants from ``code`` (a ``str`` instance containing C++ code) without blocking the event loop.
+    If the call is cancelled, the running clang process is killed.
+
+    @param code         The code to load.
+    @param extra_args   Additional compilation arguments on top of the compile commands.
+    @param verbose      If ``True`` is provided, don't suppress compiler errors.
+    @param initial_scope The initial scope to use, defaults to a new empty scope.
+    @param clang_path   The full path of the clang executable.
+    @param commands_parser The CommandsParser object the compiler should use.
+    @param limiter      A semaphore to limit the number of concurrent clang processes with.
+    @param collect_stats If ``True``, per-phase statistics are collected into the returned object's ``stats``.
+    @param lazy         If ``True``, values are only parsed when they are first accessed (see ``load_path``).
+    @param run_plugin_kwargs Additional args for run_plugin().
+
+    @returns SrcData
+    '''
+    file_stats = _new_file_stats(compiler.Clang.STDIN_FILENAME, collect_stats)
+    consts_txt, macros, _ = await _run_clang_async(compiler.Clang.STDIN_FILENAME, extra_args=extra_args,
+                                                   verbose=verbose, exec_path=clang_path,
+                                                   commands_parser=commands_parser, file_stats=file_stats,
+                                                   input=code, limiter=limiter, **run_plugin_kwargs)
+
+    loop = asyncio.get_running_loop()
+    return SrcData(await loop.run_in_executor(None, _parse, consts_txt, initial_scope, file_stats, lazy), macros,
+                   _LoadStats([file_stats]) if file_stats else None)
+
+
+async def load_async(source_file: _IO, /, extra_args: _Iterable[_Text] = None, *, verbose: bool = False,
+                     initial_scope: cpp.Scope = None, clang_path: _Path = None,
+                     commands_parser: compiler.CommandsParser = None, limiter: asyncio.Semaphore = None,
+                     collect_stats: bool = False, lazy: bool = False, **run_plugin_kwargs) -> SrcData:
+    '''
+    Load all constants from ``source_file`` (a ``.read()``-supporting file-like object containing C++ code)
+    without blocking the event loop. See ``loads_async``.
+
+    @returns SrcData
+    '''
+    return await loads_async(source_file.read(), extra_args=extra_args, verbose=verbose,
+                             initial_scope=initial_scope, clang_path=clang_path,
+                             commands_parser=commands_parser, limiter=limiter, collect_stats=collect_stats,
+                             lazy=lazy, **run_plugin_kwargs)
@@ -5,10 +5,16 @@ The main entry for the pyheaders package to allow it to run as a command-line to
 '''
 import sys
 import argparse
+import json
+import subprocess
+import tracemalloc
 
-from . import load_path
+from . import SrcData, codegen, diff, load_path
+from .cpp import BaseScope, Change
 from .compiler import PluginError, CommandsParser
-from .utils import enums, pretty_print, tree
+from .snapshot import SnapshotError, is_snapshot
+from .report import LoadReport
+from .utils import dump_json, entries, enums, pretty_print, to_json, tree
 
 try:
     import argcomplete
@@ -20,7 +26,17 @@ def handle_print(args, data):
     '''
     Handle the `print` subparser.
     '''
-    if args.tree:
+    if args.memory:
+        print(data.memory_report().summary())
+    elif args.format != 'text':
+        if args.enums:
+            items = enums(data.scope)
+        elif args.macros:
+            items = ((name, value) for name, value in sorted(data.macros.items()) if not name.startswith('_'))
+        else:
+            items = entries(data.scope)
+        dump_json(items, lines=args.format == 'ndjson')
+    elif args.tree:
         tree(data.scope)
     elif args.enums:
         print('\n'.join(f'{name}\t[{", ".join(val)}]' for name, val in enums(data.scope)))
@@ -59,6 +75,109 @@ def handle_get(args, data):
     return found
 
 
+def _codegen_fingerprint(args, extra_args):
+    return codegen.fingerprint(args.files, args.excludes, extra_args=extra_args, clang_path=args.clang_path,
+                               ignore_cmds=args.ignore_cmds, package=args.package)
+
+
+def handle_codegen(args, data):
+    '''
+    Handle the `codegen` subparser.
+    '''
+    try:
+        codegen.write_package(data.scope, args.output, args.package, args.fingerprint)
+    except (OSError, ValueError, TypeError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return False
+
+    return True
+
+
+def handle_snapshot(args, data):
+    '''
+    Handle the `snapshot` subparser.
+    '''
+    try:
+        data.dump_snapshot(args.output)
+    except OSError as error:
+        print(f'error: {error}', file=sys.stderr)
+        return False
+
+    return True
+
+
+def handle_merge(args):
+    '''
+    Handle the `merge` subparser.
+    '''
+    data = SrcData()
+    try:
+        for path in args.snapshots:
+            data.merge(SrcData.load_snapshot(path))
+        data.dump_snapshot(args.output)
+    except (OSError, ValueError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return False
+
+    return True
+
+
+_CHANGE_MARKS = {Change.ADDED: '+', Change.REMOVED: '-', Change.CHANGED: '~'}
+
+
+def _describe(value):
+    if isinstance(value, BaseScope):
+        # A record whose name or fields changed
+        return f'record {value.name}({", ".join(value.fields)})'
+    return repr(value)
+
+
+def handle_diff(args):
+    '''
+    Handle the `diff` subparser.
+    '''
+    try:
+        changes = diff(SrcData.load_snapshot(args.old), SrcData.load_snapshot(args.new))
+    except (OSError, ValueError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 2
+
+    items = changes.scope
+    if args.macros:
+        items = [change for change in changes.macros if not change.name.startswith('_')]
+
+    encode = json.JSONEncoder(ensure_ascii=False, allow_nan=False).encode
+    for change in items:
+        if args.format == 'ndjson':
+            print(encode({'change': change.kind, 'name': change.name,
+                          'old': to_json(change.old), 'new': to_json(change.new)}))
+        elif change.kind == Change.CHANGED:
+            print(f'{_CHANGE_MARKS[change.kind]} {change.name} = {_describe(change.old)} -> {_describe(change.new)}')
+        else:
+            value = change.old if change.kind == Change.REMOVED else change.new
+            print(f'{_CHANGE_MARKS[change.kind]} {change.name} = {_describe(value)}')
+
+    return 1 if items else 0
+
+
+def _load(args, extra_args):
+    # Snapshots (f.e. of other shards) are merged after the sources are loaded, in the given order
+    sources = [path for path in args.files if not is_snapshot(path)]
+    data = SrcData()
+    if sources:
+        data = load_path(*sources, extra_args=extra_args, clang_path=args.clang_path, verbose=args.verbose,
+                         commands_parser=args.commands_parser, ignore_cmds=args.ignore_cmds, excludes=args.excludes,
+                         collect_stats=args.timings, lazy=args.lazy, skip_covered=args.skip_covered,
+                         keep_going=args.keep_going or args.failures_report is not None, timeout=args.timeout,
+                         retry_failed=args.retry_failed, shard=args.shard, cache_fragments=args.cache_fragments,
+                         direct_cc1=args.direct_cc1, cache_predefined=args.cache_predefined,
+                         include_predefined=args.include_predefined)
+    for path in args.files:
+        if path not in sources:
+            data.merge(SrcData.load_snapshot(path))
+    return data
+
+
 def compile_commands(path):
     '''
     Creates a CommandsParser, used as an argparse argument type
@@ -66,6 +185,30 @@ def compile_commands(path):
     return CommandsParser(commands_path=path)
 
 
+def failures_report(path):
+    '''
+    Reads a LoadReport, used as an argparse argument type
+    '''
+    try:
+        return LoadReport.load(path)
+    except OSError as error:
+        raise argparse.ArgumentTypeError(f"can't read {path!r}: {error.strerror}") from error
+
+
+def shard_spec(spec):
+    '''
+    Parses a shard in the form of INDEX/COUNT (f.e. 0/4), used as an argparse argument type
+    '''
+    index, _, count = spec.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f"invalid shard {spec!r}, expected INDEX/COUNT") from error
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard {spec!r}, expected 0 <= INDEX < COUNT")
+    return index, count
+
+
 class AppendWithName(argparse.Action):  # pylint: disable=too-few-public-methods
     '''
     Action that appends the given flag values to a list in a tuple with the flag name.
@@ -86,11 +229,12 @@ def main():
     pyheaders' main entrypoint.
     '''
     parser = argparse.ArgumentParser(description="A command-line tool for parsing C++ source/header files")
-    subparsers = parser.add_subparsers(dest="print/get", required=True)
+    subparsers = parser.add_subparsers(dest="print/get/codegen/snapshot/merge/diff", required=True)
 
     base_parser = argparse.ArgumentParser(add_help=False)
     base_parser.add_argument('files', metavar='file', nargs='+',
-                             help="The files and directories that the constants are loaded from")
+                             help="The files and directories that the constants are loaded from, "
+                                  "snapshot files are merged after the other files are loaded")
     base_parser.add_argument('--exclude', dest="excludes", action='append',
                              help="The files and directories that will be excluded from the search")
     base_parser.add_argument('--clang-path', help="The full path to the clang executable")
@@ -100,6 +244,39 @@ def main():
                                         help="The path to the compile commands")
     compile_commands_flags.add_argument('--ignore-cmds', action='store_true', help="Ignore the compile commands")
 
+    base_parser.add_argument('--lazy', action='store_true',
+                             help="Only parse the values that are used (faster when getting a few values)")
+    base_parser.add_argument('--skip-covered', action='store_true',
+                             help="Don't load files that only include headers that other loaded files include")
+    base_parser.add_argument('--cache-fragments', action='store_true',
+                             help="Cache the constants of every header, unchanged headers are skipped in every file "
+                                  "(and project) that includes them")
+    base_parser.add_argument('--direct-cc1', action='store_true',
+                             help="Run the clang frontend directly instead of the driver (the frontend command line "
+                                  "is resolved once per set of flags and cached)")
+    base_parser.add_argument('--cache-predefined', action='store_true',
+                             help="Compute the compiler's predefined macros once per set of flags and cache them, "
+                                  "only the macros that the files define are expanded for every file")
+    base_parser.add_argument('--no-predefined', action='store_false', dest='include_predefined',
+                             help="Omit the compiler's predefined macros that the files don't change from the macros "
+                                  "(implies --cache-predefined)")
+    base_parser.add_argument('-k', '--keep-going', action='store_true',
+                             help="Skip files that fail to load instead of stopping at the first failure")
+    base_parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                             help="Kill clang processes that run for longer than SECONDS (the file fails)")
+    base_parser.add_argument('--failures-report', metavar='PATH',
+                             help="Write a JSON report of the files that failed to load (implies --keep-going)")
+    base_parser.add_argument('--retry-failed', type=failures_report, metavar='REPORT',
+                             help="Only load the files that failed according to a report from --failures-report")
+    base_parser.add_argument('--shard', type=shard_spec, metavar='INDEX/COUNT',
+                             help="Only load the files of one shard (0-based) out of COUNT shards, merging the "
+                                  "snapshots of all shards gives the values of loading all files at once")
+    base_parser.add_argument('--timings', action='store_true',
+                             help="Print per-phase timing statistics and the slowest files to stderr")
+    base_parser.add_argument('--trace-memory', action='store_true',
+                             help="Trace the memory allocations while loading (slower) and add the peak memory of "
+                                  "every phase to the timing statistics (implies --timings)")
+
     verbosity_flags = base_parser.add_mutually_exclusive_group()
     verbosity_flags.add_argument('--verbose', action='store_true', dest='verbose', help="Show every plugin error")
     verbosity_flags.add_argument('-q', '--quiet', action='store_false', dest='verbose', help="Mute all plugin errors")
@@ -111,6 +288,12 @@ def main():
     print_mode.add_argument('--tree', action='store_true', help="Print the constants in a tree-like format")
     print_mode.add_argument('--enums', action='store_true', help="Print the enums in enum formats")
     print_mode.add_argument('--macros', action='store_true', help="Print the macros after being expanded")
+    print_mode.add_argument('--memory', action='store_true',
+                            help="Print the approximate memory retained per top-level namespace and per kind of "
+                                 "value, and the largest values")
+    print_parser.add_argument('--format', choices=('text', 'json', 'ndjson'), default='text',
+                              help="The output format: human readable text (default), a single JSON object that "
+                                   "maps the fully qualified names to the values, or a JSON object per line")
     print_parser.set_defaults(cmd=handle_print)
 
     get_parser = subparsers.add_parser('get', parents=[base_parser], help="Get the values for given items")
@@ -124,16 +307,80 @@ def main():
                             help="Hide the names of the requested items")
     get_parser.set_defaults(cmd=handle_get)
 
+    codegen_parser = subparsers.add_parser('codegen', parents=[base_parser],
+                                           help="Generate a Python package with all constants")
+    codegen_parser.add_argument('--package', required=True, help="The name of the generated package")
+    codegen_parser.add_argument('-o', '--output', default='.',
+                                help="The directory to create the package in (default: the current directory)")
+    codegen_parser.add_argument('--force', action='store_true',
+                                help="Regenerate the package even if the inputs didn't change")
+    codegen_parser.set_defaults(cmd=handle_codegen)
+
+    snapshot_parser = subparsers.add_parser('snapshot', parents=[base_parser],
+                                            help="Save the constants and macros to a snapshot file")
+    snapshot_parser.add_argument('-o', '--output', required=True, help="The path of the snapshot file to create")
+    snapshot_parser.set_defaults(cmd=handle_snapshot)
+
+    merge_parser = subparsers.add_parser('merge', help="Merge snapshot files (f.e. of all shards) into one")
+    merge_parser.add_argument('snapshots', metavar='snapshot', nargs='+',
+                              help="The snapshot files, later snapshots override values of earlier ones")
+    merge_parser.add_argument('-o', '--output', required=True, help="The path of the snapshot file to create")
+    merge_parser.set_defaults(cmd=handle_merge)
+
+    diff_parser = subparsers.add_parser('diff', help="Compare the constants of two snapshot files, exits with 1 if "
+                                                     "they differ")
+    diff_parser.add_argument('old', help="The old snapshot file")
+    diff_parser.add_argument('new', help="The new snapshot file")
+    diff_parser.add_argument('--macros', action='store_true', help="Compare the macros instead of the constants")
+    diff_parser.add_argument('--format', choices=('text', 'ndjson'), default='text',
+                             help="The output format: a human readable line per added (+), removed (-) or changed "
+                                  "(~) name (default), or a JSON object per line")
+    diff_parser.set_defaults(cmd=handle_diff)
+
     if 'argcomplete' in sys.modules:
         argcomplete.autocomplete(parser)
 
     args, extra_args = parser.parse_known_args()
+    if args.cmd is handle_merge:
+        if extra_args:
+            parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+        sys.exit(0 if handle_merge(args) else 1)
+    if args.cmd is handle_diff:
+        if extra_args:
+            parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+        sys.exit(handle_diff(args))
+    if args.cmd is handle_print and (args.tree or args.memory) and args.format != 'text':
+        parser.error(f"{'--tree' if args.tree else '--memory'} can only be used with --format text")
+    if args.cmd is handle_codegen:
+        args.fingerprint = _codegen_fingerprint(args, extra_args)
+        if not args.force and codegen.is_up_to_date(args.output, args.package, args.fingerprint):
+            print(f'{args.package} is up to date', file=sys.stderr)
+            sys.exit(0)
+
+    if args.trace_memory:
+        args.timings = True
+        tracemalloc.start()
+
     try:
-        data = load_path(*args.files, extra_args=extra_args, clang_path=args.clang_path, verbose=args.verbose,
-                         commands_parser=args.commands_parser, ignore_cmds=args.ignore_cmds, excludes=args.excludes)
+        data = _load(args, extra_args)
     except PluginError:
         sys.exit(1)
+    except (subprocess.TimeoutExpired, SnapshotError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        sys.exit(1)
+    finally:
+        # The peaks were collected, the output doesn't have to be traced
+        if args.trace_memory:
+            tracemalloc.stop()
     success = args.cmd(args, data)
+    if args.timings and data.stats is not None:
+        print(data.stats.summary(), file=sys.stderr)
+    if data.report is not None:
+        if args.failures_report is not None:
+            data.report.dump(args.failures_report)
+        if data.report.failures:
+            print(data.report.summary(), file=sys.stderr)
+            success = False
     sys.exit(0 if success else 1)
 
 
@@ -0,0 +1,106 @@
+'''
+A persistent, best-effort cache for data that is expensive to compute (clang runs).
+'''
+import hashlib
+import json
+import os
+import tempfile
+
+from typing import Any, AnyStr, Dict, Iterable, List, Optional, Text
+
+CACHE_DIR_ENV = 'PYHEADERS_CACHE_DIR'
+
+
+def default_cache_dir() -> Text:
+    '''
+    Get the default cache directory: $PYHEADERS_CACHE_DIR, or $XDG_CACHE_HOME/pyheaders (~/.cache/pyheaders).
+    '''
+    if cache_dir := os.environ.get(CACHE_DIR_ENV):
+        return cache_dir
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'pyheaders')
+
+
+def make_key(*parts: Any) -> Text:
+    '''
+    Create a cache key from JSON-serializable parts.
+    '''
+    data = json.dumps(parts, sort_keys=True, default=os.fsdecode).encode('utf-8', 'surrogateescape')
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def file_stamps(filenames: Iterable[AnyStr]) -> Dict[Text, Optional[List[int]]]:
+    '''
+    Get the modification stamps of files, used to validate cached entries that depend on them.
+    Missing files have a ``None`` stamp.
+    '''
+    stamps = {}
+    for filename in filenames:
+        filename = os.fsdecode(filename)
+        try:
+            stat = os.stat(filename)
+            stamps[filename] = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            stamps[filename] = None
+    return stamps
+
+
+class DiskCache:
+    '''
+    A directory of JSON entries, in the ``namespace`` sub-directory of ``directory`` (defaults to
+    default_cache_dir()).
+
+    All errors are ignored (a missing or corrupt entry is a miss), so a read-only or full disk only
+    makes things slower. Entries are written atomically, so the cache can be shared by concurrent processes.
+    '''
+
+    def __init__(self, namespace: Text, directory: AnyStr = None):
+        self.directory = os.path.join(os.fsdecode(directory or default_cache_dir()), namespace)
+
+    def _path(self, key: Text) -> Text:
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, key: Text, default: Any = None) -> Any:
+        '''
+        Get a cached entry, or ``default`` if it is missing.
+        '''
+        try:
+            with open(self._path(key), encoding='utf-8') as entry_file:
+                return json.load(entry_file)
+        except (OSError, ValueError):
+            return default
+
+    def set(self, key: Text, value: Any):
+        '''
+        Cache a JSON-serializable value.
+        '''
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as entry_file:
+                    json.dump(value, entry_file)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def get_valid(self, key: Text) -> Any:
+        '''
+        Get an entry that was stored using set_valid(), if none of the files it depends on changed.
+        '''
+        entry = self.get(key)
+        if not isinstance(entry, dict) or 'stamps' not in entry or 'value' not in entry:
+            return None
+        if file_stamps(entry['stamps']) != entry['stamps']:
+            return None
+        return entry['value']
+
+    def set_valid(self, key: Text, value: Any, depends_on: Iterable[AnyStr]):
+        '''
+        Cache a value that is only valid while the files in ``depends_on`` don't change.
+        '''
+        self.set(key, {'stamps': file_stamps(depends_on), 'value': value})
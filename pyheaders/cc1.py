@@ -0,0 +1,136 @@
+'''
+Resolves clang driver command lines into the frontend (``clang -cc1``) command lines that they run.
+
+Every driver invocation resolves the toolchain, the include paths and the target before running the frontend.
+The frontend command line only depends on the flags (and not on the input file), so it is resolved once per distinct
+set of flags using ``clang -###`` on a placeholder input, and the frontend is then invoked directly for every file.
+
+A command line that can't be mapped (f.e. the driver runs more than one job for it) is left to the driver.
+'''
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from typing import Dict, List, Optional, Sequence, Text, Tuple
+
+from .cache import DiskCache, make_key
+
+PLACEHOLDER_STEM = 'pyheaders-cc1-input'
+PLACEHOLDER_NAME = f'{PLACEHOLDER_STEM}.cpp'
+
+# Environment variables that the driver turns into flags
+_DRIVER_ENVIRON = ('CPATH', 'C_INCLUDE_PATH', 'CPLUS_INCLUDE_PATH', 'OBJC_INCLUDE_PATH', 'OBJCPLUS_INCLUDE_PATH',
+                   'COMPILER_PATH', 'SDKROOT', 'MACOSX_DEPLOYMENT_TARGET')
+
+_MISSING = object()
+
+# A frontend command line and the placeholder input in it
+Template = Tuple[List[Text], Text]
+
+
+def _parse_jobs(output: Text) -> List[List[Text]]:
+    '''
+    Get the command lines of the jobs from the output of ``clang -###``.
+    '''
+    return [shlex.split(line) for line in output.splitlines() if line.lstrip().startswith('"')]
+
+
+def _make_template(job: List[Text], placeholder: Text) -> Optional[Template]:
+    '''
+    Validate that the only thing that depends on the input in ``job`` is the placeholder input.
+    '''
+    if len(job) < 3 or job[1] != '-cc1' or job[-1] != placeholder:
+        return None
+    # The main file name is the only other use of the input that is substituted (f.e. the target of -M isn't)
+    if any(PLACEHOLDER_STEM in arg for arg in job[:-1] if arg != PLACEHOLDER_NAME):
+        return None
+    return job, placeholder
+
+
+def _instantiate(template: Template, filename: Text) -> List[Text]:
+    args, placeholder = template
+    main_file_name = os.path.basename(filename)
+    return [main_file_name if arg == PLACEHOLDER_NAME else arg for arg in args[:-1]] + \
+        [filename if args[-1] == placeholder else args[-1]]
+
+
+class Cc1Resolver:
+    '''
+    Maps driver command lines to frontend command lines.
+
+    The frontend command lines are cached in memory and in ``cache`` (defaults to the "cc1" cache in the default cache
+    directory) until the driver executable changes. Share a Cc1Resolver object between the Clang objects of a load,
+    so every distinct set of flags is only resolved once.
+
+    Driver behavior that depends on things other than the flags, the directory it runs in, the include paths
+    environment variables and the driver executable (f.e. installing a new GCC toolchain) isn't detected, clear
+    the cache when it changes.
+    '''
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = DiskCache('cc1') if cache is None else cache
+        self._templates: Dict[Tuple, Optional[Template]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, run_dir: Text, cmd: Sequence[Text]) -> Optional[List[Text]]:
+        '''
+        Get the frontend command line that a driver command line runs.
+
+        @param run_dir  The directory the command runs in.
+        @param cmd      The driver command line, the input file must be the last argument.
+
+        @returns The frontend command line (with the input file as the last argument), or ``None`` if the command
+                 line can't be mapped and the driver should be used.
+        '''
+        environ = tuple(os.environ.get(name) for name in _DRIVER_ENVIRON)
+        memory_key = (run_dir, tuple(cmd[:-1]), environ)
+        template = self._templates.get(memory_key, _MISSING)
+        if template is _MISSING:
+            with self._lock:
+                template = self._templates.get(memory_key, _MISSING)
+                if template is _MISSING:
+                    template = self._templates[memory_key] = self._load(run_dir, list(cmd[:-1]), environ)
+
+        if template is None:
+            return None
+        return _instantiate(template, cmd[-1])
+
+    def _load(self, run_dir: Text, driver_args: List[Text], environ: Tuple) -> Optional[Template]:
+        executable = shutil.which(driver_args[0])
+        if executable is None:
+            return None
+
+        executable = os.path.realpath(executable)
+        key = make_key(executable, run_dir, driver_args, environ)
+        if isinstance(entry := self.cache.get_valid(key), dict) and 'template' in entry:
+            return None if entry['template'] is None else tuple(entry['template'])
+
+        template = Cc1Resolver._query(run_dir, driver_args)
+        self.cache.set_valid(key, {'template': template}, [executable])
+        return template
+
+    @staticmethod
+    def _query(run_dir: Text, driver_args: List[Text]) -> Optional[Template]:
+        '''
+        Run ``clang -###`` with the flags on a placeholder input.
+        '''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            placeholder = os.path.join(temp_dir, PLACEHOLDER_NAME)
+            with open(placeholder, 'w'):
+                pass
+
+            try:
+                proc = subprocess.run(driver_args + ['-###', placeholder], cwd=run_dir, stdin=subprocess.DEVNULL,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False)
+            except OSError:
+                return None
+
+        if proc.returncode != 0:
+            return None
+        jobs = _parse_jobs(proc.stderr)
+        if len(jobs) != 1:
+            return None
+        return _make_template(jobs[0], placeholder)
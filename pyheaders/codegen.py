@@ -0,0 +1,381 @@
+'''
+Generate static Python packages from loaded scopes.
+
+The generated package mirrors the scope's namespace tree: every namespace becomes a sub-package that is only
+imported when it is first accessed, enums become ``IntEnum`` classes, records become plain classes and constants
+become literals. Importing the generated package doesn't require pyheaders or clang.
+'''
+import array
+import base64
+import hashlib
+import json
+import keyword
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from typing import Any, AnyStr, Dict, Iterable, List, Optional, Text, Tuple
+
+from .compiler import ALL_C_CPP_FILES_EXTENSIONS
+from .cpp import BaseScope, Enum, Record, Scope
+from .discovery import exclude_matcher, iter_source_files
+
+# Bump when the generated code changes, to regenerate packages created by older versions.
+CODEGEN_VERSION = 3
+
+MARKER_FILENAME = '__pyheaders__.json'
+_RUNTIME_MODULE = '_pyheaders_runtime'
+# The names that every generated module defines (see _Generator._module()).
+_MODULE_NAMES = ('_importlib', '_IntEnum', '_pyh_runtime', '__getattr__', '__dir__', '__cpp_names__',
+                 '__pyheaders_submodules__', _RUNTIME_MODULE)
+
+_INDENT = ' ' * 4
+_NON_IDENTIFIER_CHARS = re.compile(r'\W')
+
+_RUNTIME_SOURCE = '''\
+\'\'\'
+Support code for the generated package.
+\'\'\'
+import array
+import base64
+import sys
+
+
+def dense_array(typecode, data):
+    \'\'\'
+    Create an array from base64-encoded little-endian elements.
+    \'\'\'
+    values = array.array(typecode)
+    values.frombytes(base64.b64decode(data))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class Record:
+    \'\'\'
+    The base class of the generated C++ records.
+    \'\'\'
+    __slots__ = ()
+
+    def __init__(self, *args):
+        if len(args) != len(self.__slots__):
+            raise TypeError(f"{type(self).__name__}() takes {len(self.__slots__)} arguments ({len(args)} given)")
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+'''
+
+_LAZY_IMPORT_SOURCE = '''\
+def __getattr__(name):
+    if name in __pyheaders_submodules__:
+        return _importlib.import_module(f'{__name__}.{__pyheaders_submodules__[name]}')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__pyheaders_submodules__))
+'''
+
+
+class _Names:
+    '''
+    Maps C++ names to unique Python identifiers in a single namespace.
+    '''
+
+    def __init__(self, reserved: Iterable[Text] = ()):
+        self.used = set(reserved)
+        self.cpp_names: Dict[Text, Text] = {}
+
+    def add(self, cpp_name: Text) -> Text:
+        '''
+        Get a unique identifier for ``cpp_name``. Changed names are recorded in ``cpp_names``.
+        '''
+        name = _NON_IDENTIFIER_CHARS.sub('_', cpp_name) or '_'
+        if name[0].isdigit():
+            name = f'_{name}'
+        if keyword.iskeyword(name) or (name.startswith('__') and name.endswith('__')):
+            name = f'{name}_'
+        elif name.startswith('__'):
+            # Would be mangled in class bodies
+            name = f'_{name.lstrip("_")}'
+
+        unique = name
+        suffix = 1
+        while unique in self.used:
+            unique = f'{name}_{suffix}'
+            suffix += 1
+
+        self.used.add(unique)
+        if unique != cpp_name:
+            self.cpp_names[unique] = cpp_name
+        return unique
+
+
+class _Generator:
+    '''
+    Generates the source code of a package from a scope.
+    '''
+
+    def __init__(self, package: Text):
+        self.package = package
+        # Maps record value types to their (module, qualified name).
+        self.record_types: Dict[type, Tuple[Text, Text]] = {}
+        # Maps module names to (directory parts, source).
+        self.modules: Dict[Text, Tuple[Tuple[Text, ...], Text]] = {}
+        # Maps scope ids to their (C++ name, Python name, value) items and the renamed names.
+        self.layouts: Dict[int, Tuple[List[Tuple[Text, Text, Any]], Dict[Text, Text]]] = {}
+
+    def _collect(self, scope: Scope, module: Text, qualname: Optional[Text], path: Tuple[Text, ...]):
+        '''
+        Assign Python names to all namespaces and records before generating any code.
+        '''
+        names = _Names(_MODULE_NAMES if qualname is None else ())
+        layout = []
+        for cpp_name, value in scope.items():
+            if isinstance(value, BaseScope) and not isinstance(value, Record) and qualname is None:
+                if value.isempty():
+                    continue
+                name = names.add(cpp_name)
+                layout.append((cpp_name, name, value))
+                self._collect(value, f'{module}.{name}', None, path + (name,))
+            elif isinstance(value, BaseScope):
+                name = names.add(cpp_name)
+                layout.append((cpp_name, name, value))
+                inner = f'{qualname}.{name}' if qualname else name
+                if isinstance(value, Record) and isinstance(value.type, type):
+                    self.record_types.setdefault(value.type, (module, inner))
+                self._collect(value, module, inner, path)
+            else:
+                layout.append((cpp_name, names.add(cpp_name), value))
+        self.layouts[id(scope)] = (layout, names.cpp_names)
+
+    def _literal(self, value: Any, module: Text, imports: Dict[Text, Text]) -> Text:
+        # pylint: disable=too-many-return-statements
+        if isinstance(value, bool) or value is None or isinstance(value, (int, str, bytes)):
+            return repr(value)
+        if isinstance(value, float):
+            if math.isnan(value) or math.isinf(value):
+                return f"float('{value}')"
+            return repr(value)
+        if isinstance(value, array.array):
+            if sys.byteorder != 'little':
+                value = array.array(value.typecode, value)
+                value.byteswap()
+            return f'_pyh_runtime.dense_array({value.typecode!r}, {base64.b64encode(value.tobytes()).decode()!r})'
+        if type(value) in self.record_types:
+            record_module, qualname = self.record_types[type(value)]
+            if record_module != module:
+                alias = imports.setdefault(record_module, f'_pyh_m{len(imports)}')
+                qualname = f'{alias}.{qualname}'
+            return f'{qualname}({", ".join(self._literal(item, module, imports) for item in value)})'
+        if isinstance(value, list):
+            return f'[{", ".join(self._literal(item, module, imports) for item in value)}]'
+        if isinstance(value, tuple):
+            items = [self._literal(item, module, imports) for item in value]
+            return f'({items[0]},)' if len(items) == 1 else f'({", ".join(items)})'
+        raise TypeError(f"can't generate code for a value of type {type(value).__name__!r}")
+
+    @staticmethod
+    def _enum(name: Text, enum: Enum, indent: Text) -> List[Text]:
+        members = _Names(('name', 'value', 'mro'))
+        lines = [f'{indent}class {name}(_IntEnum):']
+        for cpp_name, value in enum.items():
+            lines.append(f'{indent}{_INDENT}{members.add(cpp_name)} = {value!r}')
+        if members.cpp_names:
+            lines.append(f'{indent}{_INDENT}__cpp_names__ = {members.cpp_names!r}')
+        if len(lines) == 1:
+            lines.append(f'{indent}{_INDENT}pass')
+        return lines
+
+    def _class(self, name: Text, scope: Scope, qualname: Text, indent: Text,
+               assignments: List[Tuple[Text, Any]]) -> List[Text]:
+        '''
+        Generate a class for a record (or a scope nested in a record). Static values are added to ``assignments``
+        since they may refer to the class itself.
+        '''
+        layout, cpp_names = self.layouts[id(scope)]
+        body = []
+        if isinstance(scope, Record):
+            lines = [f'{indent}class {name}(_pyh_runtime.Record):']
+            fields = scope.type._fields if isinstance(scope.type, type) else scope.fields
+            slots = _Names()
+            field_names = tuple(slots.add(field) for field in fields)
+            body.append(f'{indent}{_INDENT}__slots__ = {field_names!r}')
+            if slots.cpp_names:
+                cpp_names = {**cpp_names, **slots.cpp_names}
+        else:
+            lines = [f'{indent}class {name}:']
+
+        if cpp_names:
+            body.append(f'{indent}{_INDENT}__cpp_names__ = {cpp_names!r}')
+
+        for _, item_name, value in layout:
+            if isinstance(value, Enum):
+                body.extend(self._enum(item_name, value, indent + _INDENT))
+            elif isinstance(value, BaseScope):
+                body.extend(self._class(item_name, value, f'{qualname}.{item_name}', indent + _INDENT, assignments))
+            else:
+                assignments.append((f'{qualname}.{item_name}', value))
+
+        return lines + (body or [f'{indent}{_INDENT}pass'])
+
+    def _module(self, scope: Scope, module: Text, cpp_path: Text, path: Tuple[Text, ...]):
+        layout, cpp_names = self.layouts[id(scope)]
+        imports: Dict[Text, Text] = {}
+        submodules = {}
+        definitions = []
+        assignments: List[Tuple[Text, Any]] = []
+
+        for cpp_name, name, value in layout:
+            if isinstance(value, Enum):
+                definitions.extend(['', ''] + self._enum(name, value, ''))
+            elif isinstance(value, Record):
+                definitions.extend(['', ''] + self._class(name, value, name, '', assignments))
+            elif isinstance(value, BaseScope):
+                submodules[name] = name
+                self._module(value, f'{module}.{name}', f'{cpp_path}{Scope.SEP}{cpp_name}' if cpp_path else cpp_name,
+                             path + (name,))
+            else:
+                assignments.append((name, value))
+
+        values = [f'{target} = {self._literal(value, module, imports)}' for target, value in assignments]
+
+        description = f'the C++ namespace `{cpp_path}`' if cpp_path else 'the C++ global scope'
+        lines = [f"'''", f'Generated by pyheaders from {description}. Do not edit.', "'''"]
+        lines.append('import importlib as _importlib')
+        lines.append('from enum import IntEnum as _IntEnum')
+        lines.append('')
+        lines.append(f'from {self.package} import {_RUNTIME_MODULE} as _pyh_runtime')
+        for imported, alias in imports.items():
+            lines.append(f'import {imported} as {alias}')
+        lines.append('')
+        lines.append(f'__cpp_names__ = {cpp_names!r}')
+        lines.append(f'__pyheaders_submodules__ = {submodules!r}')
+        lines.append('')
+        lines.append('')
+        lines.append(_LAZY_IMPORT_SOURCE.rstrip('\n'))
+        lines.extend(definitions)
+        if values:
+            lines.append('')
+            lines.append('')
+            lines.extend(values)
+
+        self.modules[module] = (path, '\n'.join(lines) + '\n')
+
+    def generate(self, scope: Scope) -> Dict[Text, Tuple[Tuple[Text, ...], Text]]:
+        '''
+        Generate the source code of all modules.
+
+        @returns A dictionary that maps module names to their package's path (relative to the package root)
+                 and source code.
+        '''
+        self._collect(scope, self.package, None, ())
+        self._module(scope, self.package, '', ())
+        return self.modules
+
+
+def fingerprint(paths: Iterable[AnyStr], excludes: Iterable[Text] = None, **options: Any) -> Text:
+    '''
+    Compute a fingerprint of the inputs of a code generation.
+
+    The fingerprint covers the given files, all C/C++ files (including headers) in the given directories and the
+    given options (compilation flags, clang path, ...). Headers that are included from outside the given paths are
+    not covered.
+
+    @param paths    The files and directories the scope is loaded from.
+    @param excludes Patterns of paths that are excluded from the inputs.
+    @param options  Additional JSON-serializable options that affect the generated code.
+
+    @returns A hex digest.
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({'version': CODEGEN_VERSION, 'options': options}, sort_keys=True, default=str).encode())
+
+    is_excluded = exclude_matcher(excludes)
+    files = set()
+    for path in paths:
+        path = os.fsdecode(path)
+        if os.path.isdir(path):
+            files.update(iter_source_files([path], excludes, ALL_C_CPP_FILES_EXTENSIONS))
+        elif not is_excluded(path):
+            files.add(path)
+
+    for filename in sorted(files):
+        try:
+            stat = os.stat(filename)
+            digest.update(f'{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\0'.encode('utf-8', 'surrogateescape'))
+        except OSError:
+            digest.update(f'{filename}\0missing\0'.encode('utf-8', 'surrogateescape'))
+
+    return digest.hexdigest()
+
+
+def is_up_to_date(output_dir: AnyStr, package: Text, inputs_fingerprint: Text) -> bool:
+    '''
+    Check whether a package was generated from inputs with the given fingerprint.
+    '''
+    try:
+        with open(os.path.join(output_dir, package, MARKER_FILENAME)) as marker_file:
+            marker = json.load(marker_file)
+    except (OSError, ValueError):
+        return False
+    return marker.get('version') == CODEGEN_VERSION and marker.get('fingerprint') == inputs_fingerprint
+
+
+def write_package(scope: Scope, output_dir: AnyStr, package: Text, inputs_fingerprint: Text = None):
+    '''
+    Generate a Python package from a scope.
+
+    The package is generated in a temporary directory and then replaces the previously generated package.
+    Directories that were not generated by pyheaders are never replaced.
+
+    @param scope                The scope to generate the package from.
+    @param output_dir           The directory to create the package in.
+    @param package              The name of the package.
+    @param inputs_fingerprint   The fingerprint of the inputs (see fingerprint()), used by is_up_to_date().
+    '''
+    if not package.isidentifier() or keyword.iskeyword(package):
+        raise ValueError(f"invalid package name: {package!r}")
+
+    target = os.path.join(output_dir, package)
+    if os.path.exists(target) and not os.path.exists(os.path.join(target, MARKER_FILENAME)):
+        raise FileExistsError(f"{os.fsdecode(target)!r} exists and was not generated by pyheaders")
+
+    os.makedirs(output_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{package}-', dir=output_dir)
+    try:
+        for path, source in _Generator(package).generate(scope).values():
+            module_dir = os.path.join(staging, *path)
+            os.makedirs(module_dir, exist_ok=True)
+            with open(os.path.join(module_dir, '__init__.py'), 'w') as output:
+                output.write(source)
+
+        with open(os.path.join(staging, f'{_RUNTIME_MODULE}.py'), 'w') as output:
+            output.write(_RUNTIME_SOURCE)
+
+        with open(os.path.join(staging, MARKER_FILENAME), 'w') as output:
+            json.dump({'version': CODEGEN_VERSION, 'fingerprint': inputs_fingerprint}, output)
+
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
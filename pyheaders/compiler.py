@@ -1,24 +1,39 @@
 '''
 Implements utils for running the compiler and parsing clang's compile_commands.json.
 '''
+import asyncio
+import io
 import json
 import os
 import re
 import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
 
-from contextlib import contextmanager
-from functools import lru_cache
+from contextlib import asynccontextmanager, contextmanager, nullcontext, suppress
+from functools import lru_cache, partial
 from itertools import chain
-from typing import AnyStr, Callable, Dict, Iterable, List, Pattern, Text, Tuple
+from typing import IO, AnyStr, Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, NamedTuple, Optional, \
+    Pattern, Text, Tuple
 from warnings import warn
 
+from .cache import DiskCache, make_key
+from .cc1 import Cc1Resolver
+from .stats import FileStats
 
 CompileCommandsEntry = Dict[Text, Text]
 CompileCommands = List[CompileCommandsEntry]
 
 
+_MISSING = object()
+
+# The size of the preprocessor outputs that are kept in memory instead of in a temporary file (see _spool()).
+_SPOOL_MAX_SIZE = 1 << 20
+
+
 class PluginError(subprocess.CalledProcessError):
     '''
     Raised to indicate that the plugin process failed.
@@ -28,17 +43,68 @@ class PluginError(subprocess.CalledProcessError):
         super().__init__(returncode=proc.returncode, cmd=shlex.join(proc.args), output=proc.stdout, stderr=proc.stderr)
 
 
+def _write_lines(stream: IO, lines: Iterable[Text], errors: List[BaseException]):
+    '''
+    Write `lines` to `stream` and close it. Errors (except for the reader exiting) are appended to `errors`.
+    '''
+    try:
+        for line in lines:
+            stream.write(line)
+    except BrokenPipeError:
+        pass
+    except Exception as error:  # pylint: disable=broad-except
+        errors.append(error)
+    finally:
+        with suppress(OSError):
+            stream.close()
+
+
+def _spool(lines: Iterable[Text]) -> IO[Text]:
+    '''
+    Write `lines` to a rewound temporary file that is kept in memory while it is small, so they can be read multiple
+    times without holding all of them in memory.
+    '''
+    spool = tempfile.SpooledTemporaryFile(_SPOOL_MAX_SIZE, 'w+', encoding='utf-8', errors='surrogateescape')
+    try:
+        spool.writelines(lines)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def _start_thread(target: Callable, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
 class MissingCompileCommands(UserWarning):
     '''
     Warns that the provided compile commands is missing and therefore ignored.
     '''
 
 
+@asynccontextmanager
+async def _acquire(limiter: Optional[asyncio.Semaphore]):
+    '''
+    Acquire `limiter` for the duration of the block, if one was given.
+    '''
+    if limiter is None:
+        yield
+    else:
+        async with limiter:
+            yield
+
+
 @contextmanager
 def directory(dirname: AnyStr):
     '''
     Changes the current directory to `dirname`.
 
+    Note that the current directory is shared by all the threads of the process.
+
     @param dirname The path to change into.
 
     Typical usage:
@@ -143,7 +209,9 @@ class CommandsParser:
                 with open(commands_path) as commands_fd:
                     commands = json.load(commands_fd)
 
-                self.__commands_getter = lambda filename: os.path.dirname(commands_path), commands
+                # Relative paths in the commands are relative to the commands file, not to the current directory
+                commands_dir = os.path.dirname(os.path.abspath(commands_path))
+                self.__commands_getter = lambda filename: (commands_dir, commands)
             else:
                 warn(f"Ignoring the provided commands_path. Reason: missing: '{commands_path}' is not a file.",
                      category=MissingCompileCommands, stacklevel=2)
@@ -275,8 +343,10 @@ class CommandsParser:
 
         commands_start_path, commands = self.__commands_getter(filename)
         for cmd in commands:
-            cmd['directory'] = CommandsParser.__get_path(commands_start_path, cmd['directory'], os.path.isdir)
-            cmd['file'] = CommandsParser.__get_path(cmd['directory'], cmd['file'], os.path.isfile)
+            # The commands are shared between threads, so the absolute paths are set in a copy
+            cmd_directory = CommandsParser.__get_path(commands_start_path, cmd['directory'], os.path.isdir)
+            cmd = dict(cmd, directory=cmd_directory,
+                       file=CommandsParser.__get_path(cmd_directory, cmd['file'], os.path.isfile))
 
             if cmd['file'] == filename:
                 return cmd
@@ -352,34 +422,50 @@ class Clang:
     __LOAD_LIB_FLAG = '-load'
     __RUN_PLUGIN_FLAG = '-plugin'  # Run as main command
     __ADD_PLUGIN_FLAG = '-add-plugin'  # Run after main command
+    __PLUGIN_ARG_FLAG = '-plugin-arg-'
     __SYNTAX_ONLY_FLAG = '-fsyntax-only'
 
     def __init__(self, exec_path: AnyStr = 'clang++-11', *,
                  commands_parser: CommandsParser = None,
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 stats: FileStats = None,
+                 cc1_resolver: Cc1Resolver = None,
+                 predefined_macros: 'PredefinedMacros' = None):
         self.verbose = verbose
-        self.exec_path = exec_path
+        # A relative path is relative to the current directory, not to the directory that clang runs in
+        self.exec_path = os.path.abspath(exec_path) if os.path.dirname(exec_path) else exec_path
+        self.stats = stats
+        # Skip the driver and run the frontend directly when the command line can be resolved
+        self.cc1_resolver = cc1_resolver
+        # Take the unchanged predefined macros from a baseline instead of expanding them for every file
+        self.predefined_macros = predefined_macros
         self.__plugins = {}
         self.__compile_commands = commands_parser or CommandsParser()
 
-    def run(self, filename: AnyStr, extra_args: Iterable[Text] = None, clang_args: Iterable[Text] = None, *,
-            get_stdout: bool = False, check: bool = False, ignore_cmds: bool = False,
-            **kwargs) -> subprocess.CompletedProcess:
+    def _measure(self, phase: Text):
         '''
-        Run clang on `filename`.
+        Measure the block's wall time as ``phase`` if statistics are collected.
+        '''
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.measure(phase)
+
+    def _record(self, proc: subprocess.CompletedProcess, streamed_bytes: int = 0):
+        if self.stats is not None:
+            self.stats.record_process(proc, streamed_bytes)
+
+    def _command(self, filename: AnyStr, extra_args: Iterable[Text] = None, clang_args: Iterable[Text] = None, *,
+                 ignore_cmds: bool = False) -> Tuple[AnyStr, List[Text]]:
+        '''
+        Build the command line that runs clang on `filename`.
 
         @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
         @param extra_args   Additional args to append to the compile commands' flags.
-        @param get_stdout   If `True`, return clang's stdout. Otherwise, return the exit code.
-        @param check        If `True` and the exit code was non-zero, raise a PluginError. The PluginError object will
-                            have the return code in the returncode attribute, and output & stderr attributes if those
-                            streams were captured (stderr is captured whenever the stderr argument is not provided and
-                            the verbose attribute is `False`).
+        @param clang_args   Additional args for the clang frontend (passed using -Xclang).
         @param ignore_cmds  If `True`, the compiler ignores the compile commands.
-        @param kwargs       Additional args for subprocess, `text`, `shell` and `executable` are ignored.
 
-        @returns CompletedProcess   The returned instance will have attributes args, returncode, stdout and stderr.
-                                    When stdout and stderr are not captured, and those attributes will be None.
+        @returns (run_dir, args)    The directory clang should run in and the full command line. Paths in the
+                                    command line are relative to `run_dir`.
         '''
         if filename != Clang.STDIN_FILENAME:
             assert os.path.isfile(filename)
@@ -397,7 +483,59 @@ class Clang:
         if ignore_cmds:
             run_dir, args = os.getcwd(), []
         else:
-            run_dir, args = self.__compile_commands.get_args(filename)
+            with self._measure('commands'):
+                run_dir, args = self.__compile_commands.get_args(filename)
+
+        if filename != Clang.STDIN_FILENAME:
+            filename = os.path.relpath(filename, run_dir)
+
+        return run_dir, [self.exec_path, '-x', 'c++'] + clang_args + args + extra_args + [filename]
+
+    def _invocation(self, filename: AnyStr, extra_args: Iterable[Text] = None, clang_args: Iterable[Text] = None, *,
+                    ignore_cmds: bool = False) -> Tuple[AnyStr, List[Text]]:
+        '''
+        Build the command line that runs clang on `filename`, like _command(). If there is a cc1 resolver, the
+        command line runs the frontend directly when possible.
+        '''
+        if self.cc1_resolver is not None:
+            run_dir, cmd = self._command(filename, extra_args, ignore_cmds=ignore_cmds)
+            with self._measure('commands'):
+                frontend_cmd = self.cc1_resolver.resolve(run_dir, [os.fsdecode(arg) for arg in cmd])
+            if frontend_cmd is not None:
+                return run_dir, frontend_cmd[:-1] + list(clang_args or []) + [cmd[-1]]
+
+        return self._command(filename, extra_args, clang_args, ignore_cmds=ignore_cmds)
+
+    def _check(self, proc: subprocess.CompletedProcess):
+        '''
+        Raise a PluginError if `proc` failed.
+        '''
+        if proc.returncode != 0:
+            if self.verbose:
+                print("error: {!r} exited with {}.".format(proc.args[0], proc.returncode), file=sys.stderr)
+                print("command: {!r}".format(' '.join(proc.args)), file=sys.stderr)
+            raise PluginError(proc)
+
+    def run(self, filename: AnyStr, extra_args: Iterable[Text] = None, clang_args: Iterable[Text] = None, *,
+            get_stdout: bool = False, check: bool = False, ignore_cmds: bool = False,
+            **kwargs) -> subprocess.CompletedProcess:
+        '''
+        Run clang on `filename`.
+
+        @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
+        @param extra_args   Additional args to append to the compile commands' flags.
+        @param get_stdout   If `True`, return clang's stdout. Otherwise, return the exit code.
+        @param check        If `True` and the exit code was non-zero, raise a PluginError. The PluginError object will
+                            have the return code in the returncode attribute, and output & stderr attributes if those
+                            streams were captured (stderr is captured whenever the stderr argument is not provided and
+                            the verbose attribute is `False`).
+        @param ignore_cmds  If `True`, the compiler ignores the compile commands.
+        @param kwargs       Additional args for subprocess, `text`, `shell` and `executable` are ignored.
+
+        @returns CompletedProcess   The returned instance will have attributes args, returncode, stdout and stderr.
+                                    When stdout and stderr are not captured, and those attributes will be None.
+        '''
+        run_dir, cmd = self._invocation(filename, extra_args, clang_args, ignore_cmds=ignore_cmds)
 
         error_stream = kwargs.pop('stderr', None if self.verbose else subprocess.PIPE)
         output_stream = kwargs.pop('stdout', subprocess.PIPE if get_stdout else None)
@@ -406,19 +544,159 @@ class Clang:
         kwargs.pop('executable', None)
         kwargs.pop('shell', None)
         kwargs.pop('text', None)
+        kwargs.pop('cwd', None)
 
-        with directory(run_dir):
-            proc = subprocess.run([self.exec_path, '-x', 'c++'] + clang_args + args + extra_args + [os.path.relpath(filename)],
-                                  stderr=error_stream, stdout=output_stream, text=True, check=False, **kwargs)
+        # The directory is only changed in the child process, so clang can run from multiple threads at once
+        proc = subprocess.run(cmd, cwd=run_dir, stderr=error_stream, stdout=output_stream, text=True, check=False,
+                              **kwargs)
+        self._record(proc)
 
-        if check and proc.returncode != 0:
-            if self.verbose:
-                print("error: {!r} exited with {}.".format(proc.args[0], proc.returncode), file=sys.stderr)
-                print("command: {!r}".format(' '.join(proc.args)), file=sys.stderr)
-            raise PluginError(proc)
+        if check:
+            self._check(proc)
 
         return proc
 
+    async def run_async(self, filename: AnyStr, extra_args: Iterable[Text] = None, clang_args: Iterable[Text] = None, *,
+                        get_stdout: bool = False, check: bool = False, ignore_cmds: bool = False,
+                        limiter: asyncio.Semaphore = None, **kwargs) -> subprocess.CompletedProcess:
+        '''
+        Run clang on `filename` without blocking the event loop.
+
+        Behaves like run(). If the calling task is cancelled (or `timeout` expires), the clang process is killed.
+
+        @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
+        @param extra_args   Additional args to append to the compile commands' flags.
+        @param get_stdout   If `True`, return clang's stdout. Otherwise, return the exit code.
+        @param check        If `True` and the exit code was non-zero, raise a PluginError.
+        @param ignore_cmds  If `True`, the compiler ignores the compile commands.
+        @param limiter      A semaphore that limits the number of concurrently running clang processes.
+        @param kwargs       Additional args for asyncio.create_subprocess_exec(), `input` and `timeout` are supported
+                            like in run(). `text`, `shell` and `executable` are ignored.
+
+        @returns CompletedProcess   The returned instance will have attributes args, returncode, stdout and stderr.
+                                    When stdout and stderr are not captured, and those attributes will be None.
+        '''
+        if self.cc1_resolver is None:
+            run_dir, cmd = self._command(filename, extra_args, clang_args, ignore_cmds=ignore_cmds)
+        else:
+            # Resolving the frontend command line may run the driver
+            run_dir, cmd = await asyncio.get_running_loop().run_in_executor(
+                None, partial(self._invocation, filename, extra_args, clang_args, ignore_cmds=ignore_cmds))
+
+        error_stream = kwargs.pop('stderr', None if self.verbose else subprocess.PIPE)
+        output_stream = kwargs.pop('stdout', subprocess.PIPE if get_stdout else None)
+        input_data = kwargs.pop('input', None)
+        timeout = kwargs.pop('timeout', None)
+        if input_data is not None:
+            kwargs['stdin'] = subprocess.PIPE
+            input_data = input_data.encode()
+
+        # Ignore some keyword arguments:
+        kwargs.pop('executable', None)
+        kwargs.pop('shell', None)
+        kwargs.pop('text', None)
+
+        async with _acquire(limiter):
+            proc = await asyncio.create_subprocess_exec(*cmd, cwd=run_dir, stderr=error_stream, stdout=output_stream,
+                                                        **kwargs)
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(input_data), timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise subprocess.TimeoutExpired(cmd, timeout) from None
+            except asyncio.CancelledError:
+                proc.kill()
+                await proc.wait()
+                raise
+
+        completed = subprocess.CompletedProcess(cmd, proc.returncode,
+                                                None if stdout is None else stdout.decode(),
+                                                None if stderr is None else stderr.decode())
+        self._record(completed)
+
+        if check:
+            self._check(completed)
+
+        return completed
+
+    def _stream(self, filename: AnyStr, extra_args: Iterable[Text] = None, clang_args: Iterable[Text] = None, *,
+                input_lines: Iterable[Text] = None, ignore_cmds: bool = False, timeout: float = None,
+                **kwargs) -> Iterator[Text]:
+        '''
+        Run clang on `filename` and iterate over the lines of its stdout while it runs.
+
+        Behaves like run() with `get_stdout=True` and `check=True`, but the output is never held in memory at once.
+        If the iteration is stopped before the end of the output, clang is killed.
+
+        @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
+        @param extra_args   Additional args to append to the compile commands' flags.
+        @param clang_args   Additional args for the clang frontend (passed using -Xclang).
+        @param input_lines  Lines to write to clang's stdin (from another thread, so they can be generated lazily).
+                            The `input` argument can be used instead.
+        @param ignore_cmds  If `True`, the compiler ignores the compile commands.
+        @param timeout      The maximal run time (in seconds) of clang, raise subprocess.TimeoutExpired after
+                            killing it.
+        @param kwargs       Additional args for subprocess, `stdout`, `text`, `shell` and `executable` are ignored.
+
+        @returns Iterator[Text] The lines of the output.
+        '''
+        run_dir, cmd = self._invocation(filename, extra_args, clang_args, ignore_cmds=ignore_cmds)
+
+        error_stream = kwargs.pop('stderr', None if self.verbose else subprocess.PIPE)
+        input_data = kwargs.pop('input', None)
+        if input_lines is None and input_data is not None:
+            input_lines = (input_data,)
+        if input_lines is not None:
+            kwargs['stdin'] = subprocess.PIPE
+
+        # Ignore some keyword arguments:
+        for ignored in ('stdout', 'executable', 'shell', 'text', 'cwd'):
+            kwargs.pop(ignored, None)
+
+        proc = subprocess.Popen(cmd, cwd=run_dir, stdout=subprocess.PIPE, stderr=error_stream, text=True, **kwargs)
+        errors: List[BaseException] = []
+        stderr_chunks: List[Text] = []
+        threads = []
+        if input_lines is not None:
+            threads.append(_start_thread(_write_lines, proc.stdin, input_lines, errors))
+        if error_stream == subprocess.PIPE:
+            threads.append(_start_thread(lambda: stderr_chunks.append(proc.stderr.read())))
+        timed_out = threading.Event()
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, lambda: (timed_out.set(), proc.kill()))
+            timer.start()
+
+        streamed_bytes = 0
+        finished = False
+        try:
+            for line in proc.stdout:
+                streamed_bytes += len(line)
+                yield line
+            finished = True
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not finished:
+                proc.kill()
+            for thread in threads:
+                thread.join()
+            proc.wait()
+            proc.stdout.close()
+            if proc.stderr is not None:
+                proc.stderr.close()
+
+        stderr = ''.join(stderr_chunks) if error_stream == subprocess.PIPE else None
+        if timed_out.is_set() and proc.returncode < 0:
+            raise subprocess.TimeoutExpired(cmd, timeout, stderr=stderr)
+        if errors:
+            raise errors[0]
+
+        completed = subprocess.CompletedProcess(cmd, proc.returncode, None, stderr)
+        self._record(completed, streamed_bytes)
+        self._check(completed)
+
     def check_syntax(self, filename: AnyStr, extra_args: Iterable[Text] = None, **kwargs) -> bool:
         '''
         Check for syntax errors in `filename` using clang's -fsyntax-only.
@@ -431,6 +709,29 @@ class Clang:
         '''
         return self.run(filename, extra_args=[Clang.__SYNTAX_ONLY_FLAG] + list(extra_args or []), **kwargs).returncode == 0
 
+    @staticmethod
+    def _trim_lines(lines: Iterable[Text]) -> Iterator[Text]:
+        '''
+        Remove preprocessor markings and whitespace-only lines from lines of preprocessor output.
+
+        The first and the last (unterminated) lines are kept even if they are empty.
+        '''
+        first = True
+        for line in lines:
+            if line.startswith('#'):
+                # Remove preprocessor markings
+                line = '\n' if line.endswith('\n') else ''
+            if first or not line.endswith('\n') or not line.isspace():
+                yield line
+            first = False
+
+    @staticmethod
+    def _trim(output: Text) -> Text:
+        '''
+        Remove preprocessor markings and trim whitespaces from preprocessor output.
+        '''
+        return ''.join(Clang._trim_lines(io.StringIO(output)))
+
     def preprocess(self, filename: AnyStr, extra_args: Iterable[Text] = None, trim: bool = True, **kwargs) -> Text:
         '''
         Preprocess `filename`.
@@ -442,53 +743,197 @@ class Clang:
 
         @returns str
         '''
-        output = self.run(filename, extra_args=['-E'] + list(extra_args or []),
-                          get_stdout=True, check=True, **kwargs).stdout
+        lines = self._stream(filename, extra_args=['-E'] + list(extra_args or []), **kwargs)
 
-        if trim:
-            # Remove preprocessor markings
-            output = re.sub(r'^#.*$', '', output, flags=re.M)
+        return ''.join(Clang._trim_lines(lines) if trim else lines)
 
-            # Trim whitespace
-            output = re.sub(r'\n\s*\n', '\n', output, flags=re.M | re.S)
+    async def preprocess_async(self, filename: AnyStr, extra_args: Iterable[Text] = None, trim: bool = True,
+                               **kwargs) -> Text:
+        '''
+        Preprocess `filename` without blocking the event loop. See preprocess().
+        '''
+        output = (await self.run_async(filename, extra_args=['-E'] + list(extra_args or []),
+                                       get_stdout=True, check=True, **kwargs)).stdout
 
-        return output
+        return Clang._trim(output) if trim else output
 
-    def get_macros(self, filename: AnyStr, extra_args: Iterable[Text] = None, **kwargs) -> Dict[Text, Text]:
+    @staticmethod
+    def _parse_dependencies(make_rule: Text, run_dir: AnyStr) -> List[Text]:
         '''
-        Extract all macros from `filename`
+        Parse the make rule that `clang -M` outputs into a list of absolute paths.
+        '''
+        _, _, dependencies = make_rule.replace('\\\n', ' ').partition(': ')
+        return [os.path.normpath(os.path.join(run_dir, dependency.replace('\\ ', ' ')))
+                for dependency in re.split(r'(?<!\\)\s+', dependencies.strip()) if dependency]
 
-        @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
+    def get_includes(self, filename: AnyStr, extra_args: Iterable[Text] = None, **kwargs) -> List[Text]:
+        '''
+        Get the include closure of `filename` (the file and all the files it includes, recursively) using `clang -M`.
+
+        @param filename     The name of the file.
         @param extra_args   Additional args to append to the compile commands' flags.
         @param kwargs       Additional args for subprocess, `stderr`, `shell` and `executable` are ignored.
 
-        @returns Dict[Text, Text]   The dictionary that maps between the macros' names and their definitions.
+        @returns List[Text] The absolute paths of the files, starting with `filename`.
         '''
-        pp_output = self.preprocess(filename, extra_args=['-dM'] + list(extra_args or []), trim=False, **kwargs)
+        run_dir, _ = self._command(filename, ignore_cmds=kwargs.get('ignore_cmds', False))
+        make_rule = self.run(filename, extra_args=['-M'] + list(extra_args or []),
+                             get_stdout=True, check=True, **kwargs).stdout
 
-        # Remove keyword arguments we don't want to pass to our special expansion preprocessor
+        return Clang._parse_dependencies(make_rule, run_dir)
+
+    # The preprocessor compresses packs of empty lines, macros that use _Pragma may expand to more than
+    # a single line, so a magic marker is used.
+    _MACRO_MARKER = '@'
+
+    # The macro __has_include() can only be used in preprocessor directives. However, it can appear in
+    # a "SOMELIB_USES_X" macro and cause errors during our macro expansion.
+    _IGNORE_HAS_INCLUDE = '#define __has_include(inc) __has_include(inc)\n'
+
+    _MACRO_EXPANSION_ARGS = ['-Wno-macro-redefined', '-Wno-builtin-macro-redefined']
+
+    _OBJECT_MACRO_RE = re.compile(r'#define (\w+)(?!\(.*\))(?: |$)')
+
+    @staticmethod
+    def _object_macros(pp_lines: Iterable[Text]) -> List[Text]:
+        '''
+        Get the names of the non-function macros out of the lines of the output of `clang -E -dM`.
+        '''
+        return [match.group(1) for line in pp_lines if (match := Clang._OBJECT_MACRO_RE.match(line))]
+
+    @staticmethod
+    def _macro_dumper(pp_lines: Iterable[Text], macro_names: Iterable[Text]) -> Iterator[Text]:
+        '''
+        Generate the lines of a pseudo file that contains all defines and the macros whose expanded forms are needed.
+
+        @param pp_lines     The lines of the output of `clang -E -dM`.
+        @param macro_names  The macros to expand.
+        '''
+        yield from pp_lines
+        yield Clang._IGNORE_HAS_INCLUDE
+        for name in macro_names:
+            yield f'{Clang._MACRO_MARKER} {name} {Clang._MACRO_MARKER}\n'
+
+    @staticmethod
+    def _macro_definitions(lines: Iterable[Text]) -> Iterator[Text]:
+        '''
+        Extract the expanded forms of the macros from the lines of the preprocessed pseudo file.
+        A definition may span multiple lines (f.e. when the macro uses _Pragma).
+        '''
+        end = f' {Clang._MACRO_MARKER}'
+        pending = None
+        for line in lines:
+            line = line[:-1] if line.endswith('\n') else line
+            if pending is None:
+                if not line.startswith(Clang._MACRO_MARKER):
+                    continue
+                pending = [line[len(Clang._MACRO_MARKER):]]
+            else:
+                pending.append(line)
+
+            if pending[-1].endswith(end):
+                definition = '\n'.join(pending)[:-len(end)]
+                yield definition[1:] if definition.startswith(' ') else definition
+                pending = None
+
+    @staticmethod
+    def _expansion_kwargs(kwargs: Dict) -> Dict:
+        '''
+        Remove keyword arguments we don't want to pass to our special expansion preprocessor.
+        '''
+        kwargs = dict(kwargs)
         kwargs.pop('ignore_cmds', None)
         kwargs.pop('stdin', None)
         kwargs.pop('input', None)
+        return kwargs
 
-        macro_names = re.findall(r'^#define (?P<name>\w+)(?!\(.*\))(?: |$)', pp_output, flags=re.M)
+    def _expand_macros(self, pp_lines: Iterable[Text], macro_names: List[Text], kwargs: Dict) -> List[Text]:
+        '''
+        Expand `macro_names` using the defines in `pp_lines` (the output of `clang -E -dM`).
+        '''
+        if not macro_names:
+            return []
+
+        macro_definitions = self._stream(Clang.STDIN_FILENAME, ['-E'] + Clang._MACRO_EXPANSION_ARGS,
+                                         input_lines=Clang._macro_dumper(pp_lines, macro_names), ignore_cmds=True,
+                                         **Clang._expansion_kwargs(kwargs))
+        return list(Clang._macro_definitions(macro_definitions))
+
+    async def _expand_macros_async(self, pp_lines: Iterable[Text], macro_names: List[Text],
+                                   kwargs: Dict) -> List[Text]:
+        if not macro_names:
+            return []
+
+        macro_definitions = await self.preprocess_async(Clang.STDIN_FILENAME, Clang._MACRO_EXPANSION_ARGS, trim=False,
+                                                        input=''.join(Clang._macro_dumper(pp_lines, macro_names)),
+                                                        ignore_cmds=True, **Clang._expansion_kwargs(kwargs))
+        return list(Clang._macro_definitions(io.StringIO(macro_definitions)))
+
+    def get_macros(self, filename: AnyStr, extra_args: Iterable[Text] = None, *, include_predefined: bool = True,
+                   **kwargs) -> Dict[Text, Text]:
+        '''
+        Extract all macros from `filename`
 
-        # The preprocessor compresses packs of empty lines, macros that use _Pragma may expand to more than
-        # a single line, so a magic marker is used.
-        _MARKER = '@'  # pylint: disable=invalid-name
-        _DEFINITION_RE = rf'^{re.escape(_MARKER)} ?([^{_MARKER}]*?) {re.escape(_MARKER)}$'  # pylint: disable=invalid-name
+        If the compiler has a predefined macros baseline (see PredefinedMacros), the predefined macros that the file
+        doesn't change are taken from the baseline instead of being expanded again.
 
-        # The macro __has_include() can only be used in preprocessor directives. However, it can appear in
-        # a "SOMELIB_USES_X" macro and cause errors during our macro expansion.
-        _IGNORE_HAS_INCLUDE = '#define __has_include(inc) __has_include(inc)\n'  # pylint: disable=invalid-name
+        @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
+        @param extra_args   Additional args to append to the compile commands' flags.
+        @param include_predefined If `False`, the predefined macros that the file doesn't change are omitted.
+                                  Requires a predefined macros baseline.
+        @param kwargs       Additional args for subprocess, `stderr`, `shell` and `executable` are ignored.
 
-        # A pseudo file is generated to contain all defines and the macros whose expanded forms are needed
-        macro_dumper = pp_output + _IGNORE_HAS_INCLUDE + \
-            '\n'.join(f'{_MARKER} {name} {_MARKER}' for name in macro_names) + '\n'
-        macro_definitions = self.preprocess(Clang.STDIN_FILENAME, ['-Wno-macro-redefined', '-Wno-builtin-macro-redefined'],
-                                            trim=False, input=macro_dumper, ignore_cmds=True, **kwargs)
+        @returns Dict[Text, Text]   The dictionary that maps between the macros' names and their definitions.
+        '''
+        # The outputs are processed line by line while clang runs, and the definitions are spooled (to a temporary
+        # file if they are large) for the passes over them, so memory doesn't grow with the size of the outputs
+        with self._measure('macros-dump'):
+            baseline = None
+            if self.predefined_macros is not None:
+                baseline = self.predefined_macros.get(self, filename, extra_args,
+                                                      ignore_cmds=kwargs.get('ignore_cmds', False),
+                                                      timeout=kwargs.get('timeout'))
+            pp_file = _spool(self._stream(filename, extra_args=['-E', '-dM'] + list(extra_args or []), **kwargs))
+
+        with pp_file, self._measure('macros-expand'):
+            macro_names = Clang._object_macros(pp_file)
+            pp_file.seek(0)
+            predefined = MacroBaseline.unchanged(baseline, pp_file)
+            expanded_names = [name for name in macro_names if predefined.get(name) is None]
+            pp_file.seek(0)
+            expanded = dict(zip(expanded_names, self._expand_macros(pp_file, expanded_names, kwargs)))
+
+        return Clang._collect_macros(macro_names, predefined, expanded, include_predefined)
+
+    async def get_macros_async(self, filename: AnyStr, extra_args: Iterable[Text] = None, *,
+                               include_predefined: bool = True, **kwargs) -> Dict[Text, Text]:
+        '''
+        Extract all macros from `filename` without blocking the event loop. See get_macros().
+        '''
+        with self._measure('macros-dump'):
+            baseline = None
+            if self.predefined_macros is not None:
+                # Computing the baseline runs clang (once per set of flags)
+                baseline = await asyncio.get_running_loop().run_in_executor(
+                    None, partial(self.predefined_macros.get, self, filename, extra_args,
+                                  ignore_cmds=kwargs.get('ignore_cmds', False), timeout=kwargs.get('timeout')))
+            pp_output = await self.preprocess_async(filename, extra_args=['-dM'] + list(extra_args or []), trim=False,
+                                                    **kwargs)
+
+        with self._measure('macros-expand'):
+            macro_names = Clang._object_macros(io.StringIO(pp_output))
+            predefined = MacroBaseline.unchanged(baseline, io.StringIO(pp_output))
+            expanded_names = [name for name in macro_names if predefined.get(name) is None]
+            expanded = dict(zip(expanded_names, await self._expand_macros_async(io.StringIO(pp_output),
+                                                                                expanded_names, kwargs)))
+
+        return Clang._collect_macros(macro_names, predefined, expanded, include_predefined)
 
-        return dict(zip(macro_names, re.findall(_DEFINITION_RE, macro_definitions, re.S | re.M)))
+    @staticmethod
+    def _collect_macros(macro_names: List[Text], predefined: Mapping[Text, Optional[Text]],
+                        expanded: Mapping[Text, Text], include_predefined: bool) -> Dict[Text, Text]:
+        return {name: expanded[name] if predefined.get(name) is None else predefined[name]
+                for name in macro_names if include_predefined or name not in predefined}
 
     def run_plugin(self, plugin_lib: AnyStr, plugin_name: AnyStr, filename: AnyStr, extra_args: Iterable[Text] = None, *,
                    get_stdout: bool = True, check: bool = False, **kwargs) -> subprocess.CompletedProcess:
@@ -518,6 +963,13 @@ class Clang:
                         check=check,
                         **kwargs)
 
+    @property
+    def plugins(self) -> List[Text]:
+        '''
+        The names of the registered plugins.
+        '''
+        return list(self.__plugins)
+
     def register_plugin(self, plugin_lib: AnyStr, plugin_name: AnyStr):
         '''
         Register a plugin to run later.
@@ -527,13 +979,29 @@ class Clang:
         '''
         self.__plugins[plugin_name] = plugin_lib
 
+    def _plugins_args(self, plugin_args: Mapping[Text, Iterable[Text]] = None) -> List[Text]:
+        '''
+        Get the clang frontend args that load and run the registered plugins.
+
+        @param plugin_args  Args to pass to the plugins, by plugin name.
+        '''
+        plugin_libs = list(chain(*{(Clang.__LOAD_LIB_FLAG, os.path.abspath(plugin_lib))
+                                   for plugin_lib in self.__plugins.values()}))
+        plugin_names = list(chain(*((Clang.__ADD_PLUGIN_FLAG, plugin) for plugin in self.__plugins)))
+        plugin_args = list(chain(*((f'{Clang.__PLUGIN_ARG_FLAG}{plugin}', arg)
+                                   for plugin, args in (plugin_args or {}).items() for arg in args)))
+
+        return plugin_libs + plugin_names + plugin_args
+
     def run_plugins(self, filename: AnyStr, extra_args: Iterable[Text] = None, *,
-                    get_stdout: bool = True, check: bool = False, **kwargs) -> subprocess.CompletedProcess:
+                    get_stdout: bool = True, check: bool = False, plugin_args: Mapping[Text, Iterable[Text]] = None,
+                    **kwargs) -> subprocess.CompletedProcess:
         '''
         Run clang with the registered plugins on `filename`.
 
         @param filename     The name of the file. Use Clang.STDIN_FILENAME when using a non-file stdin.
         @param extra_args   Additional args to append to the compile commands' flags.
+        @param plugin_args  Args to pass to the plugins, by plugin name.
         @param get_stdout   If `True`, return clang's stdout. Otherwise, return the exit code.
         @param check        If `True` and the exit code was non-zero, raise a PluginError. The PluginError object will
                             have the return code in the returncode attribute, and output & stderr attributes if those
@@ -544,16 +1012,164 @@ class Clang:
         @returns CompletedProcess   The returned instance will have attributes args, returncode, stdout and stderr.
                                     When stdout and stderr are not captured, and those attributes will be None.
         '''
-        if extra_args is None:
-            extra_args = []
-
-        plugin_libs = list(chain(*{(Clang.__LOAD_LIB_FLAG, os.path.abspath(plugin_lib))
-                                   for plugin_lib in self.__plugins.values()}))
-        plugin_names = list(chain(*((Clang.__ADD_PLUGIN_FLAG, plugin) for plugin in self.__plugins)))
-
         return self.run(filename,
                         extra_args=[Clang.__SYNTAX_ONLY_FLAG] + list(extra_args or []),
-                        clang_args=plugin_libs + plugin_names,
+                        clang_args=self._plugins_args(plugin_args),
                         get_stdout=get_stdout,
                         check=check,
                         **kwargs)
+
+    async def run_plugins_async(self, filename: AnyStr, extra_args: Iterable[Text] = None, *,
+                                get_stdout: bool = True, check: bool = False,
+                                plugin_args: Mapping[Text, Iterable[Text]] = None,
+                                **kwargs) -> subprocess.CompletedProcess:
+        '''
+        Run clang with the registered plugins on `filename` without blocking the event loop. See run_plugins().
+        '''
+        return await self.run_async(filename,
+                                    extra_args=[Clang.__SYNTAX_ONLY_FLAG] + list(extra_args or []),
+                                    clang_args=self._plugins_args(plugin_args),
+                                    get_stdout=get_stdout,
+                                    check=check,
+                                    **kwargs)
+
+
+# Flags that change the language (and the predefined macros), with and without a separate value. Other flags only
+# matter through the macros that they define and the files that they include.
+_LANGUAGE_FLAGS_WITH_VALUE = frozenset(('-x', '-target', '-arch'))
+_LANGUAGE_FLAGS_RE = re.compile(r'-(?:-?std=|-?target=|m|f|O|undef$|ansi$|pthreads?$)')
+# Flags whose separate values shouldn't be mistaken for flags
+_FLAGS_WITH_VALUE = frozenset(('-Xclang', '-mllvm', '-Xpreprocessor', '-include', '-imacros', '-o', '-MF', '-MT',
+                               '-MQ'))
+
+
+def language_flags(cmd: List[AnyStr]) -> List[Text]:
+    '''
+    Get the flags that change the language out of a clang command line (see Clang._command()), starting with the
+    clang executable.
+    '''
+    flags = [os.fsdecode(cmd[0])]
+    args = iter(os.fsdecode(arg) for arg in cmd[1:-1])
+    for arg in args:
+        if arg in _LANGUAGE_FLAGS_WITH_VALUE:
+            flags += [arg, next(args, '')]
+        elif arg in _FLAGS_WITH_VALUE:
+            next(args, None)
+        elif _LANGUAGE_FLAGS_RE.match(arg):
+            flags.append(arg)
+    return flags
+
+
+_DEFINE_RE = re.compile(r'#define (\w+)')
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_]\w*')
+
+
+class MacroBaseline(NamedTuple):
+    '''
+    The predefined macros of the compiler for a set of flags.
+
+    Members:
+        - definitions -- The line of every predefined macro in the output of `clang -E -dM`, by name.
+        - values -- The expanded definitions of the non-function predefined macros.
+        - identifiers -- The identifiers that the definitions use that aren't predefined macros themselves.
+        - names -- The names of the predefined macros, by their lines.
+    '''
+    definitions: Dict[Text, Text]
+    values: Dict[Text, Text]
+    identifiers: FrozenSet[Text]
+    names: Dict[Text, Text]
+
+    @classmethod
+    def create(cls, definitions: Dict[Text, Text], values: Dict[Text, Text]) -> 'MacroBaseline':
+        '''
+        Create a baseline, finding the identifiers that the definitions use.
+        '''
+        identifiers = {identifier for line in definitions.values()
+                       for identifier in _IDENTIFIER_RE.findall(line, len('#define '))}
+        return cls(definitions, values, frozenset(identifiers - definitions.keys()),
+                   {line: name for name, line in definitions.items()})
+
+    @staticmethod
+    def unchanged(baseline: Optional['MacroBaseline'], pp_lines: Iterable[Text]) -> Dict[Text, Optional[Text]]:
+        '''
+        Get the predefined macros that a file (the lines of its `clang -E -dM` output) doesn't change.
+
+        @returns Dict[Text, Optional[Text]] Maps the names of the macros to their values, or to `None` if the values
+                                            may be different in the file and have to be expanded again (the file
+                                            changes some of the predefined macros, or defines identifiers that the
+                                            predefined macros use).
+        '''
+        if baseline is None:
+            return {}
+
+        # A single pass that only keeps the names of the unchanged macros
+        names = []
+        uses_identifiers = False
+        for line in pp_lines:
+            line = line.rstrip('\n')
+            if (name := baseline.names.get(line)) is not None:
+                names.append(name)
+            elif not uses_identifiers and (match := _DEFINE_RE.match(line)) and match.group(1) in baseline.identifiers:
+                uses_identifiers = True
+        if len(names) == len(baseline.definitions) and not uses_identifiers:
+            return {name: baseline.values.get(name) for name in names}
+        return dict.fromkeys(names)
+
+
+class PredefinedMacros:
+    '''
+    The predefined macros baselines of the compilers, computed once per clang executable and set of flags that change
+    the language (see language_flags()).
+
+    Baselines are cached in memory and in ``cache`` (defaults to the "predefined" cache in the default cache
+    directory) until the clang executable changes. Share a PredefinedMacros object between the Clang objects of a
+    load, so every baseline is computed once.
+    '''
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = DiskCache('predefined') if cache is None else cache
+        self._baselines: Dict[Tuple[Text, ...], Optional[MacroBaseline]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, clang: Clang, filename: AnyStr, extra_args: Iterable[Text] = None, *, ignore_cmds: bool = False,
+            timeout: float = None) -> Optional[MacroBaseline]:
+        '''
+        Get the baseline of the flags that `clang` compiles `filename` with.
+
+        @returns The baseline, or `None` if clang can't compute it.
+        '''
+        _, cmd = clang._command(filename, extra_args, ignore_cmds=ignore_cmds)  # pylint: disable=protected-access
+        flags = tuple(language_flags(cmd))
+        if (baseline := self._baselines.get(flags, _MISSING)) is _MISSING:
+            with self._lock:
+                if (baseline := self._baselines.get(flags, _MISSING)) is _MISSING:
+                    baseline = self._baselines[flags] = self._load(clang, list(flags), timeout)
+        return baseline
+
+    def _load(self, clang: Clang, flags: List[Text], timeout: Optional[float]) -> Optional[MacroBaseline]:
+        executable = shutil.which(flags[0])
+        key = None
+        if executable is not None:
+            executable = os.path.realpath(executable)
+            key = make_key(executable, flags[1:])
+            entry = self.cache.get_valid(key)
+            if isinstance(entry, dict) and isinstance(entry.get('definitions'), dict) and \
+                    isinstance(entry.get('values'), dict):
+                return MacroBaseline.create(entry['definitions'], entry['values'])
+
+        # pylint: disable=protected-access
+        try:
+            # The macros that are defined before the first line of an empty file
+            with _spool(clang._stream(Clang.STDIN_FILENAME, ['-E', '-dM'] + flags[1:], input='', ignore_cmds=True,
+                                      timeout=timeout)) as pp_file:
+                definitions = {match.group(1): line.rstrip('\n') for line in pp_file
+                               if (match := _DEFINE_RE.match(line))}
+                macro_names = [name for name, line in definitions.items() if Clang._OBJECT_MACRO_RE.match(line)]
+                pp_file.seek(0)
+                values = dict(zip(macro_names, clang._expand_macros(pp_file, macro_names, {'timeout': timeout})))
+        except (PluginError, subprocess.TimeoutExpired):
+            return None
+
+        if key is not None:
+            self.cache.set_valid(key, {'definitions': definitions, 'values': values}, [executable])
+        return MacroBaseline.create(definitions, values)
@@ -1,7 +1,7 @@
 '''
 Utility classes that represent C++ objects and concepts.
 '''
-from . import types
+from . import digests, types
 from .enum import Enum
 from .record import Record
-from .scope import Scope, normalize, split
+from .scope import BaseScope, Change, CompactScope, Conflict, Scope, compact, diff, merge, normalize, split
@@ -0,0 +1,208 @@
+'''
+Content digests of scope trees, used to compare scopes without walking their identical parts.
+
+Containers (scopes and enums) cache their digests. A cached digest weakly references the containers whose cached
+digests were computed from it, so changing a container only invalidates the digests of the container and the
+containers that contain it (its ancestors), and the digests of the other subtrees stay cached. Changing containers
+that were never hashed (f.e. while loading or deserializing other scopes) doesn't invalidate anything. Digests may be
+computed by multiple threads at once.
+
+Values are assumed not to be changed in place (f.e. appending to a list that is a value in a hashed scope isn't
+detected).
+'''
+import array
+import hashlib
+import struct
+import sys
+import threading
+import weakref
+
+from typing import Any, Callable, Dict, List, Optional
+
+DIGEST_SIZE = 16
+
+_LENGTH = struct.Struct('<Q')
+_STR_ERRORS = 'surrogatepass'
+
+
+class _Entry:
+    '''
+    A cached digest (None while it is computed) and weak references to the containers whose cached digests depend
+    on it, by id.
+    '''
+    __slots__ = ('digest', 'parents')
+
+    def __init__(self, digest: Optional[bytes] = None):
+        self.digest = digest
+        self.parents: Dict[int, weakref.ref] = {}
+
+    def add_parent(self, parent: Any):
+        '''
+        Invalidate the cached digest of ``parent`` with this one.
+        '''
+        self.parents[id(parent)] = weakref.ref(parent)
+
+
+class _Computing(threading.local):
+    '''
+    The containers whose digests are being computed by the current thread, innermost last.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.stack: List[Any] = []
+
+
+_computing = _Computing()
+
+
+def changed(container: Any):
+    '''
+    Invalidate the cached digests that may depend on ``container``, call whenever it is changed.
+    '''
+    entry = getattr(container, '_digest', None)
+    if entry is not None:
+        container._digest = None  # pylint: disable=protected-access
+        for parent_ref in entry.parents.values():
+            # Parents that no longer exist don't have to be invalidated
+            if (parent := parent_ref()) is not None:
+                changed(parent)
+
+
+class Invalidating:
+    '''
+    A mixin for containers (dicts) that invalidates their cached digests when they are changed by the dict methods.
+
+    Containers must call changed() in their own __setitem__ as well.
+    '''
+    __slots__ = ()
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        changed(self)
+
+    def pop(self, *args):
+        try:
+            return super().pop(*args)
+        finally:
+            changed(self)
+
+    def popitem(self, *args):
+        try:
+            return super().popitem(*args)
+        finally:
+            changed(self)
+
+    def setdefault(self, *args):
+        try:
+            return super().setdefault(*args)
+        finally:
+            changed(self)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        changed(self)
+
+    def clear(self):
+        super().clear()
+        changed(self)
+
+
+def cached(container: Any, compute: Callable[[], bytes]) -> bytes:
+    '''
+    Get the cached digest of ``container``, or compute and cache it.
+    '''
+    entry = getattr(container, '_digest', None)
+    if entry is None:
+        entry = container._digest = _Entry()  # pylint: disable=protected-access
+    stack = _computing.stack
+    if stack:
+        # Invalidated with container from now on, including changes while computing
+        entry.add_parent(stack[-1])
+    if entry.digest is not None:
+        return entry.digest
+
+    stack.append(container)
+    try:
+        digest = compute()
+    finally:
+        stack.pop()
+    # A change while computing (f.e. of a contained container) removes the entry
+    if container._digest is entry:  # pylint: disable=protected-access
+        entry.digest = digest
+    return digest
+
+
+def preset(container: Any, digest: bytes, parent: Any = None):
+    '''
+    Cache a known digest of ``container`` (f.e. one that was stored in a snapshot).
+
+    @param parent   The container that contains ``container``, its cached digest is invalidated when
+                    ``container`` is changed.
+    '''
+    entry = container._digest = _Entry(digest)  # pylint: disable=protected-access
+    if parent is not None:
+        entry.add_parent(parent)
+
+
+def hasher(kind: bytes) -> 'hashlib._Hash':
+    '''
+    Create a hash object for a container of ``kind``.
+    '''
+    return hashlib.blake2b(kind, digest_size=DIGEST_SIZE)
+
+
+def _atom(hash_object: 'hashlib._Hash', tag: bytes, data: bytes):
+    hash_object.update(tag)
+    hash_object.update(_LENGTH.pack(len(data)))
+    hash_object.update(data)
+
+
+def _text(value: Any) -> bytes:
+    return str(value).encode('utf-8', _STR_ERRORS)
+
+
+def update(hash_object: 'hashlib._Hash', value: Any):  # pylint: disable=too-many-branches
+    '''
+    Add a value (a name, a constant, an enum or a nested scope) to a hash.
+
+    Values of different types (f.e. ``1``, ``1.0`` and ``True``) have different digests.
+    '''
+    if isinstance(value, str):
+        _atom(hash_object, b's', value.encode('utf-8', _STR_ERRORS))
+    elif value is None or isinstance(value, (bool, int, float, complex)):
+        _atom(hash_object, type(value).__name__.encode('ascii'), _text(repr(value)))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        _atom(hash_object, b'b', bytes(value))
+    elif isinstance(value, array.array):
+        if sys.byteorder != 'little':
+            value = array.array(value.typecode, value)
+            value.byteswap()
+        _atom(hash_object, b'a' + value.typecode.encode('ascii'), value.tobytes())
+    elif isinstance(value, dict) and callable(getattr(type(value), 'digest', None)):
+        # Scopes and enums
+        _atom(hash_object, b'd', value.digest())
+    elif isinstance(value, (list, tuple, dict)):
+        if isinstance(value, tuple) and hasattr(value, '_fields'):
+            # Record values
+            _atom(hash_object, b'r', _text(type(value).__name__))
+            for field in value._fields:
+                _atom(hash_object, b'f', _text(field))
+        _atom(hash_object, b'l' if isinstance(value, list) else b'm' if isinstance(value, dict) else b't',
+              _LENGTH.pack(len(value)))
+        for item in (value.items() if isinstance(value, dict) else value):
+            update(hash_object, item)
+    else:
+        _atom(hash_object, _text(type(value).__qualname__), _text(repr(value)))
+
+
+def of(value: Any) -> bytes:
+    '''
+    Get the digest of a value.
+    '''
+    if isinstance(value, dict) and callable(getattr(type(value), 'digest', None)):
+        return value.digest()
+
+    hash_object = hasher(b'v')
+    update(hash_object, value)
+    return hash_object.digest()
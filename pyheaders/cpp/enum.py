@@ -4,8 +4,11 @@ Represents a C++ enum.
 from collections import OrderedDict
 from typing import Any, Optional, Text, Union
 
+from . import digests
+from .lazy import Lazy
 
-class Enum(OrderedDict):
+
+class Enum(digests.Invalidating, OrderedDict):
     '''
     Represents a C++ enum.
     '''
@@ -31,7 +34,26 @@ class Enum(OrderedDict):
         if not name.isidentifier():
             raise ValueError("name must be a valid identifier.")
 
+        # Enumerators are looked up by value, so they are always stored computed
+        if isinstance(value, Lazy):
+            value = value()
+
         super().__setitem__(name, value)
+        digests.changed(self)
+
+    def digest(self) -> bytes:
+        '''
+        A digest of the name and the enumerators of the enum, cached until it is changed (see ``cpp.digests``).
+        '''
+        return digests.cached(self, self._compute_digest)
+
+    def _compute_digest(self) -> bytes:
+        hash_object = digests.hasher(b'enum')
+        digests.update(hash_object, self.name)
+        for name, value in self.items():
+            digests.update(hash_object, name)
+            digests.update(hash_object, value)
+        return hash_object.digest()
 
     def get(self, key: Text, default: Optional[Any] = None, /):
         if key in self:
@@ -0,0 +1,32 @@
+'''
+Placeholders for values that are computed on first access.
+'''
+from typing import Any, Callable
+
+
+class Lazy:
+    '''
+    A placeholder for a value that is only computed when it is first accessed.
+
+    Scopes replace the placeholder with the computed value on first access, so the value is computed at most once.
+    '''
+    __slots__ = ('factory',)
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+
+    def __call__(self) -> Any:
+        return self.factory()
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.factory!r})'
+
+
+class LazyContainer(Lazy):
+    '''
+    A placeholder for a value that is known to be a scope, a record or an enum (f.e. in a snapshot).
+
+    Containers are merged instead of being replaced (see ``cpp.merge``), so these placeholders are computed when
+    they are merged with other containers. Other placeholders are never computed by merging.
+    '''
+    __slots__ = ()
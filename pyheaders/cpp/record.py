@@ -2,9 +2,12 @@
 Represents a C++ record (class, struct).
 '''
 
+import sys
+
 from collections import namedtuple
 from keyword import iskeyword
-from typing import Any, Iterable, List, Text, Tuple, Union
+from typing import Any, Dict, Iterable, List, Text, Tuple, Union
+from weakref import WeakValueDictionary
 
 from .scope import Scope, split, normalize
 from .types import remove_template
@@ -16,6 +19,11 @@ class Record(Scope):
     '''
     _COLLAPSE_SHORT_RECORDS = True
 
+    # Records with the same name and fields (f.e. the same record loaded from multiple files) share their
+    # fields tuple and their type.
+    _FIELDS: Dict[Tuple[Text, ...], Tuple[Text, ...]] = {}
+    _TYPES: 'WeakValueDictionary[Tuple[Text, Tuple[Text, ...]], type]' = WeakValueDictionary()
+
     @staticmethod
     def collapse_short_records(collapse: bool = True):
         '''
@@ -48,18 +56,25 @@ class Record(Scope):
     def __init__(self, name: Text, field_names: Union[Text, Iterable[Text]], base_scope: Iterable[Tuple[Text, Any]] = None):
         super().__init__(base_scope or [])
 
-        self.__name = normalize(name)
-        self.__fields = tuple(Record._safe_field_names(field_names))
+        self.__name = sys.intern(normalize(name))
+        fields = tuple(sys.intern(field) for field in Record._safe_field_names(field_names))
+        self.__fields = Record._FIELDS.setdefault(fields, fields)
 
-        if len(self.__fields) == 1 and Record._COLLAPSE_SHORT_RECORDS:
-            self.__type = Record._identity
-        else:
+        # The namedtuple is only created when it's first needed, since creating classes is expensive
+        self.__type = Record._identity if len(self.__fields) == 1 and Record._COLLAPSE_SHORT_RECORDS else None
+
+    def __make_type(self):
+        key = (self.__name, self.__fields)
+        record_type = Record._TYPES.get(key)
+        if record_type is None:
             module, name = split(remove_template(self.__name))
             if not module:
                 module = ''
             if iskeyword(name):
                 name = f'_{name}'
-            self.__type = namedtuple(name, self.__fields, module=module.replace(Scope.SEP, '.'), rename=True)
+            record_type = namedtuple(name, self.__fields, module=module.replace(Scope.SEP, '.'), rename=True)
+            Record._TYPES[key] = record_type
+        return record_type
 
     @property
     def name(self):
@@ -75,8 +90,21 @@ class Record(Scope):
         '''
         return self.__fields
 
+    @property
+    def type(self):
+        '''
+        Gets the type of the values constructed by this record (a namedtuple, or an identity function
+        for collapsed records).
+        '''
+        if self.__type is None:
+            self.__type = self.__make_type()
+        return self.__type
+
+    def _signature(self) -> Tuple[Text, Tuple[Text, ...]]:
+        return self.__name, self.__fields
+
     def __call__(self, *args: Any):
-        return self.__type(*args)
+        return self.type(*args)
 
     def __repr__(self):
         scope_repr = ''
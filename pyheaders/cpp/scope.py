@@ -3,54 +3,84 @@ Represents a C++ scope (namespace, class, enum class, ...).
 '''
 
 import re
+import sys
 
 from collections import OrderedDict
-from typing import Any, Optional, Pattern, Text, Tuple
+from collections.abc import ItemsView, ValuesView
+from typing import Any, Iterator, List, NamedTuple, Optional, Pattern, Text, Tuple
+
+from . import digests
+from .enum import Enum
+from .lazy import Lazy, LazyContainer
 
 from .types import OPERATOR_KW as _OP_KW, OPERATOR_PROBLEMATIC_CHARS as _PROBLEMATIC_CHARS
 from .types import TEMPLATE_START, TEMPLATE_END, PARENS_START, PARENS_END
 
+_BRACKETS = (PARENS_START, PARENS_END, TEMPLATE_START, TEMPLATE_END)
+
+
+class _ScopeValuesView(ValuesView):  # pylint: disable=too-many-ancestors
+    def __iter__(self):
+        for key in self._mapping:
+            yield self._mapping._get_local(key)  # pylint: disable=protected-access
+
 
-class Scope(OrderedDict):
+class _ScopeItemsView(ItemsView):  # pylint: disable=too-many-ancestors
+    def __iter__(self):
+        for key in self._mapping:
+            yield key, self._mapping._get_local(key)  # pylint: disable=protected-access
+
+
+class BaseScope(digests.Invalidating):
     '''
-    Represents a C++ scope (namespace, class, enum class, ...).
+    Implements the C++ scope logic on top of a mapping type.
+
+    The base of Scope and CompactScope, check for scopes using ``isinstance(value, BaseScope)``.
     '''
+    __slots__ = ()
+
     SEP: Text = '::'
     # Equivalent to: \([^:()]*\banonymous\b[^:()]*\)::
     ANONYMOUS_NAMESPACE: Pattern = rf'\([^{SEP}()]*\banonymous\b[^{SEP}()]*\){SEP}'
 
     _PLACEHOLDER = '@'
-    assert _PLACEHOLDER not in SEP
+    assert _PLACEHOLDER not in SEP and SEP.strip(_PROBLEMATIC_CHARS) == SEP
 
     @staticmethod
     def _safe_name(name: Text) -> Text:
         '''
         Prevent detection of scope separators inside templates or parentheses.
         '''
-        def match_bracket(parenthesis, template):
-            # The second part of the template-related condition is to not catch `r'operator[<>]*'`.
-            # This is not needed for parentheses because the only operator with them is 'operator()',
-            # so we open and close and it's OK.
-            return name[i] == parenthesis or \
-                (name[i] == template and not name[:i].rstrip(_PROBLEMATIC_CHARS).endswith(_OP_KW))
+        if Scope.SEP not in name or not any(bracket in name for bracket in _BRACKETS):
+            return name
 
-        safe_name = ''
+        safe_name = []
         bracket_level = 0
+        # The end of name[:i] without its trailing problematic chars, so `operator<` (and such) is detected without
+        # stripping the name for every bracket
+        stripped_end = 0
         i = 0
         while i < len(name):
-            if match_bracket(PARENS_START, TEMPLATE_START):
+            char = name[i]
+            # The second part of the template-related conditions is to not catch `r'operator[<>]*'`.
+            # This is not needed for parentheses because the only operator with them is 'operator()',
+            # so we open and close and it's OK.
+            if char == PARENS_START or (char == TEMPLATE_START and not name.endswith(_OP_KW, 0, stripped_end)):
                 bracket_level += 1
-            elif match_bracket(PARENS_END, TEMPLATE_END):
+            elif char == PARENS_END or (char == TEMPLATE_END and not name.endswith(_OP_KW, 0, stripped_end)):
                 bracket_level -= 1
 
-            if bracket_level and name.find(Scope.SEP, i, i + len(Scope.SEP)) == i:
-                safe_name += Scope._PLACEHOLDER * len(Scope.SEP)
+            if bracket_level and name.startswith(Scope.SEP, i):
+                safe_name.append(Scope._PLACEHOLDER * len(Scope.SEP))
                 i += len(Scope.SEP)
+                stripped_end = i
             else:
-                safe_name += name[i]
+                safe_name.append(char)
                 i += 1
+                if char not in _PROBLEMATIC_CHARS:
+                    stripped_end = i
 
-        return safe_name
+        return ''.join(safe_name)
 
     @staticmethod
     def _extract_first_name(name: Text) -> Tuple[Text, Optional[Text]]:
@@ -61,6 +91,29 @@ class Scope(OrderedDict):
             return name[:first_sep_index], name[first_sep_index + len(Scope.SEP):]
         return name, None
 
+    def _get_local(self, name: Text):
+        '''
+        Get an item from this scope without parsing the name, computing lazy values.
+        '''
+        value = super().__getitem__(name)
+        if isinstance(value, Lazy):
+            value = value()
+            super().__setitem__(name, value)
+        return value
+
+    def _has_local(self, name: Text) -> bool:
+        '''
+        Check if this scope has an item without parsing the name.
+        '''
+        return super().__contains__(name)
+
+    def _set_local(self, name: Text, value: Any):
+        '''
+        Set an item in this scope without parsing the name.
+        '''
+        super().__setitem__(name, value)
+        digests.changed(self)
+
     def __getitem__(self, name: Text):
         if not isinstance(name, str):
             raise TypeError("name must be a str.")
@@ -68,8 +121,8 @@ class Scope(OrderedDict):
         name, inner = Scope._extract_first_name(name)
 
         if inner is not None:
-            return super().__getitem__(name)[inner]
-        return super().__getitem__(name)
+            return self._get_local(name)[inner]
+        return self._get_local(name)
 
     def __setitem__(self, name: Text, value: Any):
         if not isinstance(name, str):
@@ -78,10 +131,11 @@ class Scope(OrderedDict):
         name, inner = Scope._extract_first_name(name)
         if inner is not None:
             if name not in self:
-                super().__setitem__(name, Scope())
+                self._set_local(sys.intern(name), self._CHILD_TYPE())
             self[name][inner] = value
         else:
-            super().__setitem__(name, value)
+            super().__setitem__(sys.intern(name), value)
+            digests.changed(self)
 
     def get(self, key: Text, default: Optional[Any] = None, /):
         if key in self:
@@ -94,14 +148,300 @@ class Scope(OrderedDict):
 
         name, inner = Scope._extract_first_name(name)
         if inner is not None:
-            return super().__contains__(name) and inner in self[name]
-        return super().__contains__(name)
+            return self._has_local(name) and inner in self[name]
+        return self._has_local(name)
+
+    def values(self):
+        return _ScopeValuesView(self)
+
+    def items(self):
+        return _ScopeItemsView(self)
+
+    def __eq__(self, other):
+        if isinstance(other, OrderedDict):
+            return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self.items(), other.items()))
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    __hash__ = None
 
     def isempty(self) -> bool:
         '''
         S.isempty() -> bool.  Check if there are any items in S that are not a Scope.
         '''
-        return all(isinstance(item, Scope) and item.isempty() for item in self.values())
+        return all(isinstance(item, BaseScope) and item.isempty() for item in self.values())
+
+    def _signature(self) -> Optional[Tuple]:
+        '''
+        The properties of this scope (other than its items) that are part of its digest.
+        '''
+        return None
+
+    def _compute_digest(self) -> bytes:
+        hash_object = digests.hasher(b'scope')
+        digests.update(hash_object, self._signature())
+        for name in sorted(self):
+            digests.update(hash_object, name)
+            digests.update(hash_object, self._get_local(name))
+        return hash_object.digest()
+
+    def digest(self) -> bytes:
+        '''
+        S.digest() -> bytes.  A digest of the names and values in S, recursively (lazy values are computed).
+
+        The digest doesn't depend on the order of the names. It is cached until S (or a scope or an enum in it)
+        is changed, see ``cpp.digests``.
+        '''
+        return digests.cached(self, self._compute_digest)
+
+
+class Scope(BaseScope, OrderedDict):
+    '''
+    Represents a C++ scope (namespace, class, enum class, ...).
+    '''
+    # The cached digest (see digests.cached()), a class default makes checking unhashed scopes cheap
+    _digest = None
+
+
+class CompactScope(BaseScope, dict):
+    '''
+    A memory-compact C++ scope.
+
+    Behaves like a Scope but is a slotted, plain insertion-ordered dict. Both are BaseScopes (it isn't a Scope).
+    Scopes that are implicitly created inside a CompactScope are CompactScopes as well.
+    '''
+    # The cached digest (see Scope), parents are referenced weakly by the digests of the scopes in them
+    __slots__ = ('_digest', '__weakref__')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._digest = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict.__repr__(self)})'
+
+
+Scope._CHILD_TYPE = Scope  # pylint: disable=protected-access
+CompactScope._CHILD_TYPE = CompactScope  # pylint: disable=protected-access
+
+
+def compact(scope: Scope, prune: bool = True) -> CompactScope:
+    '''
+    Convert a scope (recursively) to the memory-compact representation.
+
+    Records keep their type, but the scopes inside them are converted as well.
+    Lazy values are kept as they are and are not computed.
+
+    @param scope    The scope to convert.
+    @param prune    If ``True``, namespaces without any values (recursively) are removed.
+
+    @returns A new CompactScope.
+    '''
+    # pylint: disable=import-outside-toplevel,cyclic-import
+    from .record import Record
+
+    def convert_items(source: Scope):
+        for name in list(source):
+            value = dict.__getitem__(source, name)
+            if isinstance(value, Record):
+                compact_record(value)
+            elif isinstance(value, BaseScope):
+                value = compact(value, prune)
+                # Lazy values are not computed, so they count as values
+                if prune and not value:
+                    continue
+            yield name, value
+
+    def compact_record(record: Record):
+        items = list(convert_items(record))
+        OrderedDict.clear(record)
+        for name, value in items:
+            record._set_local(name, value)  # pylint: disable=protected-access
+
+    result = CompactScope()
+    for name, value in convert_items(scope):
+        result._set_local(name, value)  # pylint: disable=protected-access
+    return result
+
+
+class Conflict(NamedTuple):
+    '''
+    A name that has different values in two merged scopes.
+
+    Members:
+        - name -- The fully qualified name.
+        - old -- The value in the destination scope.
+        - new -- The value in the merged scope (the one that was kept).
+    '''
+    name: Text
+    old: Any
+    new: Any
+
+
+def _differ(current: Any, value: Any) -> bool:
+    '''
+    Check if two values are different, values that are identical but not equal (f.e. NaNs) are the same.
+    '''
+    return current != value and digests.of(current) != digests.of(value)
+
+
+def _merge_enum(dst: Enum, src: Enum, prefix: Text, conflicts: List[Conflict]):
+    for name, value in src.items():
+        if name in dst.keys() and _differ(dst[name], value):
+            conflicts.append(Conflict(f'{prefix}{name}', dst[name], value))
+        dst[name] = value
+
+
+def _merge(dst: Scope, src: Scope, prefix: Text, conflicts: List[Conflict]):
+    # pylint: disable=import-outside-toplevel,cyclic-import,protected-access
+    from .record import Record
+
+    if dst is src:
+        return
+
+    for name in list(src):
+        value = dict.__getitem__(src, name)
+        if not dst._has_local(name):
+            dst._set_local(name, value)
+            continue
+
+        current = dict.__getitem__(dst, name)
+        if current is value:
+            continue
+
+        if (isinstance(current, LazyContainer) or isinstance(value, LazyContainer)) and \
+                isinstance(current, (BaseScope, Enum, LazyContainer)) and \
+                isinstance(value, (BaseScope, Enum, LazyContainer)):
+            # A namespace (f.e. in a snapshot) that has to be merged instead of replaced, other lazy values are
+            # replaced without being computed
+            current = dst._get_local(name)
+            value = src._get_local(name)
+
+        full_name = f'{prefix}{name}'
+        if isinstance(current, BaseScope) and isinstance(value, BaseScope):
+            if isinstance(value, Record) and not (isinstance(current, Record) and current.name == value.name and
+                                                  current.fields == value.fields):
+                if isinstance(current, Record):
+                    conflicts.append(Conflict(full_name, current, value))
+                # Keep the new definition, but merge the existing members into it
+                merged = Record(value.name, value.fields)
+                _merge(merged, current, '', [])
+                _merge(merged, value, f'{full_name}{Scope.SEP}', conflicts)
+                dst._set_local(name, merged)
+            else:
+                _merge(current, value, f'{full_name}{Scope.SEP}', conflicts)
+        elif isinstance(current, Enum) and isinstance(value, Enum):
+            _merge_enum(current, value, f'{full_name}{Scope.SEP}', conflicts)
+        else:
+            # Lazy values are not computed, so they can't be compared
+            if not isinstance(current, Lazy) and not isinstance(value, Lazy) and \
+                    (isinstance(current, (BaseScope, Enum)) or isinstance(value, (BaseScope, Enum)) or
+                     _differ(current, value)):
+                conflicts.append(Conflict(full_name, current, value))
+            dst._set_local(name, value)
+
+
+def merge(dst: Scope, src: Scope) -> List[Conflict]:
+    '''
+    Merge ``src`` into ``dst`` in place, in a single walk over ``src``.
+
+    Nested scopes, records and enums are merged recursively instead of being replaced. Names that have different
+    values in both scopes are reported and get the value from ``src``. Items of ``src`` are moved into ``dst``
+    without being copied. Lazy values are only computed when both scopes have the name and the other value
+    may be a namespace, a record or an enum.
+
+    @param dst  The scope to merge into.
+    @param src  The scope to merge.
+
+    @returns A list of the conflicting names.
+    '''
+    conflicts: List[Conflict] = []
+    _merge(dst, src, '', conflicts)
+    return conflicts
+
+
+class Change(NamedTuple):
+    '''
+    A name that differs between two scopes.
+
+    Members:
+        - kind -- ADDED, REMOVED or CHANGED.
+        - name -- The fully qualified name.
+        - old -- The value in the old scope (``None`` for added names).
+        - new -- The value in the new scope (``None`` for removed names).
+    '''
+    kind: Text
+    name: Text
+    old: Any
+    new: Any
+
+    ADDED = 'added'
+    REMOVED = 'removed'
+    CHANGED = 'changed'
+
+
+def _entries(value: Any, name: Text) -> Iterator[Tuple[Text, Any]]:
+    if isinstance(value, BaseScope):
+        for item, inner in value.items():
+            yield from _entries(inner, f'{name}{Scope.SEP}{item}')
+    else:
+        yield name, value
+
+
+def _added(name: Text, value: Any) -> Iterator[Change]:
+    return (Change(Change.ADDED, entry, None, inner) for entry, inner in _entries(value, name))
+
+
+def _removed(name: Text, value: Any) -> Iterator[Change]:
+    return (Change(Change.REMOVED, entry, inner, None) for entry, inner in _entries(value, name))
+
+
+def _diff(old: Scope, new: Scope, prefix: Text, changes: List[Change]):
+    # pylint: disable=protected-access
+    for name in new:
+        full_name = f'{prefix}{name}'
+        new_value = new._get_local(name)
+        if not old._has_local(name):
+            changes.extend(_added(full_name, new_value))
+            continue
+
+        old_value = old._get_local(name)
+        if old_value is new_value or digests.of(old_value) == digests.of(new_value):
+            continue
+
+        if isinstance(old_value, BaseScope) and isinstance(new_value, BaseScope):
+            if old_value._signature() != new_value._signature():
+                changes.append(Change(Change.CHANGED, full_name, old_value, new_value))
+            _diff(old_value, new_value, f'{full_name}{Scope.SEP}', changes)
+        elif isinstance(old_value, BaseScope) or isinstance(new_value, BaseScope):
+            changes.extend(_removed(full_name, old_value))
+            changes.extend(_added(full_name, new_value))
+        else:
+            changes.append(Change(Change.CHANGED, full_name, old_value, new_value))
+
+    for name in old:
+        if not new._has_local(name):
+            changes.extend(_removed(f'{prefix}{name}', old._get_local(name)))
+
+
+def diff(old: Scope, new: Scope) -> List[Change]:
+    '''
+    Find the names that were added, removed or changed between two scopes.
+
+    Nested scopes (and records) are compared by their digests (see ``Scope.digest``), so only the scopes that
+    changed are walked, and their differences are reported by the fully qualified names of the values in them.
+    Records whose name or fields changed are reported as well. The order of the names isn't compared.
+
+    @param old  The old scope.
+    @param new  The new scope.
+
+    @returns A list of the differences, in the order of ``new`` followed by the removed names.
+    '''
+    changes: List[Change] = []
+    if old is not new and old.digest() != new.digest():
+        _diff(old, new, '', changes)
+    return changes
 
 
 def normalize(name: Text) -> Text:
@@ -4,8 +4,11 @@ and constructor parameters.
 '''
 
 
+import array
+import base64
 import re
 import sys
+import unicodedata
 
 from typing import Any, AnyStr, Dict, List, Optional, Text, Tuple
 
@@ -19,6 +22,24 @@ TEMPLATE_END = '>'
 OPERATOR_KW = 'operator'
 OPERATOR_PROBLEMATIC_CHARS = f'{TEMPLATE_START}={TEMPLATE_END}'
 
+DENSE_MARKER = '@'
+
+
+def _typecode(typecodes: Text, size: int) -> Text:
+    '''
+    The first of ``typecodes`` whose items are ``size`` bytes on this platform.
+    '''
+    return next(typecode for typecode in typecodes if array.array(typecode).itemsize == size)
+
+
+# Maps the plugin's dense array element types to array.array typecodes (the sizes of the C types vary).
+DENSE_ARRAY_TYPECODES = {
+    **{f'i{size * 8}': _typecode('bhiql', size) for size in (1, 2, 4, 8)},
+    **{f'u{size * 8}': _typecode('BHIQL', size) for size in (1, 2, 4, 8)},
+    'f32': 'f',
+    'f64': 'd',
+}
+
 ALL_BRACKETS = {PARENS_START: PARENS_END, '[': ']', '{': '}', TEMPLATE_START: TEMPLATE_END}
 assert all(len(start) == len(end) == 1 for start, end in ALL_BRACKETS.items())
 
@@ -102,22 +123,49 @@ def _func_split(call_string: Text) -> Tuple[Text, Text]:
     return call_string[:params_start], call_string[params_start + 1:-1]
 
 
+_TEMPLATE_BRACKETS_RE = re.compile(f'[{re.escape(TEMPLATE_START)}{re.escape(TEMPLATE_END)}]')
+
+
 def remove_template(name):
     '''
     Remove the template parameters from a name.
     '''
-    res = ''
+    if TEMPLATE_START not in name and TEMPLATE_END not in name:
+        return name
+
+    res = []
     in_template = 0
-    for char in name:
-        if char == TEMPLATE_START and not res.rstrip(OPERATOR_PROBLEMATIC_CHARS).endswith(OPERATOR_KW):  # <*
+    # The ends of res, and of res without its trailing OPERATOR_PROBLEMATIC_CHARS, which are enough to detect
+    # `operator<` (and such) without stripping all of res for every bracket
+    tail = stripped_tail = ''
+
+    def append(piece: Text):
+        nonlocal tail, stripped_tail
+        res.append(piece)
+        if stripped_piece := piece.rstrip(OPERATOR_PROBLEMATIC_CHARS):
+            stripped_tail = (tail + stripped_piece)[-len(OPERATOR_KW):]
+        tail = (tail + piece)[-len(OPERATOR_KW):]
+
+    start = 0
+    for bracket in _TEMPLATE_BRACKETS_RE.finditer(name):
+        if in_template == 0:
+            append(name[start:bracket.start()])
+        start = bracket.end()
+
+        char = bracket.group()
+        if stripped_tail == OPERATOR_KW:  # operator<, operator<=>, operator>>, ...
+            if in_template == 0:
+                append(char)
+        elif char == TEMPLATE_START:  # <*
             in_template += 1
-        elif char == TEMPLATE_END and not res.rstrip(OPERATOR_PROBLEMATIC_CHARS).endswith(OPERATOR_KW):  # <=>, >*
+        else:  # >*
             if in_template == 0:
                 raise ValueError(f"unexpected {char!r}")
             in_template -= 1
-        elif in_template == 0:
-            res += char
-    return res
+
+    if in_template == 0:
+        append(name[start:])
+    return ''.join(res)
 
 
 def wchar_t(value: int) -> Text:
@@ -179,12 +227,126 @@ def _fix_encoding(text: Text) -> Text:
     clang gives a bad utf-8 encoded strings sometimes, attempt to fix them by decoding
     the string manually.
     '''
-    if all(ord(c) <= 0xff for c in text):
-        try:
-            return b''.join(ord(c).to_bytes(1, sys.byteorder) for c in text).decode('utf-8')
-        except ValueError:
-            pass
-    return text
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except ValueError:
+        return text
+
+
+def _decode_bytes(data: bytes) -> Text:
+    '''
+    Decode a ``char`` string, using utf-8 when possible.
+    '''
+    try:
+        return data.decode('utf-8')
+    except ValueError:
+        return data.decode('latin-1')
+
+
+# The escape sequences of Python string literals (which is how the plugin and clang quote strings)
+_ESCAPE_RE = re.compile(r'\\(?:x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|N\{[^}]*\}|[0-7]{1,3}|.)', re.DOTALL)
+_SIMPLE_ESCAPES = {
+    '\\': '\\', "'": "'", '"': '"', '\n': '',
+    'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v',
+}
+
+
+def _unescape(match: re.Match) -> Text:
+    escape = match.group()[1:]
+    if len(escape) > 1 and escape[0] in 'xuU':
+        return chr(int(escape[1:], 16))
+    if len(escape) > 1 and escape[0] == 'N':
+        return unicodedata.lookup(escape[2:-1])
+    if escape[0] in '01234567':
+        return chr(int(escape, 8))
+    # Unknown escapes are kept as they are, like in Python
+    return _SIMPLE_ESCAPES.get(escape, match.group())
+
+
+def _parse_quoted(quoted: Text) -> Text:
+    '''
+    Parse a quoted char or string (as outputted by the plugin or by clang) like a Python string literal, without
+    using ``eval``.
+
+    Every escape sequence is decoded to a single character (f.e. ``\\xff`` to ``ÿ``) and the other characters are
+    kept, then the result is fixed by _fix_encoding().
+    '''
+    body = quoted[1:-1]
+    if '\\' in body:
+        body = _ESCAPE_RE.sub(_unescape, body)
+    return _fix_encoding(body)
+
+
+# Maps the plugin's dense string character types to their (code unit size, codec).
+DENSE_STRING_CODECS = {
+    'char': (1, None),
+    'char8_t': (1, None),
+    'char16_t': (2, 'utf-16-le'),
+    'char32_t': (4, 'utf-32-le'),
+    'wchar_t': (4, 'utf-32-le'),
+}
+_CODE_UNIT_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
+
+def dense_string(char_type: Text, data: Text, /, types: Optional['TypeCache'] = None, kind: Text = '') -> Any:
+    '''
+    Decode a dense string (``@<char_type><kind>:<base64 little-endian code units>``) outputted by the
+    ConstantsDumper plugin.
+
+    ``kind`` is ``'[]'`` for arrays and ``'*'`` for pointers (empty for ``char`` strings).
+    Arrays use the character types (``wchar_t``, ``wchar_t[]``, ...) that ``types`` resolves if they are overridden
+    (differ from DEFAULT_TYPES).
+    '''
+    unit_size, codec = DENSE_STRING_CODECS[char_type]
+    raw = base64.b64decode(data, validate=True)
+
+    if kind == '[]' and types is not None:
+        str_type = types.constructor(f'{char_type}[]')
+        char_type_func = types.constructor(char_type)
+        if str_type is not DEFAULT_TYPES.get(f'{char_type}[]', unknown_type) or \
+                char_type_func is not DEFAULT_TYPES.get(char_type, unknown_type):
+            units = array.array(_CODE_UNIT_TYPECODES[unit_size])
+            units.frombytes(raw)
+            if sys.byteorder != 'little':
+                units.byteswap()
+            return str_type(*(char_type_func(unit) for unit in units))
+
+    if codec is None:
+        return _decode_bytes(raw)
+    try:
+        return raw.decode(codec, 'surrogatepass')
+    except ValueError:
+        return raw
+
+
+def dense_array(element_type: Text, data: Text) -> array.array:
+    '''
+    Decode a dense array (``@<element_type>:<base64 little-endian data>``) outputted by the ConstantsDumper plugin.
+
+    @returns an ``array.array`` of the elements.
+    '''
+    values = array.array(DENSE_ARRAY_TYPECODES[element_type])
+    values.frombytes(base64.b64decode(data, validate=True))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def numpy_view(values: array.array):
+    '''
+    Get a NumPy array that shares memory with a dense array (see dense_array()).
+
+    Requires NumPy to be installed.
+
+    @param values   The array to view.
+
+    @returns a read-only ``numpy.ndarray``.
+    '''
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    view = numpy.frombuffer(values, dtype=values.typecode)
+    view.flags.writeable = False
+    return view
 
 
 def unknown_type(*fields):
@@ -212,16 +374,72 @@ DEFAULT_TYPES = {
 DEFAULT_TYPES['wchar_t[]'].__name__ = DEFAULT_TYPES['wchar_t[]'].__qualname__ = 'wchar_t[]'
 
 
-def parse_value(raw_value: Text, /, scope: Optional[AnyScope] = None) -> Any:  # pylint: disable=too-many-return-statements
+class TypeCache:
+    '''
+    Caches the constructors that type names resolve to in a scope, so values of the same type (f.e. the elements
+    of an array of records) resolve the name once.
+
+    The cache belongs to the scopes it was created for: it is only cleared by invalidate(), which the parse that
+    created it calls whenever it binds a record or an enum. Call invalidate() after binding other types in ``scope``
+    or ``fallback``.
+
+    Names that aren't in ``scope`` are looked up in ``fallback`` (f.e. the scope that ``scope`` is merged into).
+    '''
+
+    def __init__(self, scope: AnyScope, fallback: Optional[AnyScope] = None):
+        self.scope = scope
+        self.fallback = fallback
+        self._constructors: Dict[Text, Any] = {}
+
+    def invalidate(self):
+        '''
+        Forget the resolved type names, after a name that may be used as a type was bound in the scopes.
+        '''
+        self._constructors.clear()
+
+    def get(self, name: Text, default=None, /):
+        '''
+        Get a name from the scope, or from the fallback scope.
+        '''
+        value = self.scope.get(name)
+        if value is None and self.fallback is not None:
+            value = self.fallback.get(name)
+        return default if value is None else value
+
+    def _lookup(self, typename: Text, /, default=None):
+        return self.get(typename, DEFAULT_TYPES.get(typename, default))
+
+    def constructor(self, typename: Text) -> Any:
+        '''
+        Get the constructor of ``typename`` from the scope or from DEFAULT_TYPES. If the name is not found, it is
+        looked up without the template parameters and defaults to unknown_type.
+        '''
+        if (type_func := self._constructors.get(typename)) is None:
+            type_func = self._lookup(typename)
+
+            # Couldn't find type, try without templates and default to a simple tuple
+            if type_func is None:
+                type_func = self._lookup(remove_template(typename), default=unknown_type)
+
+            self._constructors[typename] = type_func
+        return type_func
+
+
+def parse_value(raw_value: Text, /, scope: Optional[AnyScope] = None,  # pylint: disable=too-many-return-statements
+                types: Optional[TypeCache] = None) -> Any:
     '''
     Parse a single value, recursively.
 
     ``scope`` can be provided to add additional types or override the default char types.
     Note that all string types are only called for array-like strings. For example, ``wchar_t[]``
     will be called for `const wchar_t[] my_string = L"hello"` but not for `const wchar_t* my_string = L"hello"`.
+
+    ``types`` can be provided to share the resolved type names between values, it must cache ``scope``'s types.
     '''
     if scope is None:
         scope = {}
+    if types is None:
+        types = TypeCache(scope)
 
     last_match: Optional[re.Match]
 
@@ -230,6 +448,19 @@ def parse_value(raw_value: Text, /, scope: Optional[AnyScope] = None) -> Any:  #
         last_match = re.match(pattern, raw_value, flags=flags)
         return last_match
 
+    # Dense arrays of fixed-width integers and floats, and dense strings
+    if raw_value.startswith(DENSE_MARKER) and \
+            match(r'^@(?P<type>\w+)(?P<kind>\[\]|\*)?:(?P<data>[A-Za-z0-9+/]*={0,2})$'):
+        dense_type, kind, data = last_match.group('type', 'kind', 'data')
+        try:
+            if dense_type in DENSE_STRING_CODECS:
+                # The character types are looked up like the other types
+                return dense_string(dense_type, data, types, kind or '')
+            if dense_type in DENSE_ARRAY_TYPECODES and not kind:
+                return dense_array(dense_type, data)
+        except ValueError:
+            pass
+
     # Any integer
     if match(r'^-?\d+$'):
         return int(last_match.group())
@@ -240,8 +471,7 @@ def parse_value(raw_value: Text, /, scope: Optional[AnyScope] = None) -> Any:  #
 
     # char or string
     if match(r'''^(?P<quote>'|").*(?P=quote)$'''):
-        # Reevaluate escaped characters
-        return _fix_encoding(eval(last_match.group()))  # pylint: disable=eval-used
+        return _parse_quoted(last_match.group())
 
     # bool
     if match(r'^(true|false)$', flags=re.I):
@@ -250,21 +480,13 @@ def parse_value(raw_value: Text, /, scope: Optional[AnyScope] = None) -> Any:  #
     # Arrays
     if match(r'^\((?P<elements>.*)\)$'):
         if has_valid_brackets(elements := last_match.group('elements')):
-            return [parse_value(element, scope) for element in contextual_split(elements)]
+            return [parse_value(element, scope, types) for element in contextual_split(elements)]
 
     # Named types
     if match(r'^(?P<type>.+?)\((?P<params>.*)\)$'):
         typename, params = _func_split(last_match.group())
-        params = [parse_value(param, scope) for param in contextual_split(params)]
-
-        def get_type(typename: Text, /, default=None):
-            return scope.get(typename, DEFAULT_TYPES.get(typename, default))
-
-        type_func = get_type(typename)
-
-        # Couldn't find type, try without templates and default to a simple tuple
-        if type_func is None:
-            type_func = get_type(remove_template(typename), default=unknown_type)
+        params = [parse_value(param, scope, types) for param in contextual_split(params)]
+        type_func = types.constructor(typename)
 
         try:
             return type_func(*params)
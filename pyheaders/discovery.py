@@ -0,0 +1,121 @@
+'''
+Discovery of the source files to load.
+'''
+import fnmatch
+import glob
+import os
+import re
+
+from typing import AnyStr, Callable, Iterable, Iterator, List, Optional, Text
+
+from .compiler import CPP_SOURCE_FILES_EXTENSIONS
+
+
+def _compile_patterns(patterns: Iterable[Text]) -> Optional[re.Pattern]:
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    # Excludes match the end of the path (and anything before it), f.e. 'build/*' matches 'src/build/a.cpp'
+    return re.compile('|'.join(fnmatch.translate(f'**{pattern}') for pattern in patterns))
+
+
+def exclude_matcher(excludes: Iterable[Text] = None) -> Callable[[AnyStr], bool]:
+    '''
+    Create a function that checks whether a path matches any of the exclude patterns.
+
+    All patterns are compiled into a single regular expression.
+    '''
+    matcher = _compile_patterns(excludes or ())
+    if matcher is None:
+        return lambda path: False
+    return lambda path: matcher.match(os.fsdecode(path)) is not None
+
+
+def _prune_matcher(excludes: Iterable[Text] = None) -> Callable[[AnyStr], bool]:
+    # A pattern that ends with '*' matches every path that starts with a path it matches, so if it matches
+    # 'dir/' it matches every file under 'dir' and the directory can be skipped entirely.
+    matcher = _compile_patterns(pattern for pattern in excludes or () if pattern.endswith('*'))
+    if matcher is None:
+        return lambda path: False
+    return lambda path: matcher.match(os.path.join(os.fsdecode(path), '')) is not None
+
+
+def _walk(directory: AnyStr, extensions: Iterable[Text], is_pruned: Callable[[AnyStr], bool]) -> Iterator[AnyStr]:
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError:
+            # Like os.walk, unreadable directories are skipped
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Like os.walk, symbolic links to directories are not followed
+                if not entry.is_symlink() and not is_pruned(entry.path):
+                    subdirs.append(entry.path)
+            elif os.fsdecode(os.path.splitext(entry.name)[-1]) in extensions:
+                yield entry.path
+        pending.extend(reversed(subdirs))
+
+
+def iter_source_files(paths: Iterable[AnyStr], excludes: Iterable[Text] = None,
+                      extensions: Iterable[Text] = CPP_SOURCE_FILES_EXTENSIONS) -> Iterator[AnyStr]:
+    '''
+    Find the source files in ``paths``. Files are yielded as soon as they are found, each file is yielded once.
+
+    @param paths        Files, directories (searched recursively for files with one of the ``extensions``)
+                        and glob paths.
+    @param excludes     Glob patterns of paths to skip, a pattern matches the end of a path. Directories
+                        that are excluded by a pattern that ends with '*' (f.e. 'build/*') are not searched.
+    @param extensions   The extensions of the files to load from directories.
+
+    @returns An iterator over the paths of the files.
+    '''
+    extensions = frozenset(os.fsdecode(extension) for extension in extensions)
+    is_excluded = exclude_matcher(excludes)
+    is_pruned = _prune_matcher(excludes)
+
+    def candidates():
+        for path in paths:
+            if os.path.isfile(path):
+                yield path
+            elif os.path.isdir(path):
+                if not is_pruned(path):
+                    yield from _walk(path, extensions, is_pruned)
+            else:
+                yield from (path for path in glob.iglob(path, recursive=True) if os.path.isfile(path))
+
+    seen = set()
+    for path in candidates():
+        if path not in seen and not is_excluded(path):
+            seen.add(path)
+            yield path
+
+
+def shard(filenames: Iterable[AnyStr], index: int, count: int) -> List[AnyStr]:
+    '''
+    Get the files of one shard out of ``count`` shards.
+
+    The files are split into ``count`` contiguous blocks of (almost) equal sizes, in their order. Discovery order
+    is deterministic, so every shard gets the same partition, and the files of shard ``i`` come before the files of
+    shard ``i + 1``: merging the shards' results in the order of their indices gives the same values as loading
+    all files at once (values of later files override values of earlier files in both cases).
+
+    @param filenames    All the files, in loading order.
+    @param index        The 0-based index of the shard.
+    @param count        The number of shards.
+
+    @returns The files of the shard, in their original order.
+    '''
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"invalid shard {index}/{count}")
+    filenames = list(filenames)
+    return filenames[index * len(filenames) // count:(index + 1) * len(filenames) // count]
@@ -0,0 +1,244 @@
+'''
+A cache of the plugins' output per file, shared between translation units and projects.
+
+The plugins tag their output with the files that the declarations come from, so the output of a TU is split
+into fragments, one per file. A fragment is cached by the file's content, the values of the macros that the file
+uses and the flags that change the language, and not by the file's path or the TU it was included from, so
+unchanged headers (f.e. SDK headers) are skipped by the plugins (and by the parser) in every TU that includes them.
+
+A file's output is assumed to depend only on the things it is cached by. A constant that is computed from a
+constant of another file (or a macro that is redefined after the file is included) may be stale when the other
+file changes.
+'''
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+
+from contextlib import contextmanager
+from functools import partial
+from typing import AnyStr, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Text, Tuple
+
+from .cache import DiskCache, make_key
+from .compiler import Clang, language_flags
+from .schedule import include_closures
+
+SECTION_MARKER = '#section '
+FILE_MARKER = '#file '
+TAG_FILES_ARG = 'tag-files'
+SKIP_FILES_ARG = 'skip-files='
+
+_IDENTIFIER_RE = re.compile(rb'[A-Za-z_]\w*')
+
+Fragment = Dict[Text, Text]
+
+
+def split(output: Text) -> Tuple[List[Text], Dict[Text, Fragment]]:
+    '''
+    Split tagged plugin output into fragments.
+
+    @param output   The output of the plugins with the ``tag-files`` arg.
+
+    @returns (sections, fragments)  The names of the sections (the plugins), in the order of the output, and the
+                                    fragment of every file (the output of the file in every section). Output that
+                                    doesn't come from a file is in the fragment of ''.
+    '''
+    sections: List[Text] = []
+    fragments: Dict[Text, Dict[Text, List[Text]]] = {}
+    section = ''
+    lines = None
+    for line in output.splitlines(keepends=True):
+        if line.startswith(SECTION_MARKER):
+            section = line[len(SECTION_MARKER):].rstrip('\n')
+            sections.append(section)
+            lines = None
+        elif line.startswith(FILE_MARKER):
+            lines = fragments.setdefault(line[len(FILE_MARKER):].rstrip('\n'), {}).setdefault(section, [])
+        else:
+            if lines is None:
+                lines = fragments.setdefault('', {}).setdefault(section, [])
+            lines.append(line)
+
+    return sections, {filename: {name: ''.join(text) for name, text in fragment.items()}
+                      for filename, fragment in fragments.items()}
+
+
+def _language_flags(clang: Clang, filename: AnyStr, extra_args: Iterable[Text], ignore_cmds: bool) -> List[Text]:
+    # Flags that change the language change the output of files that didn't change (and the predefined macros,
+    # which are omitted from the macros unless requested). Other flags only matter through the macros that they
+    # define and the files that they include, which are part of the cache keys.
+    _, cmd = clang._command(filename, extra_args, ignore_cmds=ignore_cmds)  # pylint: disable=protected-access
+    return language_flags(cmd)
+
+
+class FragmentCache:
+    '''
+    The fragments of the files, cached in ``cache`` (defaults to the "fragments" cache in the default cache
+    directory).
+
+    Use a FragmentCache object for a single scope: fragments that were already parsed into the scope (see
+    mark_parsed()) are not parsed again.
+    '''
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = DiskCache('fragments') if cache is None else cache
+        self._files: Dict[Tuple[Text, int, int], Tuple[Text, FrozenSet[Text]]] = {}
+        self._parsed = set()
+
+    def _scan(self, filename: Text) -> Optional[Tuple[Text, FrozenSet[Text]]]:
+        '''
+        Get the content hash and the identifiers of a file.
+        '''
+        try:
+            stat = os.stat(filename)
+            stamp = (filename, stat.st_mtime_ns, stat.st_size)
+            if (scanned := self._files.get(stamp)) is None:
+                with open(filename, 'rb') as source_file:
+                    content = source_file.read()
+                scanned = (hashlib.blake2b(content, digest_size=20).hexdigest(),
+                           frozenset(identifier.decode() for identifier in set(_IDENTIFIER_RE.findall(content))))
+                self._files[stamp] = scanned
+            return scanned
+        except OSError:
+            return None
+
+    def keys(self, filenames: Iterable[Text], macros: Mapping[Text, Text], flags: List[Text]) -> Dict[Text, Text]:
+        '''
+        Get the cache keys of the fragments of ``filenames``. Unreadable files are omitted.
+
+        @param filenames    The real paths of the files.
+        @param macros       The macros of the TU.
+        @param flags        The flags that change the language, see _language_flags().
+        '''
+        keys = {}
+        for filename in filenames:
+            if (scanned := self._scan(filename)) is not None:
+                digest, identifiers = scanned
+                used_macros = sorted((name, macros[name]) for name in identifiers & macros.keys())
+                keys[filename] = make_key(digest, used_macros, flags)
+        return keys
+
+    def lookup(self, keys: Mapping[Text, Text]) -> Dict[Text, Fragment]:
+        '''
+        Get the cached fragments out of ``keys``.
+        '''
+        fragments = {}
+        for filename, key in keys.items():
+            entry = self.cache.get(key)
+            if isinstance(entry, dict) and isinstance(entry.get('sections'), dict):
+                fragments[filename] = entry['sections']
+        return fragments
+
+    def assemble(self, filenames: List[Text], keys: Mapping[Text, Text], cached: Mapping[Text, Fragment],
+                 output: Text) -> Tuple[Text, List[Text]]:
+        '''
+        Cache the new fragments in ``output`` and assemble the output of the TU out of the new and cached fragments.
+
+        @param filenames    The files of the TU, in the order their fragments should be assembled in.
+        @param keys         The keys of the fragments, see keys().
+        @param cached       The fragments that were skipped by the plugins, see lookup().
+        @param output       The output of the plugins.
+
+        @returns (output, keys) The output to parse, without fragments that were already parsed, and the keys of
+                                the fragments in it (to pass to mark_parsed() once it is parsed).
+        '''
+        sections, produced = split(output)
+        if not sections:
+            # The plugins don't support tagging, so they didn't skip anything either
+            return output, []
+
+        fragments = dict(cached)
+        for filename, key in keys.items():
+            if filename not in fragments:
+                fragments[filename] = produced.pop(filename, {})
+                self.cache.set(key, {'sections': fragments[filename]})
+
+        used = [filename for filename in filenames if filename in keys and keys[filename] not in self._parsed]
+        # Output that doesn't come from a known file (f.e. built-in declarations) is always used
+        texts = []
+        for section in sections:
+            texts.extend(fragments[filename].get(section, '') for filename in used)
+            texts.extend(fragment.get(section, '') for fragment in produced.values())
+        return ''.join(texts), [keys[filename] for filename in used]
+
+    def mark_parsed(self, keys: Iterable[Text]):
+        '''
+        Mark fragments as parsed into the scope, so they are not parsed again.
+        '''
+        self._parsed.update(keys)
+
+
+_Prepared = Tuple[List[Text], Dict[Text, Text], Dict[Text, Fragment]]
+
+
+def _prepare(clang: Clang, filename: AnyStr, extra_args: Iterable[Text], macros: Mapping[Text, Text],
+             fragments: FragmentCache, **kwargs) -> Optional[_Prepared]:
+    closure = include_closures(clang, [filename], extra_args, **kwargs).get(filename)
+    if closure is None:
+        return None
+
+    own_file = os.path.realpath(filename)
+    # Headers first (sorted, for a deterministic order), like in the TU
+    filenames = sorted({os.path.realpath(path) for path in closure} - {own_file}) + [own_file]
+    keys = fragments.keys(filenames, macros, _language_flags(clang, filename, extra_args,
+                                                             kwargs.get('ignore_cmds', False)))
+    return filenames, keys, fragments.lookup(keys)
+
+
+@contextmanager
+def _plugin_args(clang: Clang, skipped: Iterable[Text]) -> Iterator[Dict[Text, List[Text]]]:
+    args = [TAG_FILES_ARG]
+    fd, skip_list = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as skip_list_file:
+            skip_list_file.writelines(f'{filename}\n' for filename in skipped)
+        args.append(f'{SKIP_FILES_ARG}{skip_list}')
+        yield {plugin: args for plugin in clang.plugins}
+    finally:
+        os.unlink(skip_list)
+
+
+def run_plugins(clang: Clang, filename: AnyStr, extra_args: Iterable[Text], macros: Mapping[Text, Text],
+                fragments: FragmentCache, **kwargs) -> Tuple[Text, List[Text]]:
+    '''
+    Run clang with the registered plugins on ``filename``, using the cached fragments of unchanged files.
+
+    @param clang        The compiler to use.
+    @param filename     The name of the file.
+    @param extra_args   Additional args to append to the compile commands' flags.
+    @param macros       The macros of the TU (see Clang.get_macros()).
+    @param fragments    The fragments cache.
+    @param kwargs       Additional args for Clang.run_plugins().
+
+    @returns (output, keys) The output to parse and the keys of the fragments in it, see FragmentCache.assemble().
+    '''
+    prepared = _prepare(clang, filename, extra_args, macros, fragments, **kwargs)
+    if prepared is None:
+        return clang.run_plugins(filename, extra_args, check=True, **kwargs).stdout, []
+
+    filenames, keys, cached = prepared
+    with _plugin_args(clang, cached) as plugin_args:
+        output = clang.run_plugins(filename, extra_args, check=True, plugin_args=plugin_args, **kwargs).stdout
+    return fragments.assemble(filenames, keys, cached, output)
+
+
+async def run_plugins_async(clang: Clang, filename: AnyStr, extra_args: Iterable[Text], macros: Mapping[Text, Text],
+                            fragments: FragmentCache, **kwargs) -> Tuple[Text, List[Text]]:
+    '''
+    Like run_plugins(), but clang runs without blocking the event loop.
+    '''
+    prepared = await asyncio.get_running_loop().run_in_executor(
+        None, partial(_prepare, clang, filename, extra_args, macros, fragments, **_sync_kwargs(kwargs)))
+    if prepared is None:
+        return (await clang.run_plugins_async(filename, extra_args, check=True, **kwargs)).stdout, []
+
+    filenames, keys, cached = prepared
+    with _plugin_args(clang, cached) as plugin_args:
+        output = (await clang.run_plugins_async(filename, extra_args, check=True, plugin_args=plugin_args,
+                                                **kwargs)).stdout
+    return fragments.assemble(filenames, keys, cached, output)
+
+
+def _sync_kwargs(kwargs: Mapping) -> Dict:
+    return {name: value for name, value in kwargs.items() if name != 'limiter'}
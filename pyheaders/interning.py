@@ -0,0 +1,98 @@
+'''
+Deduplication of names and immutable values.
+'''
+import struct
+import sys
+
+from typing import Any, Dict, Hashable, Mapping, Optional, Text, Tuple
+
+from .cpp import BaseScope, Enum, Scope
+from .cpp.scope import Lazy
+
+# Values of these types are deduplicated by content.
+_IMMUTABLE_SCALARS = (str, bytes, int, float, complex)
+
+_DOUBLE = struct.Struct('<d')
+
+
+def _scalar_key(value: Any) -> Hashable:
+    # bool is an int, the type is part of the key to keep `True` and `1` apart.
+    # Floats are compared by their bits to keep `0.0` and `-0.0` apart.
+    if isinstance(value, float):
+        return (type(value), _DOUBLE.pack(value))
+    if isinstance(value, complex):
+        return (type(value), _DOUBLE.pack(value.real) + _DOUBLE.pack(value.imag))
+    return (type(value), value)
+
+
+def _rebuild(value: tuple, items: tuple) -> tuple:
+    if all(new is old for new, old in zip(items, value)):
+        return value
+    if hasattr(type(value), '_make'):
+        return type(value)._make(items)
+    return type(value)(items)
+
+
+class Interner:
+    '''
+    Deduplicates immutable values by content.
+
+    Equal values of the same type are replaced with a single instance. Tuples (including record values) are
+    deduplicated if all their items are immutable. Mutable values (lists, arrays) are left as they are.
+    '''
+
+    def __init__(self):
+        self._values: Dict[Tuple[type, Hashable], Any] = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern(self, value: Any) -> Any:
+        '''
+        Get the canonical instance of ``value``.
+        '''
+        return self._intern(value)[0]
+
+    def _intern(self, value: Any) -> Tuple[Any, Optional[Hashable]]:
+        '''
+        Get the canonical instance of ``value`` and its key, the key is None if ``value`` is mutable.
+        '''
+        if isinstance(value, _IMMUTABLE_SCALARS):
+            key = _scalar_key(value)
+            return self._values.setdefault(key, value), key
+        if isinstance(value, tuple):
+            items, keys = zip(*map(self._intern, value)) if value else ((), ())
+            if None in keys:
+                # Contains mutable values
+                return value, None
+            key = (type(value), keys)
+            canonical = self._values.get(key)
+            if canonical is None:
+                canonical = self._values[key] = _rebuild(value, items)
+            return canonical, key
+        return value, None
+
+    def intern_mapping(self, mapping: Mapping[Text, Text]) -> Dict[Text, Text]:
+        '''
+        Get a copy of a string mapping (such as macros) with interned keys and values.
+        '''
+        return {sys.intern(key): self.intern(value) for key, value in mapping.items()}
+
+    def intern_scope(self, scope: Scope):
+        '''
+        Deduplicate all values in a scope tree, in place. Lazy values are not computed.
+        '''
+        for name in list(scope):
+            value = dict.__getitem__(scope, name)
+            if isinstance(value, BaseScope):
+                self.intern_scope(value)
+                continue
+            if isinstance(value, Lazy):
+                continue
+            if isinstance(value, Enum):
+                for item_name in list(value.keys()):
+                    Enum.__setitem__(value, item_name, self.intern(dict.__getitem__(value, item_name)))
+                continue
+            interned = self.intern(value)
+            if interned is not value:
+                scope._set_local(name, interned)  # pylint: disable=protected-access
@@ -0,0 +1,203 @@
+'''
+Approximate accounting of the memory that loaded data retains.
+'''
+import array
+import heapq
+import sys
+
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Dict, List, Mapping, Set, Text, Tuple
+
+from .cpp import BaseScope, Enum, Record, Scope
+from .cpp.lazy import Lazy
+
+# The kinds of values, in the order they are reported in.
+KINDS = ('namespaces', 'records', 'enums', 'arrays', 'strings', 'lists', 'numbers', 'lazy', 'other', 'macros')
+
+GLOBAL_NAMESPACE = '(global)'
+
+
+def _kind(value: Any) -> Text:  # pylint: disable=too-many-return-statements
+    if isinstance(value, Record):
+        return 'records'
+    if isinstance(value, BaseScope):
+        return 'namespaces'
+    if isinstance(value, Enum):
+        return 'enums'
+    if isinstance(value, array.array):
+        return 'arrays'
+    if isinstance(value, (str, bytes)):
+        return 'strings'
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        # Record values
+        return 'records'
+    if isinstance(value, (list, tuple)):
+        return 'lists'
+    if value is None or isinstance(value, (bool, int, float, complex)):
+        return 'numbers'
+    if isinstance(value, Lazy):
+        return 'lazy'
+    return 'other'
+
+
+def _size(value: Any, seen: Set[int]) -> int:
+    '''
+    The size of a value and the objects in it, objects that were already counted (by id) count as 0.
+    '''
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_size(item, seen) for item in value)
+    elif isinstance(value, dict):
+        size += _size(getattr(value, 'name', None), seen)
+        size += sum(_size(name, seen) + _size(item, seen) for name, item in dict.items(value))
+    elif isinstance(value, Lazy):
+        # The unparsed text is kept by the factory, other arguments (f.e. the scope) are not the value's
+        size += sys.getsizeof(value.factory)
+        if isinstance(value.factory, partial):
+            size += sum(_size(arg, seen) for arg in value.factory.args if isinstance(arg, (str, bytes)))
+    return size
+
+
+@dataclass
+class MemoryReport:
+    '''
+    The approximate memory retained by loaded data, see measure().
+
+    Every object is counted once (in the first place it is found in), so values that are shared (f.e. by
+    SrcData.merge()) are only counted for one name. Lazy values are counted as their unparsed text.
+
+    Members:
+        - total -- The total size in bytes.
+        - kinds -- The size of every kind of value (see KINDS). Nested values (f.e. the items of a list) are
+                   counted in the kind of the top-level value, and namespaces and records count their names.
+        - counts -- The number of values of every kind.
+        - namespaces -- The size of every top-level namespace (values in the global scope are counted in
+                        GLOBAL_NAMESPACE), without the macros.
+        - largest -- The largest values, as (fully qualified name, size) pairs, largest first.
+    '''
+    total: int = 0
+    kinds: Dict[Text, int] = field(default_factory=dict)
+    counts: Dict[Text, int] = field(default_factory=dict)
+    namespaces: Dict[Text, int] = field(default_factory=dict)
+    largest: List[Tuple[Text, int]] = field(default_factory=list)
+
+    def summary(self, namespaces: int = 10) -> Text:
+        '''
+        Format the report as a human readable table.
+
+        @param namespaces   The number of largest top-level namespaces to list.
+        '''
+        lines = [f'Retained about {self.total:,} bytes', '']
+
+        lines.append(f'{"kind":<16}{"bytes":>16}{"share":>8}{"count":>12}')
+        for kind, size in sorted(self.kinds.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f'{kind:<16}{size:>16,}{size / self.total if self.total else 0:>8.1%}'
+                         f'{self.counts.get(kind, 0):>12,}')
+
+        if self.namespaces and namespaces:
+            lines.append('')
+            lines.append(f'{"bytes":>16}{"share":>8}  namespace')
+            for name, size in sorted(self.namespaces.items(), key=lambda item: item[1], reverse=True)[:namespaces]:
+                lines.append(f'{size:>16,}{size / self.total if self.total else 0:>8.1%}  {name}')
+
+        if self.largest:
+            lines.append('')
+            lines.append(f'{"bytes":>16}  value')
+            for name, size in self.largest:
+                lines.append(f'{size:>16,}  {name}')
+
+        return '\n'.join(lines)
+
+
+class _Walker:
+    def __init__(self, largest: int):
+        self.report = MemoryReport()
+        self._seen: Set[int] = set()
+        self._largest_count = largest
+        self._largest: List[Tuple[int, Text]] = []
+
+    def _add(self, kind: Text, size: int, count: int = 1):
+        self.report.kinds[kind] = self.report.kinds.get(kind, 0) + size
+        self.report.counts[kind] = self.report.counts.get(kind, 0) + count
+        self.report.total += size
+
+    def _add_value(self, name: Text, value: Any) -> int:
+        size = _size(value, self._seen)
+        self._add(_kind(value), size)
+        if self._largest_count:
+            if len(self._largest) < self._largest_count:
+                heapq.heappush(self._largest, (size, name))
+            else:
+                heapq.heappushpop(self._largest, (size, name))
+        return size
+
+    def scope(self, scope: Scope, prefix: Text, top_level: Dict[Text, int] = None) -> int:
+        '''
+        Account for a scope and everything in it, without computing lazy values.
+
+        @param top_level    If given, the sizes of the items are added to it by their top-level namespace.
+        '''
+        seen = self._seen
+        own_size = 0
+        if id(scope) not in seen:
+            seen.add(id(scope))
+            own_size = sys.getsizeof(scope)
+            if isinstance(scope, Record):
+                own_size += _size(scope.name, seen) + _size(scope.fields, seen)
+
+        items_size = 0
+        for name, value in dict.items(scope):
+            own_size += _size(name, seen)
+            if isinstance(value, BaseScope):
+                value_size = self.scope(value, f'{prefix}{name}{Scope.SEP}')
+            else:
+                value_size = self._add_value(f'{prefix}{name}', value)
+            items_size += value_size
+            if top_level is not None:
+                namespace = name if isinstance(value, BaseScope) else GLOBAL_NAMESPACE
+                top_level[namespace] = top_level.get(namespace, 0) + value_size
+
+        self._add(_kind(scope), own_size)
+        if top_level is not None:
+            top_level[GLOBAL_NAMESPACE] = top_level.get(GLOBAL_NAMESPACE, 0) + own_size
+        return own_size + items_size
+
+    def macros(self, macros: Mapping[Text, Text]):
+        '''
+        Account for the macros.
+        '''
+        self._add('macros', sum(_size(name, self._seen) + _size(value, self._seen) for name, value in macros.items()),
+                  len(macros))
+
+    def finish(self) -> MemoryReport:
+        '''
+        Get the report.
+        '''
+        self.report.kinds = {kind: self.report.kinds[kind] for kind in KINDS if kind in self.report.kinds}
+        self.report.largest = [(name, size) for size, name in sorted(self._largest, reverse=True)]
+        return self.report
+
+
+def measure(scope: Scope, macros: Mapping[Text, Text] = None, largest: int = 10) -> MemoryReport:
+    '''
+    Walk a scope (and macros) once and account for the memory that they retain.
+
+    The sizes are approximate: they are computed using ``sys.getsizeof``, objects that are cached by the
+    interpreter (f.e. small integers) are counted, and lazy values are not computed.
+
+    @param scope    The scope to measure.
+    @param macros   The macros to measure.
+    @param largest  The number of largest values to report.
+
+    @returns MemoryReport
+    '''
+    walker = _Walker(largest)
+    walker.scope(scope, '', walker.report.namespaces)
+    if macros:
+        walker.macros(macros)
+    return walker.finish()
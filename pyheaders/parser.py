@@ -7,6 +7,7 @@ from re import compile as _compile_re
 from typing import Any, List, Optional, Pattern, Text, Tuple
 
 from .cpp.scope import Scope
+from .cpp.types import TypeCache
 
 
 @dataclass(frozen=True)
@@ -18,10 +19,12 @@ class Context:
         - lines -- A list of all lines in the input.
         - current_line -- The index of the current line.
         - global_scope -- The global scope to plat parsed values in.
+        - types -- The resolved type names of the global scope, shared by all the lines of a parse.
     '''
     lines: List[Text]
     current_line: int
     global_scope: Scope
+    types: Optional[TypeCache] = None
 
 
 class ParsingError(Exception):
@@ -57,6 +60,18 @@ class ParserBase(metaclass=ABCMeta):
         @returns Whether the line was successfully parsed.
         '''
 
+    def parse_block(self, context: Context) -> int:  # pylint: disable=unused-argument
+        '''
+        Parses a block of lines that starts at the current line as a single unit.
+
+        Parsers of multi-line constructs override this to avoid parsing the block line by line.
+
+        @param context  The context, the block starts at ``context.current_line``.
+
+        @returns The number of lines that were consumed (0 if there is no block to parse at the current line).
+        '''
+        return 0
+
     def parse_single_line(self, line: Text) -> Tuple[Text, Any]:
         '''
         Parses a single line without context.
@@ -74,13 +89,16 @@ class ParserBase(metaclass=ABCMeta):
 
         return tuple(single_object_scope.items())[0]
 
-    def parse(self, data: Text, initial_scope: Optional[Scope] = None, strict: bool = True) -> Scope:
+    def parse(self, data: Text, initial_scope: Optional[Scope] = None, strict: bool = True,
+              types_scope: Optional[Scope] = None) -> Scope:
         '''
         Parses the entire string into a scope.
 
         @param data             The string to parse.
         @param initial_scope    The initial scope to use, defaults to a new empty scope.
         @param strict           If ``True``, raise an error on invalid lines. Otherwise, ignore invalid lines.
+        @param types_scope      A scope to look up the types that are not in the parsed scope in (f.e. the scope
+                                that the parsed scope is merged into).
 
         @returns The created scope object (or ``initial_scope`` if it was provided).
         '''
@@ -88,10 +106,16 @@ class ParserBase(metaclass=ABCMeta):
             initial_scope = Scope()
 
         lines = data.split('\n')
-        for i, line in enumerate(lines):
-            context = Context(lines=lines, current_line=i, global_scope=initial_scope)
-            if not self.parse_line(line, context) and strict:
-                raise ParsingError(line, context)
+        types = TypeCache(initial_scope, types_scope)
+        i = 0
+        while i < len(lines):
+            context = Context(lines=lines, current_line=i, global_scope=initial_scope, types=types)
+            if consumed := self.parse_block(context):
+                i += consumed
+                continue
+            if not self.parse_line(lines[i], context) and strict:
+                raise ParsingError(lines[i], context)
+            i += 1
 
         return initial_scope
 
@@ -124,3 +148,9 @@ class Parser(ParserBase):
     def parse_line(self, line: Text, context: Context) -> bool:
         # Using list to make the any() not lazy-evaluated, calling all parsers
         return any([parser.parse_line(line, context) for parser in self._parsers])
+
+    def parse_block(self, context: Context) -> int:
+        for parser in self._parsers:
+            if consumed := parser.parse_block(context):
+                return consumed
+        return 0
@@ -4,23 +4,45 @@ Parser for the ConstantsDumper variables.
 
 import re
 
-from typing import Optional, Text
+from functools import partial
+from typing import Any, Optional, Text
 
 from ..parser import Context, ParserBase
-from ..cpp.types import parse_value
+from ..cpp.lazy import Lazy
+from ..cpp.scope import BaseScope, Scope
+from ..cpp.types import TypeCache, parse_value
 
 
 class ConstantsParser(ParserBase):
     '''
     Parses the constants outputted by the ConstantsDumper clang plugin.
+
+    A lazy parser only indexes the values by name, each value is parsed when it is first accessed in the scope.
     '''
     VALUE_MATCHER = re.compile(r'^\s*(?P<name>[^#].*?)\s*:=\s*(?P<value>.+?)\s*,?\s*$')
 
+    def __init__(self, *args, lazy: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy = lazy
+
+    def make_value(self, raw_value: Text, scope: Scope, types: Optional[TypeCache] = None) -> Any:
+        '''
+        Parse a value, or create a placeholder that parses it on first access if the parser is lazy.
+
+        @param raw_value    The value to parse.
+        @param scope        The scope to get the types from.
+        @param types        The resolved type names of ``scope`` (see Context.types).
+        '''
+        # Only scopes compute placeholders, other mappings (see parse_single_line) get the value itself
+        if self.lazy and isinstance(scope, BaseScope):
+            return Lazy(partial(parse_value, raw_value, scope, types))
+        return parse_value(raw_value, scope, types)
+
     def parse_line(self, line: Text, context: Context) -> bool:
         value_match: Optional[re.Match]
         if value_match := ConstantsParser.VALUE_MATCHER.match(line):
             name = value_match.group('name')
-            value = parse_value(value_match.group('value'), context.global_scope)
-            context.global_scope[name] = value
+            context.global_scope[name] = self.make_value(value_match.group('value'), context.global_scope,
+                                                         context.types)
 
         return bool(value_match)
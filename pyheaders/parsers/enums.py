@@ -4,13 +4,14 @@ Parser for the ConstantsDumper enums.
 
 import re
 
-from typing import Any, Dict, Optional, Tuple, Text
+from typing import Any, Dict, List, Optional, Tuple, Text
 
 from .constants import ConstantsParser
 
 from ..cpp import Enum
 from ..cpp import split as split_scope
-from ..parser import Context, ParserBase
+from ..cpp.types import parse_value
+from ..parser import Context, ParserBase, ParsingError
 
 
 class EnumsParser(ParserBase):
@@ -19,6 +20,7 @@ class EnumsParser(ParserBase):
     '''
     ENUM_START_MATCHER = re.compile(r'^\s*enum\s+(?P<name>.+?)\s*{\s*$')
     ENUM_END_MATCHER = re.compile(r'\s*}\s*')
+    _INTEGER_MATCHER = re.compile(r'-?\d+')
     __ANONYMOUS_MATCHER = re.compile(r'\W+anonymous\W+', flags=re.I)
 
     def __init__(self, *args, **kwargs):
@@ -42,21 +44,82 @@ class EnumsParser(ParserBase):
     def __is_anonymous_name(enum_name: Text) -> bool:
         return EnumsParser.__ANONYMOUS_MATCHER.match(enum_name)
 
+    def __start_enum(self, name: Text, context: Context) -> Enum:
+        enum_scope, enum_name = split_scope(name)
+
+        if EnumsParser.__is_anonymous_name(enum_name):
+            anonymous_num = self.__anonymous_in_scope.get(enum_scope, 0)
+            name += f'`{anonymous_num}'
+            self.__anonymous_in_scope[enum_scope] = anonymous_num + 1
+
+        enum = Enum(enum_name)
+        context.global_scope[name] = enum
+        if context.types is not None:
+            context.types.invalidate()
+        return enum
+
+    @staticmethod
+    def __parse_enumerator(line: Text) -> Optional[Tuple[Text, Any]]:
+        # Equivalent to ConstantsParser.VALUE_MATCHER, enumerators are almost always plain integers
+        name, sep, value = line.partition(':=')
+        value = value.strip()
+        if value.endswith(','):
+            value = value[:-1].rstrip()
+        name = name.strip()
+        if not sep or not name or not value or name.startswith('#'):
+            return None
+        return name, int(value) if EnumsParser._INTEGER_MATCHER.fullmatch(value) else parse_value(value)
+
+    def parse_block(self, context: Context) -> int:
+        lines = context.lines
+        start = context.current_line
+        if self.__current_enum is not None or not (enum_match := EnumsParser.ENUM_START_MATCHER.match(lines[start])):
+            return 0
+
+        name = enum_match.group('name')
+        enum = self.__start_enum(name, context)
+
+        # The enum's names are stripped once instead of splitting every enumerator's name
+        enum_prefix = name + '::'
+        enum_scope = split_scope(name)[0]
+        outer_prefix = enum_scope + '::' if enum_scope else ''
+        enumerators: List[Tuple[Text, Any]] = []
+        outer: List[Tuple[Text, Text, Any]] = []
+
+        end = start + 1
+        while end < len(lines) and not EnumsParser.ENUM_END_MATCHER.match(lines[end]):
+            if (enumerator := EnumsParser.__parse_enumerator(lines[end])) is None:
+                raise ParsingError(lines[end], Context(lines=lines, current_line=end, global_scope=context.global_scope))
+            full_name, value = enumerator
+            if full_name.startswith(enum_prefix):
+                enumerators.append((full_name[len(enum_prefix):], value))
+            else:
+                # Unscoped enumerators are constants in the enclosing scope as well
+                item_name = full_name[len(outer_prefix):]
+                if not full_name.startswith(outer_prefix) or ':' in item_name:
+                    item_name = split_scope(full_name)[1]
+                enumerators.append((item_name, value))
+                outer.append((full_name, item_name, value))
+            end += 1
+
+        enum.update(enumerators)
+        if outer:
+            outer_scope = context.global_scope[enum_scope] if enum_scope else context.global_scope
+            for full_name, item_name, value in outer:
+                if full_name == outer_prefix + item_name:
+                    outer_scope[item_name] = value
+                else:
+                    context.global_scope[full_name] = value
+
+        # Include the closing line (unless the output ended inside the enum)
+        return min(end + 1, len(lines)) - start
+
     def parse_line(self, line: Text, context: Context) -> bool:
         if enum_match := EnumsParser.ENUM_START_MATCHER.match(line):
             if self.__current_enum is not None:
                 return False
 
-            name = enum_match.group('name')
-            enum_scope, enum_name = split_scope(name)
-
-            if EnumsParser.__is_anonymous_name(enum_name):
-                anonymous_num = self.__anonymous_in_scope.get(enum_scope, 0)
-                name += f'`{anonymous_num}'
-                self.__anonymous_in_scope[enum_scope] = anonymous_num + 1
-
-            self.__current_enum = Enum(enum_name)
-            context.global_scope[name] = self.__current_enum
+            self.__current_enum = self.__start_enum(enum_match.group('name'), context)
 
             return True
         if self.__current_enum is not None:
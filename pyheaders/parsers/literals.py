@@ -9,19 +9,21 @@ from typing import Dict, Optional, Text
 from .constants import ConstantsParser
 from ..parser import Context, ParserBase
 from ..cpp import split as split_scope
-from ..cpp.types import parse_value
 
 
 class LiteralsParser(ParserBase):
     '''
     Parses the magic string literals outputted by the ConstantsDumper clang plugin.
+
+    A lazy parser only decodes the literals when they are first accessed in the scope (see ConstantsParser).
     '''
     LITERAL_MATCHER = re.compile(r'^\s*#\s*literal\s+(?P<constant>.*)$')
     _LITERAL_UNQUALIFIED_NAME = '(literal)'
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, lazy: bool = False, **kwargs):
         super().__init__(*args, **kwargs)
         self.__literals_in_scope: Dict[Text, int]
+        self.__values_parser = ConstantsParser(lazy=lazy)
         self.reset()
 
     def reset(self):
@@ -31,21 +33,19 @@ class LiteralsParser(ParserBase):
         self.__literals_in_scope = {}
 
     @staticmethod
-    def _get_name_and_value(constant, scope):
+    def _get_name_and_value(constant):
         if value_match := ConstantsParser.VALUE_MATCHER.match(constant):
-            name = value_match.group('name')
-            value = parse_value(value_match.group('value'), scope)
-            return name, value
+            return value_match.group('name', 'value')
         return None
 
     def parse_line(self, line: Text, context: Context) -> bool:
         value_match: Optional[re.Match]
         if value_match := LiteralsParser.LITERAL_MATCHER.match(line):
-            parsed_constant = LiteralsParser._get_name_and_value(value_match.group('constant'), context.global_scope)
+            parsed_constant = LiteralsParser._get_name_and_value(value_match.group('constant'))
             if not parsed_constant:
                 return False
 
-            name, value = parsed_constant
+            name, raw_value = parsed_constant
             if not name.endswith(LiteralsParser._LITERAL_UNQUALIFIED_NAME):
                 return False
 
@@ -55,6 +55,7 @@ class LiteralsParser(ParserBase):
             name += f'`{num}'
             self.__literals_in_scope[scope_name] = num + 1
 
-            context.global_scope[name] = value
+            context.global_scope[name] = self.__values_parser.make_value(raw_value, context.global_scope,
+                                                                         context.types)
 
         return bool(value_match)
@@ -21,5 +21,7 @@ class RecordsParser(ParserBase):
             name = type_match.group('name')
             fields = type_match.group('fields')
             context.global_scope[name] = Record(name, fields, context.global_scope.get(name, []))
+            if context.types is not None:
+                context.types.invalidate()
 
         return bool(type_match)
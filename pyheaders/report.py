@@ -0,0 +1,127 @@
+'''
+Reports of files that failed to load.
+'''
+import json
+import os
+import subprocess
+
+from dataclasses import asdict, dataclass, field
+from typing import AnyStr, Dict, Iterable, List, Optional, Text
+
+from .compiler import PluginError
+from .parser import ParsingError
+
+# The errors that are reported (instead of raised) when loading with keep_going.
+LOAD_ERRORS = (PluginError, subprocess.TimeoutExpired, ParsingError)
+
+
+def _text(stream) -> Text:
+    if stream is None:
+        return ''
+    if isinstance(stream, bytes):
+        return stream.decode(errors='replace')
+    return stream
+
+
+@dataclass
+class FileFailure:
+    '''
+    A file that failed to load.
+
+    Members:
+        - filename -- The file.
+        - reason -- 'error' if clang failed, 'timeout' if clang was killed after a timeout, 'parse' if the plugin's
+                    output couldn't be parsed.
+        - returncode -- clang's exit code, if clang failed.
+        - stderr -- clang's captured stderr, or the parsing error.
+        - elapsed -- The wall time (in seconds) spent on the file.
+    '''
+    filename: Text
+    reason: Text
+    returncode: Optional[int] = None
+    stderr: Text = ''
+    elapsed: float = 0.0
+
+    @classmethod
+    def from_error(cls, filename: AnyStr, error: Exception, elapsed: float) -> 'FileFailure':
+        '''
+        Create a FileFailure from one of the LOAD_ERRORS.
+        '''
+        filename = os.fsdecode(filename)
+        if isinstance(error, subprocess.TimeoutExpired):
+            return cls(filename, 'timeout', None, _text(error.stderr), elapsed)
+        if isinstance(error, PluginError):
+            return cls(filename, 'error', error.returncode, _text(error.stderr), elapsed)
+        return cls(filename, 'parse', None, str(error), elapsed)
+
+
+@dataclass
+class LoadReport:
+    '''
+    The files that failed to load in a load_path() call with ``keep_going``.
+
+    Pass the report to load_path() as ``retry_failed`` to load only the files that failed.
+
+    Members:
+        - failures -- The failed files, in loading order.
+    '''
+    failures: List[FileFailure] = field(default_factory=list)
+
+    def update(self, other: 'LoadReport'):
+        '''
+        Add the failures of another LoadReport object.
+        '''
+        self.failures.extend(other.failures)  # pylint: disable=no-member
+
+    @property
+    def failed_files(self) -> List[Text]:
+        '''
+        The names of the files that failed.
+        '''
+        return [failure.filename for failure in self.failures]
+
+    def select(self, filenames: Iterable[AnyStr]) -> List[AnyStr]:
+        '''
+        Get the files out of ``filenames`` that failed.
+        '''
+        failed = {os.path.abspath(name) for name in self.failed_files}
+        return [filename for filename in filenames if os.path.abspath(os.fsdecode(filename)) in failed]
+
+    def summary(self) -> Text:
+        '''
+        Format the failures as human readable lines.
+        '''
+        lines = [f'{len(self.failures)} file(s) failed to load']
+        for failure in self.failures:
+            details = 'timed out' if failure.reason == 'timeout' else \
+                f'exit code {failure.returncode}' if failure.reason == 'error' else 'invalid plugin output'
+            lines.append(f'  {failure.filename}: {details} ({failure.elapsed:.3f}s)')
+        return '\n'.join(lines)
+
+    def to_json(self) -> Dict:
+        '''
+        Convert the report to a JSON-serializable dictionary.
+        '''
+        return {'failures': [asdict(failure) for failure in self.failures]}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'LoadReport':
+        '''
+        Create a report from a dictionary created by to_json().
+        '''
+        return cls([FileFailure(**failure) for failure in data.get('failures', [])])
+
+    def dump(self, path: AnyStr):
+        '''
+        Save the report to a JSON file.
+        '''
+        with open(path, 'w') as report_file:
+            json.dump(self.to_json(), report_file, indent=2)
+
+    @classmethod
+    def load(cls, path: AnyStr) -> 'LoadReport':
+        '''
+        Read a report that was saved using dump().
+        '''
+        with open(path) as report_file:
+            return cls.from_json(json.load(report_file))
@@ -0,0 +1,142 @@
+'''
+Include-graph-aware scheduling: choose the translation units that need to be loaded.
+
+Most of the constants in a code base are in headers, and most headers are included by many TUs. Loading a TU
+that only includes headers that other loaded TUs already include adds nothing, so only a small set of TUs that
+covers all included files (and the TUs that define constants themselves) needs to be loaded.
+'''
+import heapq
+import os
+import re
+import subprocess
+
+from typing import AnyStr, Callable, Dict, FrozenSet, Iterable, List, Mapping, Sequence, Text
+
+from .cache import DiskCache, make_key
+from .compiler import Clang, PluginError
+
+IncludeClosures = Mapping[AnyStr, FrozenSet[Text]]
+
+# Things in a source file that may produce plugin output or macros. This is a cheap over-approximation,
+# a false positive only means that the TU is loaded.
+_DEFINITIONS_RE = re.compile(rb'\b(?:constexpr|enum)\b|^\s*(?:static\s+|extern\s+|inline\s+)*const\b|'
+                             rb'^\s*#\s*define\b|\b(?:struct|class|union)\s+\w+\s*(?:final\s*)?[:{]', flags=re.M)
+
+
+def defines_constants(filename: AnyStr) -> bool:
+    '''
+    Check (heuristically) whether a source file itself defines constants, types or macros.
+    Unreadable files are considered as defining constants.
+    '''
+    try:
+        with open(filename, 'rb') as source_file:
+            return _DEFINITIONS_RE.search(source_file.read()) is not None
+    except OSError:
+        return True
+
+
+def cover(closures: IncludeClosures, required: Iterable[AnyStr] = ()) -> List[AnyStr]:
+    '''
+    Choose a small set of TUs whose include closures cover the include closures of all TUs.
+
+    A TU's own file doesn't need to be covered (it can only be covered by loading it), unless it is ``required``.
+    The set is chosen greedily (the TU that covers the most uncovered files first), which is within a logarithmic
+    factor of the minimal set.
+
+    @param closures The include closure (absolute paths of all included files) of every TU.
+    @param required TUs that must be loaded.
+
+    @returns The chosen TUs, in the order of ``closures``.
+    '''
+    order = {tu: i for i, tu in enumerate(closures)}
+    own_files = {os.path.abspath(os.fsdecode(tu)) for tu in closures}
+    chosen = set(required)
+
+    uncovered = set()
+    for closure in closures.values():
+        uncovered |= closure
+    uncovered -= own_files
+    for tu in chosen:
+        uncovered -= closures[tu]
+
+    # Lazy greedy: a TU's gain can only shrink, so a stale gain is an upper bound of the real one.
+    heap = [(-len(closure & uncovered), order[tu], tu) for tu, closure in closures.items() if tu not in chosen]
+    heapq.heapify(heap)
+    while uncovered and heap:
+        _, index, tu = heapq.heappop(heap)
+        gain = len(closures[tu] & uncovered)
+        if gain == 0:
+            continue
+        if heap and -gain > heap[0][0]:
+            heapq.heappush(heap, (-gain, index, tu))
+            continue
+        chosen.add(tu)
+        uncovered -= closures[tu]
+
+    return sorted(chosen, key=order.__getitem__)
+
+
+def include_closures(clang: Clang, filenames: Iterable[AnyStr], extra_args: Iterable[Text] = None, *,
+                     cache: DiskCache = None, **kwargs) -> Dict[AnyStr, FrozenSet[Text]]:
+    '''
+    Get the include closures of ``filenames`` using ``clang.get_includes``.
+
+    Closures are cached (in ``cache``, defaults to the "includes" cache in the default cache directory) and are
+    recomputed when any of the included files changes.
+
+    @param clang        The compiler to use.
+    @param filenames    The TUs.
+    @param extra_args   Additional args to append to the compile commands' flags.
+    @param cache        The cache to use.
+    @param kwargs       Additional args for ``clang.get_includes``.
+
+    @returns A mapping from every TU to the absolute paths of the files it includes (including itself).
+             TUs whose includes can't be found (f.e. because of a compilation error or a timeout) are omitted.
+    '''
+    if cache is None:
+        cache = DiskCache('includes')
+    extra_args = list(extra_args or [])
+
+    closures = {}
+    for filename in filenames:
+        # pylint: disable=protected-access
+        key = make_key(clang.exec_path, clang._command(filename, extra_args, **_command_kwargs(kwargs)))
+        includes = cache.get_valid(key)
+        if includes is None:
+            try:
+                includes = clang.get_includes(filename, extra_args, **kwargs)
+            except (PluginError, subprocess.TimeoutExpired):
+                # Loaded by schedule()
+                continue
+            cache.set_valid(key, includes, includes)
+        closures[filename] = frozenset(includes)
+    return closures
+
+
+def _command_kwargs(kwargs: Mapping) -> Dict:
+    return {'ignore_cmds': kwargs.get('ignore_cmds', False)}
+
+
+def schedule(clang: Clang, filenames: Sequence[AnyStr], extra_args: Iterable[Text] = None, *,
+             cache: DiskCache = None, is_required: Callable[[AnyStr], bool] = defines_constants,
+             **kwargs) -> List[AnyStr]:
+    '''
+    Choose the TUs to load out of ``filenames``: the TUs that define constants themselves and a small set of
+    TUs that covers all the files that are included by any TU.
+
+    Note that headers are assumed to produce the same constants in every TU that includes them.
+    TUs whose includes can't be found are always loaded.
+
+    @param clang        The compiler to use for finding the includes.
+    @param filenames    All TUs.
+    @param extra_args   Additional args to append to the compile commands' flags.
+    @param cache        The cache for the include closures, see include_closures().
+    @param is_required  A predicate for TUs that must be loaded, by default TUs that define constants.
+    @param kwargs       Additional args for ``clang.get_includes``.
+
+    @returns The TUs to load, in their original order.
+    '''
+    closures = include_closures(clang, filenames, extra_args, cache=cache, **kwargs)
+    required = [filename for filename in filenames if filename not in closures or is_required(filename)]
+    closures = {filename: closures.get(filename, frozenset()) for filename in filenames}
+    return cover(closures, required)
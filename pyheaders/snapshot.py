@@ -0,0 +1,577 @@
+'''
+A compact, versioned binary snapshot format for loaded data.
+
+Snapshots contain the scope tree (including enums and record definitions) and the macros. They are opened using
+a memory-mapped reader that only deserializes the namespaces and values that are accessed. The digests of the
+namespaces (see ``Scope.digest``) are stored as well, so comparing snapshots only deserializes the namespaces that
+differ.
+
+Layout (all integers are little-endian, "varint" is an unsigned LEB128 integer):
+
+    header:     magic (8 bytes), version (u16), flags (u16), root offset (u64), macros offset (u64)
+    scope:      SCOPE tag, table
+    record:     RECORD tag, str name, varint field count, field count * str, table
+    table:      digest (16 bytes), varint count, count * u64 value offset, count * u32 name offset, count * u32 index,
+                str of the NUL-separated names
+    macros:     varint count, count * (str name, str value)
+    values:     tag, payload (see ``_Writer._write_inline``)
+    str:        varint length, utf-8 data
+
+The names of a table are in the order of the scope, the name offsets are the offsets of the names in the names'
+data, and the index lists the entries in the order of their (utf-8 encoded) names, so a name can be looked up
+using a binary search.
+'''
+import array
+import mmap
+import os
+import struct
+import sys
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import suppress
+from functools import partial, wraps
+from typing import Any, AnyStr, Dict, Iterator, NamedTuple, Optional, Text, Tuple
+
+from .cpp import BaseScope, Enum, Record, Scope, digests
+from .cpp.lazy import Lazy, LazyContainer
+
+MAGIC = b'PYHSNAP\0'
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct('<8sHHQQ')
+_OFFSET = struct.Struct('<Q')
+_INDEX = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+
+# Value tags
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_FLOAT_TAG = 4
+_STR = 5
+_BYTES = 6
+_LIST = 7
+_TUPLE = 8
+_RECORD_VALUE = 9
+_ENUM = 10
+_SCOPE = 11
+_RECORD = 12
+_ARRAY = 13
+
+# Values that are merged instead of being replaced (see cpp.merge)
+_CONTAINER_TAGS = (_ENUM, _SCOPE, _RECORD)
+
+_STR_ERRORS = 'surrogatepass'
+
+
+class SnapshotError(ValueError):
+    '''
+    Raised to indicate an invalid or unsupported snapshot file.
+    '''
+
+
+def _varint(value: int) -> bytes:
+    assert value >= 0
+    data = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _str(value: Text) -> bytes:
+    data = value.encode('utf-8', _STR_ERRORS)
+    return _varint(len(data)) + data
+
+
+class _Writer:
+    '''
+    Serializes a scope tree and macros into a snapshot file.
+    '''
+
+    def __init__(self, output):
+        self._output = output
+        self._record_types: Dict[type, Text] = {}
+
+    def _collect_record_types(self, scope: Scope):
+        for value in scope.values():
+            if isinstance(value, Record) and isinstance(value.type, type):
+                self._record_types.setdefault(value.type, value.name)
+            if isinstance(value, BaseScope):
+                self._collect_record_types(value)
+
+    def _write_blob(self, data: bytes) -> int:
+        offset = self._output.tell()
+        self._output.write(data)
+        return offset
+
+    def _write_inline(self, value: Any, data: bytearray):  # pylint: disable=too-many-branches
+        if value is None:
+            data.append(_NONE)
+        elif value is True:
+            data.append(_TRUE)
+        elif value is False:
+            data.append(_FALSE)
+        elif isinstance(value, int):
+            data.append(_INT)
+            data += _varint(_zigzag(value))
+        elif isinstance(value, float):
+            data.append(_FLOAT_TAG)
+            data += _FLOAT.pack(value)
+        elif isinstance(value, str):
+            data.append(_STR)
+            data += _str(value)
+        elif isinstance(value, bytes):
+            data.append(_BYTES)
+            data += _varint(len(value)) + value
+        elif isinstance(value, array.array):
+            data.append(_ARRAY)
+            data += value.typecode.encode('ascii')
+            if sys.byteorder != 'little':
+                value = array.array(value.typecode, value)
+                value.byteswap()
+            raw = value.tobytes()
+            data += _varint(len(raw)) + raw
+        elif isinstance(value, Enum):
+            data.append(_ENUM)
+            data += _str(value.name) + _varint(len(value))
+            for name, item in value.items():
+                data += _str(name)
+                self._write_inline(item, data)
+        elif isinstance(value, tuple) and type(value) in self._record_types:
+            data.append(_RECORD_VALUE)
+            data += _str(self._record_types[type(value)]) + _varint(len(value))
+            for item in value:
+                self._write_inline(item, data)
+        elif isinstance(value, (list, tuple)):
+            data.append(_LIST if isinstance(value, list) else _TUPLE)
+            data += _varint(len(value))
+            for item in value:
+                self._write_inline(item, data)
+        else:
+            raise TypeError(f"can't snapshot a value of type {type(value).__name__!r}")
+
+    def _write_table(self, scope: Scope, data: bytearray):
+        data += scope.digest()
+        offsets = [self._write_value(value) for value in scope.values()]
+        names = [name.encode('utf-8', _STR_ERRORS) for name in scope.keys()]
+        name_offsets = []
+        name_offset = 0
+        for name in names:
+            name_offsets.append(name_offset)
+            name_offset += len(name) + 1
+        index = sorted(range(len(names)), key=names.__getitem__)
+
+        data += _varint(len(offsets))
+        data += struct.pack(f'<{len(offsets)}Q', *offsets)
+        data += struct.pack(f'<{len(names)}I', *name_offsets)
+        data += struct.pack(f'<{len(names)}I', *index)
+        names_data = b'\0'.join(names)
+        data += _varint(len(names_data)) + names_data
+
+    def _write_value(self, value: Any) -> int:
+        data = bytearray()
+        if isinstance(value, Record):
+            data.append(_RECORD)
+            data += _str(value.name) + _varint(len(value.fields))
+            for field in value.fields:
+                data += _str(field)
+            self._write_table(value, data)
+        elif isinstance(value, BaseScope):
+            data.append(_SCOPE)
+            self._write_table(value, data)
+        else:
+            self._write_inline(value, data)
+        return self._write_blob(bytes(data))
+
+    def write(self, scope: Scope, macros: Dict[Text, Text]):
+        '''
+        Write the entire snapshot.
+        '''
+        self._output.write(b'\0' * _HEADER.size)
+
+        self._collect_record_types(scope)
+        root_offset = self._write_value(scope)
+
+        data = bytearray(_varint(len(macros)))
+        for name, value in macros.items():
+            data += _str(name) + _str(value)
+        macros_offset = self._write_blob(bytes(data))
+
+        self._output.seek(0)
+        self._output.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, root_offset, macros_offset))
+
+
+def dump(path: AnyStr, scope: Scope, macros: Dict[Text, Text] = None):
+    '''
+    Save a scope and macros to a snapshot file.
+
+    @param path     The path of the snapshot file to create.
+    @param scope    The scope to save.
+    @param macros   The macros to save.
+
+    The file is replaced atomically, so ``path`` may be a snapshot that ``scope`` was (lazily) loaded from.
+    '''
+    temp_path = os.fsdecode(path) + f'.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as output:
+            _Writer(output).write(scope, macros or {})
+        os.replace(temp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(temp_path)
+        raise
+
+
+class _LazyMacros(MutableMapping):
+    '''
+    A dictionary of macros that is only deserialized when it is first accessed.
+    '''
+
+    def __init__(self, snapshot: 'Snapshot'):
+        self.__snapshot = snapshot
+        self.__macros: Optional[Dict[Text, Text]] = None
+
+    @property
+    def _macros(self) -> Dict[Text, Text]:
+        if self.__macros is None:
+            self.__macros = self.__snapshot.read_macros()
+        return self.__macros
+
+    def __getitem__(self, name: Text) -> Text:
+        return self._macros[name]
+
+    def __setitem__(self, name: Text, value: Text):
+        self._macros[name] = value
+
+    def __delitem__(self, name: Text):
+        del self._macros[name]
+
+    def __iter__(self) -> Iterator[Text]:
+        return iter(self._macros)
+
+    def __len__(self) -> int:
+        return len(self._macros)
+
+    def __repr__(self):
+        return repr(self._macros)
+
+
+class _Table(NamedTuple):
+    '''
+    The position of a table in a snapshot (see the layout).
+    '''
+    count: int
+    pos: int
+    names_pos: int
+    names_length: int
+
+    @property
+    def name_offsets_pos(self) -> int:
+        '''
+        The position of the name offsets.
+        '''
+        return self.pos + self.count * _OFFSET.size
+
+
+class _SnapshotScope(Scope):
+    '''
+    A scope that is read from a snapshot table on demand.
+
+    Names are looked up in the table's index, and only the items that are accessed are read. The whole table is
+    read (in the order of the scope) when the scope is iterated, compared or changed.
+    '''
+
+    def __init__(self, snapshot: 'Snapshot', table: _Table):
+        super().__init__()
+        self._snapshot: Optional[Snapshot] = snapshot
+        self._table = table
+
+    def _read_item(self, name: Text) -> bool:
+        # pylint: disable=protected-access
+        offset = self._snapshot._table_find(self._table, name)
+        if offset is None:
+            return False
+        OrderedDict.__setitem__(self, name, self._snapshot._lazy_value(offset, self))
+        return True
+
+    def _read_all(self):
+        if self._snapshot is None:
+            return
+        snapshot, self._snapshot = self._snapshot, None
+        # Keep the items that were already read, but in the order of the table
+        read_items = dict(dict.items(self))
+        OrderedDict.clear(self)
+        # pylint: disable=protected-access
+        for name, offset in snapshot._table_items(self._table):
+            value = read_items[name] if name in read_items else snapshot._lazy_value(offset, self)
+            OrderedDict.__setitem__(self, name, value)
+
+    def __missing__(self, name: Text):
+        if self._snapshot is not None and self._read_item(name):
+            return dict.__getitem__(self, name)
+        raise KeyError(name)
+
+    def _has_local(self, name: Text) -> bool:
+        if self._snapshot is not None and not dict.__contains__(self, name):
+            return self._read_item(name)
+        return super()._has_local(name)
+
+    def __repr__(self):
+        return repr(Scope(self.items()))
+
+    def copy(self) -> Scope:
+        return Scope(self.items())
+
+    def __reduce__(self):
+        return Scope, (list(self.items()),)
+
+
+def _reading_all(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._read_all()  # pylint: disable=protected-access
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Everything but looking up names reads the whole table
+for _method in ('__iter__', '__reversed__', '__len__', '__eq__', '__ne__', '__repr__', '__setitem__', '__delitem__',
+                'keys', 'values', 'items', 'pop', 'popitem', 'setdefault', 'update', 'clear', 'move_to_end',
+                '_set_local', 'copy', '__reduce__', '__or__', '__ior__'):
+    if hasattr(_SnapshotScope, _method):
+        setattr(_SnapshotScope, _method, _reading_all(getattr(_SnapshotScope, _method)))
+
+
+class Snapshot:
+    '''
+    A memory-mapped snapshot reader.
+
+    Only the accessed namespaces and values are deserialized. The file stays mapped as long as any of the
+    snapshot's values are not deserialized, or until close() is called.
+    '''
+
+    def __init__(self, path: AnyStr):
+        with open(path, 'rb') as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            raise SnapshotError(f"{path!r} is too short to be a snapshot")
+        magic, version, _, self._root_offset, self._macros_offset = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path!r} is not a snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version} (expected {FORMAT_VERSION})")
+
+        self._scope: Optional[Scope] = None
+        self._records: Dict[Text, Any] = {}
+
+    def close(self):
+        '''
+        Unmap the snapshot. Values that were not deserialized can't be accessed anymore.
+        '''
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _read_varint(self, pos: int) -> Tuple[int, int]:
+        result = 0
+        shift = 0
+        while True:
+            byte = self._map[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return result, pos
+            shift += 7
+
+    def _read_str(self, pos: int) -> Tuple[Text, int]:
+        length, pos = self._read_varint(pos)
+        return self._map[pos:pos + length].decode('utf-8', _STR_ERRORS), pos + length
+
+    def _record_type(self, name: Text):
+        if name not in self._records:
+            record = self.scope.get(name)
+            self._records[name] = record if isinstance(record, Record) else None
+        return self._records[name]
+
+    def _read_inline(self, pos: int) -> Tuple[Any, int]:  # pylint: disable=too-many-return-statements
+        tag = self._map[pos]
+        pos += 1
+        if tag == _NONE:
+            return None, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _INT:
+            value, pos = self._read_varint(pos)
+            return _unzigzag(value), pos
+        if tag == _FLOAT_TAG:
+            return _FLOAT.unpack_from(self._map, pos)[0], pos + _FLOAT.size
+        if tag == _STR:
+            return self._read_str(pos)
+        if tag == _BYTES:
+            length, pos = self._read_varint(pos)
+            return self._map[pos:pos + length], pos + length
+        if tag == _ARRAY:
+            values = array.array(chr(self._map[pos]))
+            length, pos = self._read_varint(pos + 1)
+            values.frombytes(self._map[pos:pos + length])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            return values, pos + length
+        if tag in (_LIST, _TUPLE, _RECORD_VALUE):
+            if tag == _RECORD_VALUE:
+                name, pos = self._read_str(pos)
+            count, pos = self._read_varint(pos)
+            items = []
+            for _ in range(count):
+                item, pos = self._read_inline(pos)
+                items.append(item)
+            if tag == _LIST:
+                return items, pos
+            if tag == _RECORD_VALUE and (record := self._record_type(name)) is not None:
+                return record(*items), pos
+            return tuple(items), pos
+        if tag == _ENUM:
+            name, pos = self._read_str(pos)
+            count, pos = self._read_varint(pos)
+            items = []
+            for _ in range(count):
+                item_name, pos = self._read_str(pos)
+                item, pos = self._read_inline(pos)
+                items.append((item_name, item))
+            return Enum(name, items), pos
+        raise SnapshotError(f"invalid value tag {tag} at offset {pos - 1}")
+
+    def _read_table(self, pos: int, scope: Optional[Scope], parent: Optional[Scope]) -> Scope:
+        '''
+        Read a table into ``scope``, or into a new _SnapshotScope that reads its items on demand if it's None.
+        '''
+        digest = bytes(self._map[pos:pos + digests.DIGEST_SIZE])
+        count, pos = self._read_varint(pos + digests.DIGEST_SIZE)
+        names_length, names_pos = self._read_varint(pos + count * (_OFFSET.size + 2 * _INDEX.size))
+        table = _Table(count, pos, names_pos, names_length)
+        if scope is None:
+            scope = _SnapshotScope(self, table)
+        else:
+            for name, offset in self._table_items(table):
+                scope._set_local(name, self._lazy_value(offset, scope))  # pylint: disable=protected-access
+        # Changing the scope invalidates the digest of its parent, like for scopes that were hashed
+        digests.preset(scope, digest, parent)
+        return scope
+
+    def _lazy_value(self, offset: int, parent: Scope) -> Lazy:
+        lazy_type = LazyContainer if self._map[offset] in _CONTAINER_TAGS else Lazy
+        return lazy_type(partial(self._read_value, offset, parent))
+
+    def _table_name(self, table: '_Table', entry: int) -> bytes:
+        start = table.names_pos + _INDEX.unpack_from(self._map, table.name_offsets_pos + entry * _INDEX.size)[0]
+        end = self._map.find(b'\0', start, table.names_pos + table.names_length)
+        return self._map[start:end if end >= 0 else table.names_pos + table.names_length]
+
+    def _table_offset(self, table: '_Table', entry: int) -> int:
+        return _OFFSET.unpack_from(self._map, table.pos + entry * _OFFSET.size)[0]
+
+    def _table_items(self, table: '_Table') -> Iterator[Tuple[Text, int]]:
+        '''
+        The names of a table and the offsets of their values, in the order of the scope.
+        '''
+        if not table.count:
+            return zip((), ())
+        offsets = struct.unpack_from(f'<{table.count}Q', self._map, table.pos)
+        names = self._map[table.names_pos:table.names_pos + table.names_length].decode('utf-8', _STR_ERRORS)
+        return zip(names.split('\0'), offsets)
+
+    def _table_find(self, table: '_Table', name: Text) -> Optional[int]:
+        '''
+        Binary search the index of a table for a name, and get the offset of its value.
+        '''
+        try:
+            key = name.encode('utf-8', _STR_ERRORS)
+        except UnicodeEncodeError:
+            return None
+        index_pos = table.name_offsets_pos + table.count * _INDEX.size
+        low, high = 0, table.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = _INDEX.unpack_from(self._map, index_pos + middle * _INDEX.size)[0]
+            current = self._table_name(table, entry)
+            if current == key:
+                return self._table_offset(table, entry)
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _read_value(self, offset: int, parent: Optional[Scope] = None) -> Any:
+        tag = self._map[offset]
+        if tag == _SCOPE:
+            return self._read_table(offset + 1, None, parent)
+        if tag == _RECORD:
+            name, pos = self._read_str(offset + 1)
+            count, pos = self._read_varint(pos)
+            fields = []
+            for _ in range(count):
+                field, pos = self._read_str(pos)
+                fields.append(field)
+            return self._read_table(pos, Record(name, fields), parent)
+        return self._read_inline(offset)[0]
+
+    @property
+    def scope(self) -> Scope:
+        '''
+        The snapshot's global scope. Its items are deserialized when they are first accessed.
+        '''
+        if self._scope is None:
+            self._scope = self._read_value(self._root_offset)
+        return self._scope
+
+    def read_macros(self) -> Dict[Text, Text]:
+        '''
+        Deserialize the snapshot's macros.
+        '''
+        count, pos = self._read_varint(self._macros_offset)
+        macros = {}
+        for _ in range(count):
+            name, pos = self._read_str(pos)
+            macros[name], pos = self._read_str(pos)
+        return macros
+
+    @property
+    def macros(self) -> MutableMapping:
+        '''
+        The snapshot's macros. They are deserialized when they are first accessed.
+        '''
+        return _LazyMacros(self)
+
+
+def is_snapshot(path: AnyStr) -> bool:
+    '''
+    Check whether ``path`` is a snapshot file.
+    '''
+    try:
+        with open(path, 'rb') as snapshot_file:
+            return snapshot_file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
@@ -0,0 +1,223 @@
+'''
+Statistics collected while loading source files.
+'''
+import itertools
+import subprocess
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Text
+
+# The phases of loading a single file, in order.
+PHASES = ('commands', 'plugins', 'macros-dump', 'macros-expand', 'parse')
+
+
+class _PeakTracker:
+    '''
+    Tracks the peak memory traced by tracemalloc during (possibly nested or concurrent) intervals.
+
+    tracemalloc only has a single peak, so the peak is added to all the running intervals and reset whenever an
+    interval starts or stops. Python 3.8 can't reset the peak, so the peaks there are the peaks since tracing
+    started.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = itertools.count()
+        self._peaks: Dict[int, int] = {}
+
+    def _fold(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for token, current in self._peaks.items():
+            self._peaks[token] = max(current, peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def start(self) -> Optional[int]:
+        '''
+        Start an interval, returns its token (or ``None`` if tracemalloc isn't tracing).
+        '''
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            self._fold()
+            token = next(self._tokens)
+            self._peaks[token] = tracemalloc.get_traced_memory()[0]
+            return token
+
+    def stop(self, token: int) -> Optional[int]:
+        '''
+        Stop an interval, returns its peak (or ``None`` if tracemalloc stopped tracing during the interval).
+        '''
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                self._peaks.pop(token, None)
+                return None
+            self._fold()
+            return self._peaks.pop(token)
+
+
+_PEAKS = _PeakTracker()
+
+
+@dataclass
+class FileStats:
+    '''
+    Statistics about loading a single file.
+
+    Members:
+        - filename -- The loaded file.
+        - phases -- The wall time (in seconds) spent in every phase. Nested phases are not counted in their parent.
+        - processes -- The number of clang processes that were run.
+        - output_bytes -- The total size of clang's captured output.
+        - parsed_lines -- The number of plugin output lines that were parsed.
+        - memory_peaks -- The peak memory (in bytes) traced during every phase, only if tracemalloc is tracing
+                          (see ``tracemalloc.start``). Includes the memory of everything else that ran at the
+                          same time (f.e. other files that are loaded concurrently).
+    '''
+    filename: Text
+    phases: Dict[Text, float] = field(default_factory=dict)
+    processes: int = 0
+    output_bytes: int = 0
+    parsed_lines: int = 0
+    memory_peaks: Dict[Text, int] = field(default_factory=dict)
+    _active: List[List] = field(default_factory=list, init=False, repr=False, compare=False)
+
+    @property
+    def total(self) -> float:
+        '''
+        The total wall time spent loading the file.
+        '''
+        return sum(self.phases.values())
+
+    @contextmanager
+    def measure(self, phase: Text):
+        '''
+        Measure the wall time (and the peak traced memory) of the block and add it to ``phase``.
+        '''
+        # [start time, time spent in nested phases]
+        frame = [time.perf_counter(), 0.0]
+        self._active.append(frame)  # pylint: disable=no-member
+        token = _PEAKS.start()
+        try:
+            yield
+        finally:
+            if token is not None and (peak := _PEAKS.stop(token)) is not None:
+                self.memory_peaks[phase] = max(self.memory_peaks.get(phase, 0), peak)
+            self._active.pop()  # pylint: disable=no-member
+            elapsed = time.perf_counter() - frame[0]
+            self.phases[phase] = self.phases.get(phase, 0.0) + elapsed - frame[1]
+            if self._active:
+                self._active[-1][1] += elapsed
+
+    def record_process(self, proc: subprocess.CompletedProcess, streamed_bytes: int = 0):
+        '''
+        Account for a finished clang process.
+
+        @param proc             The process.
+        @param streamed_bytes   The size of the output that was streamed instead of being captured.
+        '''
+        self.processes += 1
+        self.output_bytes += streamed_bytes
+        for stream in (proc.stdout, proc.stderr):
+            if stream:
+                self.output_bytes += len(stream)
+
+
+@dataclass
+class LoadStats:
+    '''
+    Statistics about a load_path() / loads() / load() call.
+
+    Members:
+        - files -- The statistics of every loaded file.
+        - wall_time -- The wall time of the entire call (including source files discovery), if known.
+    '''
+    files: List[FileStats] = field(default_factory=list)
+    wall_time: Optional[float] = None
+
+    def update(self, other: 'LoadStats'):
+        '''
+        Add the statistics of another LoadStats object.
+        '''
+        self.files.extend(other.files)  # pylint: disable=no-member
+
+    @property
+    def processes(self) -> int:
+        '''
+        The total number of clang processes that were run.
+        '''
+        return sum(file_stats.processes for file_stats in self.files)
+
+    @property
+    def output_bytes(self) -> int:
+        '''
+        The total size of clang's captured output.
+        '''
+        return sum(file_stats.output_bytes for file_stats in self.files)
+
+    @property
+    def parsed_lines(self) -> int:
+        '''
+        The total number of plugin output lines that were parsed.
+        '''
+        return sum(file_stats.parsed_lines for file_stats in self.files)
+
+    def phase_totals(self) -> Dict[Text, float]:
+        '''
+        Get the total wall time spent in every phase, across all files.
+        '''
+        totals = {}
+        for file_stats in self.files:
+            for phase, elapsed in file_stats.phases.items():
+                totals[phase] = totals.get(phase, 0.0) + elapsed
+        return dict(sorted(totals.items(), key=lambda item: PHASES.index(item[0]) if item[0] in PHASES else len(PHASES)))
+
+    def memory_peaks(self) -> Dict[Text, int]:
+        '''
+        Get the peak traced memory of every phase, across all files (empty if tracemalloc wasn't tracing).
+        '''
+        peaks = {}
+        for file_stats in self.files:
+            for phase, peak in file_stats.memory_peaks.items():
+                peaks[phase] = max(peaks.get(phase, 0), peak)
+        return peaks
+
+    def slowest(self, count: int = 10) -> List[FileStats]:
+        '''
+        Get the ``count`` files that took the longest to load.
+        '''
+        return sorted(self.files, key=lambda file_stats: file_stats.total, reverse=True)[:count]
+
+    def summary(self, slowest: int = 10) -> Text:
+        '''
+        Format the statistics as a human readable table.
+
+        @param slowest  The number of slowest files to list.
+        '''
+        totals = self.phase_totals()
+        total = sum(totals.values())
+        wall_time = self.wall_time if self.wall_time is not None else total
+
+        lines = [f'Loaded {len(self.files)} file(s) in {wall_time:.3f}s: {self.processes} clang process(es), '
+                 f'{self.output_bytes} output bytes, {self.parsed_lines} parsed lines', '']
+
+        peaks = self.memory_peaks()
+        lines.append(f'{"phase":<16}{"time":>10}{"share":>8}' + (f'{"peak bytes":>16}' if peaks else ''))
+        for phase, elapsed in totals.items():
+            lines.append(f'{phase:<16}{elapsed:>9.3f}s{elapsed / total if total else 0:>8.1%}' +
+                         (f'{peaks[phase]:>16,}' if phase in peaks else ''))
+
+        if self.files and slowest:
+            phases = list(totals)
+            lines.append('')
+            lines.append(f'{"total":>9}' + ''.join(f'{phase:>15}' for phase in phases) + '  file')
+            for file_stats in self.slowest(slowest):
+                lines.append(f'{file_stats.total:>8.3f}s' +
+                             ''.join(f'{file_stats.phases.get(phase, 0.0):>14.3f}s' for phase in phases) +
+                             f'  {file_stats.filename}')
+
+        return '\n'.join(lines)
@@ -1,69 +1,141 @@
 '''
 The main entry for the pyheaders package to allow it to run as a command-line tool.
 '''
-from typing import Iterable, Text, Tuple
+import array
+import json
+import math
+import sys
 
-from .cpp import Enum, Scope
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, TextIO, Text, Tuple
+
+from .cpp import BaseScope, Enum, Scope
 
 _TREE_LINE = '|    '
 _TREE_ITEM = '+--- '
 _TREE_LAST = '`--- '
 _TREE_NONE = '     '
 
+# The values of the floats that JSON can't represent, see to_json().
+_NON_FINITE_FLOATS = {'nan': 'NaN', 'inf': 'Infinity', '-inf': '-Infinity'}
+
+
+class _BufferedWriter:
+    '''
+    Collects output lines and writes them to a file in large chunks.
+    '''
+    _CHUNK_SIZE = 1 << 16
+
+    def __init__(self, file: TextIO = None):
+        self._write = (file or sys.stdout).write
+        self._pending: List[Text] = []
+        self._size = 0
+
+    def line(self, text: Text):
+        '''
+        Add a line to the output.
+        '''
+        self._pending.append(text)
+        self._size += len(text) + 1
+        if self._size >= _BufferedWriter._CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write all pending lines.
+        '''
+        if self._pending:
+            self._pending.append('')
+            self._write('\n'.join(self._pending))
+            self._pending = []
+            self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.flush()
+
+
+def _empty_scopes(scope: Scope, empty: Dict[int, bool]) -> bool:
+    '''
+    Compute Scope.isempty() for ``scope`` and all the scopes in it in a single pass, into ``empty`` (by id).
+    '''
+    is_empty = True
+    for value in scope.values():
+        if isinstance(value, BaseScope):
+            is_empty = _empty_scopes(value, empty) and is_empty
+        else:
+            is_empty = False
+    empty[id(scope)] = is_empty
+    return is_empty
+
 
-def _tree(scope: Scope, indent: Text):
-    for i, item in enumerate(scope):
-        if i == len(scope) - 1:
+def _tree(scope: Scope, indent: Text, empty: Dict[int, bool], output: _BufferedWriter):
+    last = len(scope) - 1
+    for i, (item, value) in enumerate(scope.items()):
+        if i == last:
             prefix = indent + _TREE_LAST
             next_prefix = indent + _TREE_NONE
         else:
             prefix = indent + _TREE_ITEM
             next_prefix = indent + _TREE_LINE
 
-        if isinstance(scope[item], Scope):
-            if not scope[item].isempty():
-                print(prefix + item)
-                _tree(scope[item], next_prefix)
-        elif isinstance(scope[item], Enum):
-            print(prefix + item, '(enum)')
-            _tree(scope[item], next_prefix)
+        if isinstance(value, BaseScope):
+            if not empty[id(value)]:
+                output.line(prefix + item)
+                _tree(value, next_prefix, empty, output)
+        elif isinstance(value, Enum):
+            output.line(f'{prefix}{item} (enum)')
+            _tree(value, next_prefix, empty, output)
         else:
-            print(prefix + item, '=', repr(scope[item]))
+            output.line(f'{prefix}{item} = {value!r}')
 
 
-def tree(scope: Scope, indent: Text = ''):
+def tree(scope: Scope, indent: Text = '', file: TextIO = None):
     '''
     Print a scope in a human readable form as a tree.
 
     @param scope    The scope to print.
     @param indent   An initial indent to give everything. (default: '')
+    @param file     The file to print to. (default: stdout)
     '''
-    print(indent + '(global scope)')
-    _tree(scope, indent)
+    empty = {}
+    _empty_scopes(scope, empty)
+    with _BufferedWriter(file) as output:
+        output.line(indent + '(global scope)')
+        _tree(scope, indent, empty, output)
 
 
 _PRETTY_PRINT_INDENT = ' ' * 4
 
 
-def pretty_print(scope: Scope, indent: Text = ''):
+def _pretty_print(scope: Scope, indent: Text, empty: Dict[int, bool], output: _BufferedWriter):
+    for item, value in scope.items():
+        if isinstance(value, BaseScope):
+            if not empty[id(value)]:
+                output.line(f'{indent}{item} {{')
+                _pretty_print(value, indent + _PRETTY_PRINT_INDENT, empty, output)
+                output.line(indent + '}')
+        elif isinstance(value, Enum):
+            output.line(f'{indent}enum {item} {{')
+            _pretty_print(value, indent + _PRETTY_PRINT_INDENT, empty, output)
+            output.line(indent + '}')
+        else:
+            output.line(f'{indent}{item} = {value!r}')
+
+
+def pretty_print(scope: Scope, indent: Text = '', file: TextIO = None):
     '''
     Print a scope in a human readable form as pseudo code.
 
     @param scope    The scope to print.
     @param indent   An initial indent to give everything. (default: '')
+    @param file     The file to print to. (default: stdout)
     '''
-    for item in scope:
-        if isinstance(scope[item], Scope):
-            if not scope[item].isempty():
-                print(indent + item, '{')
-                pretty_print(scope[item], indent + _PRETTY_PRINT_INDENT)
-                print(indent + '}')
-        elif isinstance(scope[item], Enum):
-            print(indent + 'enum', item, '{')
-            pretty_print(scope[item], indent + _PRETTY_PRINT_INDENT)
-            print(indent + '}')
-        else:
-            print(indent + item, '=', repr(scope[item]))
+    empty = {}
+    _empty_scopes(scope, empty)
+    with _BufferedWriter(file) as output:
+        _pretty_print(scope, indent, empty, output)
 
 
 def enums(scope: Scope) -> Iterable[Tuple[Text, Enum]]:
@@ -75,8 +147,72 @@ def enums(scope: Scope) -> Iterable[Tuple[Text, Enum]]:
     @returns an iterable of (str, Enum) pairs.
     '''
     for item in scope:
-        if isinstance(scope[item], Scope):
+        if isinstance(scope[item], BaseScope):
             for name, enum in enums(scope[item]):
                 yield f"{item}{Scope.SEP}{name}", enum
         elif isinstance(scope[item], Enum):
             yield item, scope[item]
+
+
+def entries(scope: Scope, prefix: Text = '') -> Iterator[Tuple[Text, Any]]:
+    '''
+    Gets an iterator to all values (and enums) in a scope, recursively, with their fully qualified names.
+
+    @param scope    The scope to scan.
+    @param prefix   A prefix to add to all names.
+
+    @returns an iterable of (str, object) pairs.
+    '''
+    for item, value in scope.items():
+        if isinstance(value, BaseScope):
+            yield from entries(value, f'{prefix}{item}{Scope.SEP}')
+        else:
+            yield prefix + item, value
+
+
+def to_json(value: Any) -> Any:
+    '''
+    Convert a value from a scope to a JSON-serializable object.
+
+    Records become objects, enums become objects that map their names to their values, arrays become lists.
+    Floats that JSON can't represent become the strings ``"NaN"``, ``"Infinity"`` and ``"-Infinity"``.
+    Values of unknown types are converted using ``repr``.
+    '''
+    if isinstance(value, float):
+        return value if math.isfinite(value) else _NON_FINITE_FLOATS[str(value)]
+    if isinstance(value, (str, int)) or value is None:
+        return value
+    if isinstance(value, array.array):
+        if value.typecode in 'fd':
+            return [to_json(item) for item in value]
+        return value.tolist()
+    if isinstance(value, Mapping):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, tuple) and hasattr(value, '_asdict'):
+        return {key: to_json(item) for key, item in value._asdict().items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    return repr(value)
+
+
+def dump_json(items: Iterable[Tuple[Text, Any]], file: TextIO = None, lines: bool = False):
+    '''
+    Stream (name, value) pairs as JSON, one entry at a time.
+
+    @param items    The entries to write, f.e. ``entries(scope)`` or ``macros.items()``.
+    @param file     The file to write to. (default: stdout)
+    @param lines    If ``True``, write every entry as a separate ``{"name": ..., "value": ...}`` JSON object
+                    line (NDJSON). Otherwise, write a single JSON object that maps the names to the values.
+    '''
+    encode = json.JSONEncoder(ensure_ascii=False, allow_nan=False).encode
+    with _BufferedWriter(file) as output:
+        if lines:
+            for name, value in items:
+                output.line(encode({'name': name, 'value': to_json(value)}))
+            return
+
+        separator = '{'
+        for name, value in items:
+            output.line(f'{separator}{encode(name)}: {encode(to_json(value))}')
+            separator = ','
+        output.line('{}' if separator == '{' else '}')
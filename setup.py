@@ -29,7 +29,7 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     install_requires=[],
     python_requires='>=3.8',
-    packages=setuptools.find_packages(exclude=['test']),
+    packages=setuptools.find_packages(exclude=['test', 'benchmarks', 'benchmarks.*']),
     data_files=[('plugins', glob.glob(PLUGINS))],
     zip_safe=False,  # Maybe True?
     include_package_data=True,
@@ -0,0 +1,3 @@
+'''
+Behaviour tests for pyheaders, run with ``python -m unittest`` (or ``python setup.py test``).
+'''
@@ -0,0 +1,79 @@
+'''
+Tests for the cached digests of scopes (``cpp.digests``).
+'''
+import unittest
+
+from pyheaders.cpp import Enum, Scope, compact
+
+
+def _tree() -> Scope:
+    scope = Scope()
+    scope['a::b::x'] = 1
+    scope['a::c::y'] = 2
+    scope['d::z'] = 3
+    scope['E'] = Enum('E', [('A', 0)])
+    return scope
+
+
+class DigestTest(unittest.TestCase):
+    def test_equal_scopes_have_equal_digests(self):
+        self.assertEqual(_tree().digest(), _tree().digest())
+
+    def test_digest_ignores_the_order(self):
+        first = Scope([('a', 1), ('b', 2)])
+        second = Scope([('b', 2), ('a', 1)])
+        self.assertEqual(first.digest(), second.digest())
+
+    def test_compact_scope_has_the_same_digest(self):
+        self.assertEqual(compact(_tree(), prune=False).digest(), _tree().digest())
+
+    def test_change_invalidates_the_scope_and_its_ancestors(self):
+        scope = _tree()
+        root, a_digest, b_digest = scope.digest(), scope['a'].digest(), scope['a::b'].digest()
+        scope['a::b::x'] = 5
+        self.assertNotEqual(scope['a::b'].digest(), b_digest)
+        self.assertNotEqual(scope['a'].digest(), a_digest)
+        self.assertNotEqual(scope.digest(), root)
+
+        scope['a::b::x'] = 1
+        self.assertEqual(scope.digest(), root)
+
+    def test_change_keeps_the_other_subtrees_cached(self):
+        scope = _tree()
+        scope.digest()
+        scope['a::b::x'] = 5
+        # pylint: disable=protected-access
+        self.assertIsNone(scope._digest)
+        self.assertIsNone(scope['a']._digest)
+        self.assertIsNotNone(scope['a::c']._digest)
+        self.assertIsNotNone(scope['d']._digest)
+
+    def test_dict_methods_invalidate(self):
+        for change in (lambda scope: scope['d'].pop('z'),
+                       lambda scope: scope['d'].update(w=4),
+                       lambda scope: scope['d'].clear(),
+                       lambda scope: scope['d'].setdefault('w', 4),
+                       lambda scope: scope['d'].__delitem__('z')):
+            scope = _tree()
+            before = scope.digest()
+            change(scope)
+            self.assertNotEqual(scope.digest(), before)
+
+    def test_enum_change_invalidates(self):
+        scope = _tree()
+        before = scope.digest()
+        scope['E']['B'] = 1
+        self.assertNotEqual(scope.digest(), before)
+
+    def test_moved_scope_invalidates_both_parents(self):
+        shared = Scope([('x', 1)])
+        first = Scope([('ns', shared)])
+        second = Scope([('ns', shared), ('y', 2)])
+        first_digest, second_digest = first.digest(), second.digest()
+        shared['x'] = 2
+        self.assertNotEqual(first.digest(), first_digest)
+        self.assertNotEqual(second.digest(), second_digest)
+
+
+if __name__ == '__main__':
+    unittest.main()
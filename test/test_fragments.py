@@ -0,0 +1,121 @@
+'''
+Tests for splitting the plugins' output into per-file fragments and assembling it back (``pyheaders.fragments``).
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyheaders.cache import DiskCache
+from pyheaders.fragments import FILE_MARKER, SECTION_MARKER, FragmentCache, split
+
+
+def _output(*sections) -> str:
+    '''
+    Tagged plugin output, ``sections`` are (name, [(filename, text)...]) pairs.
+    '''
+    lines = []
+    for name, files in sections:
+        lines.append(f'{SECTION_MARKER}{name}\n')
+        for filename, text in files:
+            if filename is not None:
+                lines.append(f'{FILE_MARKER}{filename}\n')
+            lines.append(text)
+    return ''.join(lines)
+
+
+class SplitTest(unittest.TestCase):
+    def test_split(self):
+        sections, fragments = split(_output(
+            ('TypesDumper', [('a.h', 'P{x}\n'), ('b.h', 'Q{y}\n')]),
+            ('ConstantsDumper', [('a.h', 'a := 1\nb := 2\n'), ('b.h', 'c := 3\n'), ('a.h', 'd := 4\n')]),
+        ))
+        self.assertEqual(sections, ['TypesDumper', 'ConstantsDumper'])
+        self.assertEqual(fragments, {
+            'a.h': {'TypesDumper': 'P{x}\n', 'ConstantsDumper': 'a := 1\nb := 2\nd := 4\n'},
+            'b.h': {'TypesDumper': 'Q{y}\n', 'ConstantsDumper': 'c := 3\n'},
+        })
+
+    def test_untagged_output(self):
+        sections, fragments = split(_output(('ConstantsDumper', [(None, 'builtin := 1\n'), ('a.h', 'a := 1\n')])))
+        self.assertEqual(sections, ['ConstantsDumper'])
+        self.assertEqual(fragments, {'': {'ConstantsDumper': 'builtin := 1\n'}, 'a.h': {'ConstantsDumper': 'a := 1\n'}})
+
+    def test_no_sections(self):
+        self.assertEqual(split('a := 1\n'), ([], {'': {'': 'a := 1\n'}}))
+
+
+class AssembleTest(unittest.TestCase):
+    FLAGS = ['-x', 'c++', '-std=c++17']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = []
+        for name, content in (('a.h', '#define A 1\nint a;\n'), ('b.h', 'int b = B;\n')):
+            path = os.path.join(self.directory, name)
+            with open(path, 'w') as source_file:
+                source_file.write(content)
+            self.files.append(path)
+        self.cache = DiskCache('fragments', os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _output(self, *skipped):
+        '''
+        The plugins' output, without the files in ``skipped``.
+        '''
+        a_h, b_h = self.files
+        return _output(
+            ('TypesDumper', [(filename, text) for filename, text in ((a_h, 'A{x}\n'), (b_h, 'B{y}\n'))
+                             if filename not in skipped]),
+            ('ConstantsDumper', [(None, 'builtin := 0\n')] +
+             [(filename, text) for filename, text in ((a_h, 'a := 1\n'), (b_h, 'b := 2\n'))
+              if filename not in skipped]),
+        )
+
+    def test_assemble_in_file_order(self):
+        fragment_cache = FragmentCache(self.cache)
+        keys = fragment_cache.keys(self.files, {'B': '2'}, AssembleTest.FLAGS)
+        output, parsed = fragment_cache.assemble(self.files, keys, {}, self._output())
+        self.assertEqual(output, 'A{x}\nB{y}\na := 1\nb := 2\nbuiltin := 0\n')
+        self.assertEqual(parsed, [keys[filename] for filename in self.files])
+
+    def test_cached_fragments_are_reused(self):
+        keys = FragmentCache(self.cache).keys(self.files, {'B': '2'}, AssembleTest.FLAGS)
+        FragmentCache(self.cache).assemble(self.files, keys, {}, self._output())
+
+        fragment_cache = FragmentCache(self.cache)
+        cached = fragment_cache.lookup(keys)
+        self.assertEqual(sorted(cached), sorted(self.files))
+        # The plugins skip the cached files, only the untagged output is produced
+        output, _ = fragment_cache.assemble(self.files, keys, cached, self._output(*self.files))
+        self.assertEqual(output, 'A{x}\nB{y}\na := 1\nb := 2\nbuiltin := 0\n')
+
+    def test_keys_depend_on_the_used_macros(self):
+        fragment_cache = FragmentCache(self.cache)
+        a_h, b_h = self.files
+        keys = fragment_cache.keys(self.files, {'B': '2', 'UNUSED': '1'}, AssembleTest.FLAGS)
+        other = fragment_cache.keys(self.files, {'B': '3', 'UNUSED': '2'}, AssembleTest.FLAGS)
+        self.assertEqual(keys[a_h], other[a_h])
+        self.assertNotEqual(keys[b_h], other[b_h])
+
+    def test_parsed_fragments_are_skipped(self):
+        fragment_cache = FragmentCache(self.cache)
+        keys = fragment_cache.keys(self.files, {'B': '2'}, AssembleTest.FLAGS)
+        _, parsed = fragment_cache.assemble(self.files, keys, {}, self._output())
+        fragment_cache.mark_parsed(parsed[:1])
+
+        output, parsed_now = fragment_cache.assemble(self.files, keys, fragment_cache.lookup(keys),
+                                                     self._output(*self.files))
+        self.assertEqual(output, 'B{y}\nb := 2\nbuiltin := 0\n')
+        self.assertEqual(parsed_now, [keys[self.files[1]]])
+
+    def test_untagged_plugins_output_is_used_as_is(self):
+        fragment_cache = FragmentCache(self.cache)
+        keys = fragment_cache.keys(self.files, {}, AssembleTest.FLAGS)
+        self.assertEqual(fragment_cache.assemble(self.files, keys, {}, 'a := 1\n'), ('a := 1\n', []))
+
+
+if __name__ == '__main__':
+    unittest.main()
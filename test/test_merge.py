@@ -0,0 +1,165 @@
+'''
+Tests for merging scopes (``cpp.merge`` and ``SrcData.merge``).
+'''
+import unittest
+
+from unittest import mock
+
+import pyheaders
+
+from pyheaders import SrcData
+from pyheaders.cpp import Enum, Record, Scope, merge
+from pyheaders.cpp.lazy import Lazy, LazyContainer
+from pyheaders.parsers import constants
+
+
+class _Factory:
+    '''
+    A lazy value's factory that counts its calls.
+    '''
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class MergeTest(unittest.TestCase):
+    def test_new_names_are_moved(self):
+        inner = Scope([('x', 1)])
+        dst = Scope([('a', 1)])
+        src = Scope([('b', 2), ('ns', inner)])
+        self.assertEqual(merge(dst, src), [])
+        self.assertEqual(dst['b'], 2)
+        self.assertIs(dst['ns'], inner)
+
+    def test_namespaces_are_merged(self):
+        dst = Scope()
+        dst['ns::a'] = 1
+        src = Scope()
+        src['ns::b'] = 2
+        self.assertEqual(merge(dst, src), [])
+        self.assertEqual(dst['ns::a'], 1)
+        self.assertEqual(dst['ns::b'], 2)
+
+    def test_equal_values_do_not_conflict(self):
+        dst = Scope([('a', 1), ('s', 'text'), ('t', (1, 2))])
+        src = Scope([('a', 1), ('s', 'text'), ('t', (1, 2))])
+        self.assertEqual(merge(dst, src), [])
+
+    def test_different_values_conflict(self):
+        dst = Scope()
+        dst['ns::a'] = 1
+        src = Scope()
+        src['ns::a'] = 2
+        conflicts = merge(dst, src)
+        self.assertEqual([(conflict.name, conflict.old, conflict.new) for conflict in conflicts], [('ns::a', 1, 2)])
+        self.assertEqual(dst['ns::a'], 2)
+
+    def test_nan_does_not_conflict(self):
+        dst = Scope([('nan', float('nan')), ('nans', (float('nan'), 1.0))])
+        src = Scope([('nan', float('nan')), ('nans', (float('nan'), 1.0))])
+        self.assertEqual(merge(dst, src), [])
+
+    def test_nan_conflicts_with_a_number(self):
+        dst = Scope([('value', float('nan'))])
+        src = Scope([('value', 1.0)])
+        self.assertEqual([conflict.name for conflict in merge(dst, src)], ['value'])
+
+    def test_namespace_replaced_by_a_value_conflicts(self):
+        dst = Scope()
+        dst['ns::a'] = 1
+        src = Scope([('ns', 5)])
+        self.assertEqual([conflict.name for conflict in merge(dst, src)], ['ns'])
+        self.assertEqual(dst['ns'], 5)
+
+    def test_enums_are_merged(self):
+        dst = Scope([('E', Enum('E', [('A', 0), ('B', 1)]))])
+        src = Scope([('E', Enum('E', [('B', 2), ('C', 3)]))])
+        conflicts = merge(dst, src)
+        self.assertEqual([(conflict.name, conflict.old, conflict.new) for conflict in conflicts], [('E::B', 1, 2)])
+        self.assertEqual(dict(dst['E'].items()), {'A': 0, 'B': 2, 'C': 3})
+
+    def test_identical_records_do_not_conflict(self):
+        dst = Scope([('P', Record('P', ['x', 'y']))])
+        src = Scope([('P', Record('P', ['x', 'y']))])
+        self.assertEqual(merge(dst, src), [])
+
+    def test_record_field_change_conflicts(self):
+        old = Record('P', ['x', 'y'])
+        old['kOrigin'] = 0
+        dst = Scope([('P', old)])
+        src = Scope([('P', Record('P', ['x', 'y', 'z']))])
+        conflicts = merge(dst, src)
+        self.assertEqual([conflict.name for conflict in conflicts], ['P'])
+        self.assertEqual(dst['P'].fields, ('x', 'y', 'z'))
+        # The existing members are kept in the new definition
+        self.assertEqual(dst['P']['kOrigin'], 0)
+
+    def test_lazy_values_are_replaced_without_computing(self):
+        old, new = _Factory(1), _Factory(2)
+        dst = Scope([('a', Lazy(old))])
+        src = Scope([('a', Lazy(new))])
+        self.assertEqual(merge(dst, src), [])
+        self.assertEqual((old.calls, new.calls), (0, 0))
+        self.assertEqual(dst['a'], 2)
+
+    def test_lazy_value_replacing_a_namespace_is_not_computed(self):
+        factory = _Factory(1)
+        dst = Scope()
+        dst['a::b'] = 1
+        src = Scope([('a', Lazy(factory))])
+        merge(dst, src)
+        self.assertEqual(factory.calls, 0)
+        self.assertEqual(dst['a'], 1)
+
+    def test_lazy_containers_are_merged(self):
+        inner = Scope([('b', 2)])
+        factory = _Factory(inner)
+        dst = Scope()
+        dst['ns::a'] = 1
+        src = Scope([('ns', LazyContainer(factory))])
+        self.assertEqual(merge(dst, src), [])
+        self.assertEqual(factory.calls, 1)
+        self.assertEqual(dst['ns::a'], 1)
+        self.assertEqual(dst['ns::b'], 2)
+
+    def test_lazy_container_replacing_a_value_is_not_computed(self):
+        factory = _Factory(Scope())
+        dst = Scope([('ns', 1)])
+        src = Scope([('ns', LazyContainer(factory))])
+        merge(dst, src)
+        self.assertEqual(factory.calls, 0)
+
+
+class LazyLoadTest(unittest.TestCase):
+    FILES = (
+        'ns::P{x, y}\na := 1\norigin := ns::P(0, 0)\n',
+        'a := 1\nb := 2\norigin := ns::P(0, 0)\n',
+        'ns::P{x, y}\nb := 3\nc := ns::P(1, 2)\n',
+    )
+
+    def test_merging_lazily_parsed_files_does_not_compute_values(self):
+        data = SrcData()
+        with mock.patch.object(constants, 'parse_value', wraps=constants.parse_value) as parse_value:
+            for text in LazyLoadTest.FILES:
+                # pylint: disable=protected-access
+                data.update(SrcData(pyheaders._parse(text, lazy=True, types_scope=data.scope)))
+            self.assertEqual(parse_value.call_count, 0)
+
+            self.assertEqual(data.scope['b'], 3)
+            self.assertEqual(data.scope['c'], data.scope['ns::P'](1, 2))
+
+    def test_lazy_values_use_the_types_of_the_merged_scope(self):
+        data = SrcData()
+        for text in LazyLoadTest.FILES[:2]:
+            # pylint: disable=protected-access
+            data.update(SrcData(pyheaders._parse(text, lazy=True, types_scope=data.scope)))
+        self.assertEqual(data.scope['origin'], data.scope['ns::P'](0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
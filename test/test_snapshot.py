@@ -0,0 +1,104 @@
+'''
+Tests for saving and opening snapshots (``pyheaders.snapshot``).
+'''
+import array
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyheaders import SrcData, diff, snapshot
+from pyheaders.cpp import Change, Enum, Record, Scope
+from pyheaders.cpp.lazy import Lazy
+
+
+def _data() -> SrcData:
+    scope = Scope()
+    scope['ints::small'] = -5
+    scope['ints::big'] = 1 << 80
+    scope['floats::pi'] = 3.14
+    scope['text::hello'] = 'héllo'
+    scope['text::raw'] = b'\0\xff'
+    scope['misc::flags'] = (True, False, None)
+    scope['misc::list'] = [1, [2, 3]]
+    scope['misc::table'] = array.array('i', range(10))
+    point = Record('geo::Point', ['x', 'y'])
+    point['kDims'] = 2
+    scope['geo::Point'] = point
+    scope['geo::origin'] = point(0, 0)
+    scope['Color'] = Enum('Color', [('Red', 0), ('Green', 1)])
+    return SrcData(scope, {'VERSION': '3', 'EMPTY': ''})
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data.snap')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _round_trip(self, data: SrcData) -> SrcData:
+        data.dump_snapshot(self.path)
+        opened = snapshot.Snapshot(self.path)
+        self.addCleanup(opened.close)
+        return SrcData(opened.scope, opened.macros)
+
+    def test_round_trip(self):
+        loaded = self._round_trip(_data())
+        self.assertTrue(snapshot.is_snapshot(self.path))
+        self.assertEqual(loaded.scope, _data().scope)
+        self.assertEqual(dict(loaded.macros), _data().macros)
+        self.assertEqual(loaded.digest(), _data().digest())
+
+    def test_name_lookup(self):
+        loaded = self._round_trip(_data())
+        self.assertEqual(loaded.scope['ints::big'], 1 << 80)
+        self.assertEqual(loaded.scope['geo::Point::kDims'], 2)
+        self.assertEqual(loaded.scope['geo::origin'], loaded.scope['geo::Point'](0, 0))
+        self.assertEqual(loaded.scope['Color']['Green'], 1)
+        self.assertNotIn('missing', loaded.scope)
+        self.assertNotIn('ints::missing', loaded.scope)
+        self.assertIsNone(loaded.scope.get('text::missing'))
+
+    def test_values_are_read_on_access(self):
+        loaded = self._round_trip(_data())
+        self.assertIsInstance(dict.get(loaded.scope, 'ints', Lazy(int)), Lazy)
+        self.assertEqual(loaded.scope['ints::small'], -5)
+        self.assertNotIsInstance(dict.get(loaded.scope, 'ints'), Lazy)
+
+    def test_diff(self):
+        old = self._round_trip(_data())
+        new = _data()
+        new.scope['ints::small'] = 6
+        new.scope['text::new'] = 'new'
+        del new.scope['floats']['pi']
+        new.macros['VERSION'] = '4'
+
+        changes = diff(old, new)
+        self.assertEqual([(change.kind, change.name) for change in changes.scope],
+                         [(Change.CHANGED, 'ints::small'), (Change.REMOVED, 'floats::pi'),
+                          (Change.ADDED, 'text::new')])
+        self.assertEqual([(change.kind, change.name) for change in changes.macros], [(Change.CHANGED, 'VERSION')])
+
+    def test_no_diff(self):
+        self.assertFalse(diff(self._round_trip(_data()), _data()))
+
+    def test_merge_into_snapshot(self):
+        loaded = self._round_trip(_data())
+        other = Scope()
+        other['ints::other'] = 7
+        self.assertEqual(loaded.merge(SrcData(other)), [])
+        self.assertEqual(loaded.scope['ints::small'], -5)
+        self.assertEqual(loaded.scope['ints::other'], 7)
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as output:
+            output.write(b'not a snapshot, but long enough to have a header')
+        self.assertFalse(snapshot.is_snapshot(self.path))
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.Snapshot(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()